@@ -164,11 +164,15 @@ void encoder_service(void) {
 
 	static int last_event;
 	static int last_fps_event;
+	static int last_static_event;
 	static int frame_cnt;
 
 	if(encoder_enabled) {
 		if(elapsed(&last_event, identifier_frequency_read()/30)) {
-			if (encoder_done() == 1) {
+			/* full rate on motion, 1 fps for static content */
+			if ((encoder_done() == 1) &&
+			    (encoder_motion || elapsed(&last_static_event, identifier_frequency_read()))) {
+				encoder_motion = 0;
 				encoder_init(encoder_quality);
 				encoder_start(processor_h_active, processor_v_active);
 				encoder_reader_dma_length_write(processor_h_active*processor_v_active*2);
@@ -13,6 +13,7 @@
 #ifdef CSR_HDMI_IN0_BASE
 
 #include "hdmi_in0.h"
+#include "pll.h"
 
 int hdmi_in0_debug;
 int hdmi_in0_fb_index;
@@ -30,10 +31,116 @@ unsigned int hdmi_in0_framebuffer_base(char n) {
 static int hdmi_in0_fb_slot_indexes[2];
 static int hdmi_in0_next_fb_index;
 static int hdmi_in0_hres, hdmi_in0_vres;
+static int hdmi_in0_frame_size;
+static int hdmi_in0_res_stable;
+/* the last hashed frame is the displayed one, a changed frame was presented */
+static int hdmi_in0_fb_valid;
+static int hdmi_in0_frame_presented;
 
 extern void processor_update(void);
 
-void hdmi_in0_isr(void)
+static int hdmi_in0_set_resolution(int hres, int vres);
+
+#ifdef CSR_HDMI_IN0_DMA_TILE_DIRTY_COUNT_ADDR
+/* no dirty tile: the last frame is the displayed one, it is not presented */
+static int hdmi_in0_frame_unchanged(void)
+{
+	return hdmi_in0_fb_valid && (hdmi_in0_dma_tile_dirty_count_read() == 0);
+}
+#else
+static int hdmi_in0_frame_unchanged(void)
+{
+	return 0;
+}
+#endif
+
+/* change: capture stops until the input is stable again,
+   stable: capture follows the measured resolution */
+static void hdmi_in0_resdetection_isr(void)
+{
+	unsigned int pending;
+	int hres, vres;
+
+	pending = hdmi_in0_resdetection_ev_pending_read();
+	hdmi_in0_resdetection_ev_pending_write(pending);
+	if(pending & 0x1) {
+		hdmi_in0_res_stable = 0;
+		hdmi_in0_fb_valid = 0;
+	}
+	if(pending & 0x2) {
+		hres = hdmi_in0_resdetection_hres_read();
+		vres = hdmi_in0_resdetection_vres_read();
+		if((hres == hdmi_in0_hres) && (vres == hdmi_in0_vres))
+			hdmi_in0_res_stable = 1;
+		else if(hdmi_in0_set_resolution(hres, vres)) {
+			if(hdmi_in0_debug)
+				printf("dvisampler0: resolution changed to %dx%d\n", hres, vres);
+			hdmi_in0_res_stable = 1;
+		} else
+			printf("dvisampler0: unsupported resolution %dx%d\n", hres, vres);
+	}
+}
+
+#if defined(HDMI_IN0_DMA_SLOTS) && (HDMI_IN0_DMA_SLOTS == FRAMEBUFFER_COUNT)
+/* one DMA slot per framebuffer (slot count from the target): the DMA fills
+   them round-robin (ring mode), the displayed framebuffer is emptied to keep
+   it from being overwritten */
+#define HDMI_IN0_DMA_RING
+/* DMA events: one per slot, then done */
+#define HDMI_IN0_DMA_EV_DONE (1 << HDMI_IN0_DMA_SLOTS)
+
+static void hdmi_in0_slot_status_write(int slot, int status)
+{
+	switch(slot) {
+		case 0: hdmi_in0_dma_slot0_status_write(status); break;
+		case 1: hdmi_in0_dma_slot1_status_write(status); break;
+		case 2: hdmi_in0_dma_slot2_status_write(status); break;
+		case 3: hdmi_in0_dma_slot3_status_write(status); break;
+	}
+}
+
+static int hdmi_in0_slot_length_read(int slot)
+{
+	switch(slot) {
+		case 0: return hdmi_in0_dma_slot0_length_read();
+		case 1: return hdmi_in0_dma_slot1_length_read();
+		case 2: return hdmi_in0_dma_slot2_length_read();
+		default: return hdmi_in0_dma_slot3_length_read();
+	}
+}
+
+static void hdmi_in0_ring_isr(void)
+{
+	int slot;
+	int length;
+
+	if(!(hdmi_in0_dma_ev_pending_read() & HDMI_IN0_DMA_EV_DONE))
+		return;
+	hdmi_in0_dma_ev_pending_write(HDMI_IN0_DMA_EV_DONE);
+	/* Dump frames until we get the expected resolution */
+	if(!hdmi_in0_res_stable
+	  || (hdmi_in0_resdetection_hres_read() != hdmi_in0_hres)
+	  || (hdmi_in0_resdetection_vres_read() != hdmi_in0_vres))
+		return;
+
+	slot = hdmi_in0_dma_last_read();
+	length = hdmi_in0_slot_length_read(slot);
+	if(length != hdmi_in0_frame_size) {
+		printf("dvisampler0: slot%d: unexpected frame length: %d\n", slot, length);
+		hdmi_in0_fb_valid = 0;
+		return;
+	}
+	if(hdmi_in0_frame_unchanged())
+		return;
+	hdmi_in0_slot_status_write(slot, DVISAMPLER_SLOT_EMPTY);
+	hdmi_in0_slot_status_write(hdmi_in0_fb_index, DVISAMPLER_SLOT_LOADED);
+	hdmi_in0_fb_index = slot;
+	hdmi_in0_fb_valid = 1;
+	hdmi_in0_frame_presented = 1;
+	processor_update();
+}
+#else
+static void hdmi_in0_slots_isr(void)
 {
 	int fb_index = -1;
 	int length;
@@ -49,7 +156,8 @@ void hdmi_in0_isr(void)
 		&& ((hdmi_in0_dma_slot1_address_read() < address_min) || (hdmi_in0_dma_slot1_address_read() > address_max)))
 		printf("dvisampler0: slot1: stray DMA\n");
 
-	if((hdmi_in0_resdetection_hres_read() != hdmi_in0_hres)
+	if(!hdmi_in0_res_stable
+	  || (hdmi_in0_resdetection_hres_read() != hdmi_in0_hres)
 	  || (hdmi_in0_resdetection_vres_read() != hdmi_in0_vres)) {
 		/* Dump frames until we get the expected resolution */
 		if(hdmi_in0_dma_slot0_status_read() == DVISAMPLER_SLOT_PENDING) {
@@ -63,37 +171,111 @@ void hdmi_in0_isr(void)
 		return;
 	}
 
-	expected_length = hdmi_in0_hres*hdmi_in0_vres*2;
+	expected_length = hdmi_in0_frame_size;
 	if(hdmi_in0_dma_slot0_status_read() == DVISAMPLER_SLOT_PENDING) {
 		length = hdmi_in0_dma_slot0_address_read() - (hdmi_in0_framebuffer_base(hdmi_in0_fb_slot_indexes[0]) & 0x0fffffff);
 		if(length == expected_length) {
-			fb_index = hdmi_in0_fb_slot_indexes[0];
-			hdmi_in0_fb_slot_indexes[0] = hdmi_in0_next_fb_index;
-			hdmi_in0_next_fb_index = (hdmi_in0_next_fb_index + 1) & FRAMEBUFFER_MASK;
-		} else
+			/* an unchanged frame is overwritten by the next one */
+			if(!hdmi_in0_frame_unchanged()) {
+				fb_index = hdmi_in0_fb_slot_indexes[0];
+				hdmi_in0_fb_slot_indexes[0] = hdmi_in0_next_fb_index;
+				hdmi_in0_next_fb_index = (hdmi_in0_next_fb_index + 1) & FRAMEBUFFER_MASK;
+			}
+		} else {
 			printf("dvisampler0: slot0: unexpected frame length: %d\n", length);
+			hdmi_in0_fb_valid = 0;
+		}
 		hdmi_in0_dma_slot0_address_write(hdmi_in0_framebuffer_base(hdmi_in0_fb_slot_indexes[0]));
 		hdmi_in0_dma_slot0_status_write(DVISAMPLER_SLOT_LOADED);
 	}
 	if(hdmi_in0_dma_slot1_status_read() == DVISAMPLER_SLOT_PENDING) {
 		length = hdmi_in0_dma_slot1_address_read() - (hdmi_in0_framebuffer_base(hdmi_in0_fb_slot_indexes[1]) & 0x0fffffff);
 		if(length == expected_length) {
-			fb_index = hdmi_in0_fb_slot_indexes[1];
-			hdmi_in0_fb_slot_indexes[1] = hdmi_in0_next_fb_index;
-			hdmi_in0_next_fb_index = (hdmi_in0_next_fb_index + 1) & FRAMEBUFFER_MASK;
-		} else
+			/* an unchanged frame is overwritten by the next one */
+			if(!hdmi_in0_frame_unchanged()) {
+				fb_index = hdmi_in0_fb_slot_indexes[1];
+				hdmi_in0_fb_slot_indexes[1] = hdmi_in0_next_fb_index;
+				hdmi_in0_next_fb_index = (hdmi_in0_next_fb_index + 1) & FRAMEBUFFER_MASK;
+			}
+		} else {
 			printf("dvisampler0: slot1: unexpected frame length: %d\n", length);
+			hdmi_in0_fb_valid = 0;
+		}
 		hdmi_in0_dma_slot1_address_write(hdmi_in0_framebuffer_base(hdmi_in0_fb_slot_indexes[1]));
 		hdmi_in0_dma_slot1_status_write(DVISAMPLER_SLOT_LOADED);
 	}
 
-	if(fb_index != -1)
+	if(fb_index != -1) {
 		hdmi_in0_fb_index = fb_index;
+		hdmi_in0_fb_valid = 1;
+		hdmi_in0_frame_presented = 1;
+	}
 	processor_update();
 }
+#endif
+
+void hdmi_in0_isr(void)
+{
+	hdmi_in0_resdetection_isr();
+#ifdef HDMI_IN0_DMA_RING
+	hdmi_in0_ring_isr();
+#else
+	hdmi_in0_slots_isr();
+#endif
+}
 
 static int hdmi_in0_connected;
 static int hdmi_in0_locked;
+static int hdmi_in0_pll_freq;
+
+/* geometry of the frames written by DMA (after cropping and downscaling) */
+static void hdmi_in0_dma_geometry(int hres, int vres, int *dma_width, int *dma_height)
+{
+	int width, height;
+
+	width = hres;
+	height = vres;
+#ifdef CSR_HDMI_IN0_FRAME_CROP_ENABLE_ADDR
+	if(hdmi_in0_frame_crop_enable_read()) {
+		int x, y;
+
+		x = hdmi_in0_frame_crop_x_read() & ~1;
+		y = hdmi_in0_frame_crop_y_read();
+		width = hdmi_in0_frame_crop_width_read() & ~1;
+		height = hdmi_in0_frame_crop_height_read();
+		if(x + width > hres)
+			width = x < hres ? hres - x : 0;
+		if(y + height > vres)
+			height = y < vres ? vres - y : 0;
+	}
+#endif
+#ifdef CSR_HDMI_IN0_FRAME_HSCALE_ADDR
+	/* incomplete pixel pairs/lines are dropped */
+	width = (width >> (hdmi_in0_frame_hscale_read() + 1)) << 1;
+	height = height >> hdmi_in0_frame_vscale_read();
+#endif
+	*dma_width = width;
+	*dma_height = height;
+}
+
+/* program the DMA for hres x vres input frames, fails if they do not fit
+   in a framebuffer */
+static int hdmi_in0_set_resolution(int hres, int vres)
+{
+	int dma_width, dma_height;
+
+	hdmi_in0_dma_geometry(hres, vres, &dma_width, &dma_height);
+	if(dma_width*dma_height*2 > HDMI_IN0_FRAMEBUFFERS_SIZE)
+		return 0;
+	hdmi_in0_hres = hres; hdmi_in0_vres = vres;
+	hdmi_in0_fb_valid = 0;
+	hdmi_in0_frame_size = dma_width*dma_height*2;
+	hdmi_in0_dma_frame_size_write(hdmi_in0_frame_size);
+#ifdef CSR_HDMI_IN0_DMA_TILE_LINE_WORDS_ADDR
+	hdmi_in0_dma_tile_line_words_write(dma_width*2);
+#endif
+	return 1;
+}
 
 void hdmi_in0_init_video(int hres, int vres)
 {
@@ -101,9 +283,27 @@ void hdmi_in0_init_video(int hres, int vres)
 
 	hdmi_in0_clocking_pll_reset_write(1);
 	hdmi_in0_connected = hdmi_in0_locked = 0;
-	hdmi_in0_hres = hres; hdmi_in0_vres = vres;
 
-	hdmi_in0_dma_frame_size_write(hres*vres*2);
+	/* 10kHz units (as video_timing.pixel_clock) */
+	hdmi_in0_clocking_freqmeter_period_write(identifier_frequency_read()/10000);
+	hdmi_in0_pll_freq = 0;
+	hdmi_in0_set_resolution(hres, vres);
+	hdmi_in0_res_stable = 0;
+#ifdef HDMI_IN0_DMA_RING
+	hdmi_in0_dma_slot0_address_write(hdmi_in0_framebuffer_base(0));
+	hdmi_in0_dma_slot0_status_write(DVISAMPLER_SLOT_LOADED);
+	hdmi_in0_dma_slot1_address_write(hdmi_in0_framebuffer_base(1));
+	hdmi_in0_dma_slot1_status_write(DVISAMPLER_SLOT_LOADED);
+	hdmi_in0_dma_slot2_address_write(hdmi_in0_framebuffer_base(2));
+	hdmi_in0_dma_slot2_status_write(DVISAMPLER_SLOT_LOADED);
+	/* displayed */
+	hdmi_in0_dma_slot3_address_write(hdmi_in0_framebuffer_base(3));
+	hdmi_in0_dma_slot3_status_write(DVISAMPLER_SLOT_EMPTY);
+	hdmi_in0_dma_ring_write(1);
+
+	hdmi_in0_dma_ev_pending_write(hdmi_in0_dma_ev_pending_read());
+	hdmi_in0_dma_ev_enable_write(HDMI_IN0_DMA_EV_DONE);
+#else
 	hdmi_in0_fb_slot_indexes[0] = 0;
 	hdmi_in0_dma_slot0_address_write(hdmi_in0_framebuffer_base(0));
 	hdmi_in0_dma_slot0_status_write(DVISAMPLER_SLOT_LOADED);
@@ -114,6 +314,9 @@ void hdmi_in0_init_video(int hres, int vres)
 
 	hdmi_in0_dma_ev_pending_write(hdmi_in0_dma_ev_pending_read());
 	hdmi_in0_dma_ev_enable_write(0x3);
+#endif
+	hdmi_in0_resdetection_ev_pending_write(hdmi_in0_resdetection_ev_pending_read());
+	hdmi_in0_resdetection_ev_enable_write(0x3);
 	mask = irq_getmask();
 	mask |= 1 << HDMI_IN0_INTERRUPT;
 	irq_setmask(mask);
@@ -131,12 +334,18 @@ void hdmi_in0_disable(void)
 
 	hdmi_in0_dma_slot0_status_write(DVISAMPLER_SLOT_EMPTY);
 	hdmi_in0_dma_slot1_status_write(DVISAMPLER_SLOT_EMPTY);
+#ifdef HDMI_IN0_DMA_RING
+	hdmi_in0_dma_slot2_status_write(DVISAMPLER_SLOT_EMPTY);
+	hdmi_in0_dma_slot3_status_write(DVISAMPLER_SLOT_EMPTY);
+	hdmi_in0_dma_ring_write(0);
+#endif
 	hdmi_in0_clocking_pll_reset_write(1);
 }
 
 void hdmi_in0_clear_framebuffers(void)
 {
 	int i;
+	hdmi_in0_fb_valid = 0;
 	flush_l2_cache();
 	volatile unsigned int *framebuffer = (unsigned int *)(MAIN_RAM_BASE + HDMI_IN0_FRAMEBUFFERS_BASE);
 	for(i=0; i<(HDMI_IN0_FRAMEBUFFERS_SIZE*FRAMEBUFFER_COUNT)/4; i++) {
@@ -146,6 +355,57 @@ void hdmi_in0_clear_framebuffers(void)
 
 static int hdmi_in0_d0, hdmi_in0_d1, hdmi_in0_d2;
 
+#ifdef CSR_HDMI_IN0_DATA0_CAP_AUTO_ENABLE_ADDR
+/* phase alignment done by gateware */
+#define HDMI_IN0_AUTO_PHASE
+
+static void hdmi_in0_auto_phase(int enable)
+{
+	hdmi_in0_data0_cap_auto_enable_write(enable);
+	hdmi_in0_data1_cap_auto_enable_write(enable);
+	hdmi_in0_data2_cap_auto_enable_write(enable);
+}
+
+static void hdmi_in0_auto_phase_update(void)
+{
+	hdmi_in0_d0 = (signed char)hdmi_in0_data0_cap_auto_tap_read();
+	hdmi_in0_d1 = (signed char)hdmi_in0_data1_cap_auto_tap_read();
+	hdmi_in0_d2 = (signed char)hdmi_in0_data2_cap_auto_tap_read();
+}
+#endif
+
+#ifdef CSR_HDMI_IN0_DATA0_CAP_SCAN_START_ADDR
+/* eye scan (started by host tools): phase tracking stops once parked */
+#define HDMI_IN0_EYE_SCAN
+
+static int hdmi_in0_eye_scanning, hdmi_in0_eye_parked;
+
+static int hdmi_in0_eye_scan_service(void)
+{
+	int scanning;
+
+	scanning = hdmi_in0_data0_cap_scan_busy_read()
+		|| hdmi_in0_data1_cap_scan_busy_read()
+		|| hdmi_in0_data2_cap_scan_busy_read();
+	if(hdmi_in0_eye_scanning && !scanning) {
+#ifdef HDMI_IN0_AUTO_PHASE
+		hdmi_in0_auto_phase(0);
+#endif
+		hdmi_in0_d0 += (signed char)hdmi_in0_data0_cap_scan_centre_read();
+		hdmi_in0_d1 += (signed char)hdmi_in0_data1_cap_scan_centre_read();
+		hdmi_in0_d2 += (signed char)hdmi_in0_data2_cap_scan_centre_read();
+		hdmi_in0_eye_parked = 1;
+		if(hdmi_in0_debug)
+			printf("dvisampler0: eye scan done, eye width:%d %d %d\n",
+				hdmi_in0_data0_cap_scan_width_read(),
+				hdmi_in0_data1_cap_scan_width_read(),
+				hdmi_in0_data2_cap_scan_width_read());
+	}
+	hdmi_in0_eye_scanning = scanning;
+	return scanning || hdmi_in0_eye_parked;
+}
+#endif
+
 void hdmi_in0_print_status(void)
 {
 	unsigned int frame_crc32 = hdmi_in0_dma_crc_read();
@@ -167,8 +427,79 @@ void hdmi_in0_print_status(void)
 		hdmi_in0_resdetection_hres_read(),
 		hdmi_in0_resdetection_vres_read(),
 		frame_crc32);
+	printf("dvisampler0: timing:%dx%d hsync:%d%c vsync:%d%c frame_period:%d stable:%d pix:%d.%02dMHz\n",
+		hdmi_in0_resdetection_htotal_read(),
+		hdmi_in0_resdetection_vtotal_read(),
+		hdmi_in0_resdetection_hsync_width_read(),
+		(hdmi_in0_resdetection_polarity_read() & 1) ? '+' : '-',
+		hdmi_in0_resdetection_vsync_width_read(),
+		(hdmi_in0_resdetection_polarity_read() & 2) ? '+' : '-',
+		hdmi_in0_resdetection_frame_period_read(),
+		hdmi_in0_resdetection_stable_read(),
+		hdmi_in0_clocking_freqmeter_value_read()/100,
+		hdmi_in0_clocking_freqmeter_value_read()%100);
+	printf("dvisampler0: chansync skew:%d (max:%d) depth:%d lock_time:%d\n",
+		hdmi_in0_chansync_skew_read(),
+		hdmi_in0_chansync_skew_max_read(),
+		hdmi_in0_chansync_depth_read(),
+		hdmi_in0_chansync_lock_time_read());
+	printf("dvisampler0: frames captured:%d skipped:%d\n",
+		hdmi_in0_dma_captured_read(),
+		hdmi_in0_dma_skipped_read());
+#ifdef CSR_HDMI_IN0_DMA_TILE_COUNT_ADDR
+	printf("dvisampler0: dirty tiles:%d/%d\n",
+		hdmi_in0_dma_tile_dirty_count_read(),
+		hdmi_in0_dma_tile_count_read());
+#endif
+#ifdef CSR_HDMI_IN0_FRAME_STATISTICS_COUNT_ADDR
+	{
+		unsigned int count = hdmi_in0_frame_statistics_count_read();
+
+		printf("dvisampler0: pixels:%d luma min:%d max:%d mean:%d\n",
+			count,
+			hdmi_in0_frame_statistics_y_min_read(),
+			hdmi_in0_frame_statistics_y_max_read(),
+			count ? hdmi_in0_frame_statistics_y_sum_read()/count : 0);
+	}
+#endif
+#ifdef CSR_HDMI_IN0_FRAME_MOTION_SAD_ADDR
+	printf("dvisampler0: motion sad:%d (threshold:%d) blocks:%dx%d\n",
+		hdmi_in0_frame_motion_sad_read(),
+		hdmi_in0_frame_motion_threshold_read(),
+		hdmi_in0_frame_motion_columns_read(),
+		hdmi_in0_frame_motion_rows_read());
+#endif
+	printf("dvisampler0: last second: fifo max:%d (last frame:%d) dropped words:%d overflow frames:%d // dma stalls:%d/%d\n",
+		hdmi_in0_frame_fifo_max_read(),
+		hdmi_in0_frame_fifo_max_frame_read(),
+		hdmi_in0_frame_dropped_words_read(),
+		hdmi_in0_frame_overflow_frames_read(),
+		hdmi_in0_dma_stall_cycles_read(),
+		hdmi_in0_dma_transfer_cycles_read());
 }
 
+#ifdef CSR_HDMI_IN0_FRAME_MOTION_EV_PENDING_ADDR
+int hdmi_in0_motion(void)
+{
+	int motion;
+
+	motion = hdmi_in0_frame_motion_ev_pending_read() & 1;
+	if(motion)
+		hdmi_in0_frame_motion_ev_pending_write(1);
+	return motion;
+}
+#elif defined(CSR_HDMI_IN0_DMA_TILE_DIRTY_COUNT_ADDR)
+/* without motion detector: a changed frame was presented (tile hashes) */
+int hdmi_in0_motion(void)
+{
+	int motion;
+
+	motion = hdmi_in0_frame_presented;
+	hdmi_in0_frame_presented = 0;
+	return motion;
+}
+#endif
+
 static int wait_idelays(void)
 {
 	int ev;
@@ -333,23 +664,64 @@ static int hdmi_in0_clocking_locked_filtered(void)
 	return 0;
 }
 
+/* The PLL is programmed for the output video mode: reprogram it for the
+   TMDS clock measured before it when it does not lock (the frequency meter
+   reads 0 when it measures pix, see Clocking) */
+static void hdmi_in0_check_clock(void)
+{
+	static int last_event;
+	int freq;
+
+	if(hdmi_in0_clocking_locked_read() || !elapsed(&last_event, identifier_frequency_read()/2))
+		return;
+	freq = hdmi_in0_clocking_freqmeter_value_read();
+	if((freq == 0) || (abs(freq - hdmi_in0_pll_freq) <= hdmi_in0_pll_freq/100))
+		return;
+	if(hdmi_in0_debug)
+		printf("dvisampler0: TMDS clock %d.%02dMHz, reprogramming PLL\n", freq/100, freq%100);
+	hdmi_in0_clocking_pll_reset_write(1);
+	pll_config_hdmi_in_for_clock(0, freq);
+	hdmi_in0_pll_freq = freq;
+	hdmi_in0_clocking_pll_reset_write(0);
+}
+
+/* write path telemetry counts over one second windows */
+static void hdmi_in0_telemetry_service(void)
+{
+	static int last_event;
+
+	if(elapsed(&last_event, identifier_frequency_read()))
+		hdmi_in0_telemetry_snapshot_write(1);
+}
+
 void hdmi_in0_service(void)
 {
 	static int last_event;
 
+	hdmi_in0_telemetry_service();
 	if(hdmi_in0_connected) {
 		if(!hdmi_in0_edid_hpd_notif_read()) {
 			if(hdmi_in0_debug)
 				printf("dvisampler0: disconnected\n");
 			hdmi_in0_connected = 0;
 			hdmi_in0_locked = 0;
+#ifdef HDMI_IN0_AUTO_PHASE
+			hdmi_in0_auto_phase(0);
+#endif
 			hdmi_in0_clocking_pll_reset_write(1);
 			hdmi_in0_clear_framebuffers();
 		} else {
 			if(hdmi_in0_locked) {
 				if(hdmi_in0_clocking_locked_filtered()) {
 					if(elapsed(&last_event, identifier_frequency_read()/2)) {
+#ifdef HDMI_IN0_EYE_SCAN
+						if(!hdmi_in0_eye_scan_service())
+#endif
+#ifdef HDMI_IN0_AUTO_PHASE
+						hdmi_in0_auto_phase_update();
+#else
 						hdmi_in0_adjust_phase();
+#endif
 						if(hdmi_in0_debug)
 							hdmi_in0_print_status();
 					}
@@ -357,17 +729,28 @@ void hdmi_in0_service(void)
 					if(hdmi_in0_debug)
 						printf("dvisampler0: lost PLL lock\n");
 					hdmi_in0_locked = 0;
+#ifdef HDMI_IN0_AUTO_PHASE
+					hdmi_in0_auto_phase(0);
+#endif
 					hdmi_in0_clear_framebuffers();
 				}
 			} else {
 				if(hdmi_in0_clocking_locked_filtered()) {
 					if(hdmi_in0_debug)
 						printf("dvisampler0: PLL locked\n");
+#ifdef HDMI_IN0_EYE_SCAN
+					hdmi_in0_eye_parked = 0;
+#endif
+#ifdef HDMI_IN0_AUTO_PHASE
+					hdmi_in0_auto_phase(1);
+#else
 					hdmi_in0_phase_startup();
+#endif
 					if(hdmi_in0_debug)
 						hdmi_in0_print_status();
 					hdmi_in0_locked = 1;
-				}
+				} else
+					hdmi_in0_check_clock();
 			}
 		}
 	} else {
@@ -16,5 +16,6 @@ int hdmi_in0_adjust_phase(void);
 int hdmi_in0_init_phase(void);
 int hdmi_in0_phase_startup(void);
 void hdmi_in0_service(void);
+int hdmi_in0_motion(void);
 
 #endif
@@ -16,5 +16,6 @@ int hdmi_in1_adjust_phase(void);
 int hdmi_in1_init_phase(void);
 int hdmi_in1_phase_startup(void);
 void hdmi_in1_service(void);
+int hdmi_in1_motion(void);
 
 #endif
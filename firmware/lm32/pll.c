@@ -25,38 +25,57 @@ static const unsigned short int pll_config_10x[32] = {
 	0x5fdf, 0x40eb, 0x472b, 0xc02a, 0x20b6, 0x0e96, 0x1002, 0xd6ce
 };
 
-static void program_data(const unsigned short *data)
+/*
+ * Some bits of words 4 and 5 appear to depend on PLL location,
+ * so we start at word 6.
+ * PLLs also seem to dislike any write to the last words.
+ */
+
+#ifdef CSR_HDMI_IN0_BASE
+static void program_hdmi_in0(const unsigned short *data)
 {
 	int i;
 
-	/*
-	 * Some bits of words 4 and 5 appear to depend on PLL location,
-	 * so we start at word 6.
-	 * PLLs also seem to dislike any write to the last words.
-	 */
-#ifdef CSR_HDMI_OUT0_BASE
-	for(i=6;i<32-5;i++) {
-		hdmi_out0_driver_clocking_pll_adr_write(i);
-		hdmi_out0_driver_clocking_pll_dat_w_write(data[i]);
-		hdmi_out0_driver_clocking_pll_write_write(1);
-		while(!hdmi_out0_driver_clocking_pll_drdy_read());
-	}
-#endif
-#ifdef CSR_HDMI_IN0_BASE
 	for(i=6;i<32-5;i++) {
 		hdmi_in0_clocking_pll_adr_write(i);
 		hdmi_in0_clocking_pll_dat_w_write(data[i]);
 		hdmi_in0_clocking_pll_write_write(1);
 		while(!hdmi_in0_clocking_pll_drdy_read());
 	}
+}
 #endif
+
 #ifdef CSR_HDMI_IN1_BASE
+static void program_hdmi_in1(const unsigned short *data)
+{
+	int i;
+
 	for(i=6;i<32-5;i++) {
 		hdmi_in1_clocking_pll_adr_write(i);
 		hdmi_in1_clocking_pll_dat_w_write(data[i]);
 		hdmi_in1_clocking_pll_write_write(1);
 		while(!hdmi_in1_clocking_pll_drdy_read());
 	}
+}
+#endif
+
+static void program_data(const unsigned short *data)
+{
+	int i;
+
+#ifdef CSR_HDMI_OUT0_BASE
+	for(i=6;i<32-5;i++) {
+		hdmi_out0_driver_clocking_pll_adr_write(i);
+		hdmi_out0_driver_clocking_pll_dat_w_write(data[i]);
+		hdmi_out0_driver_clocking_pll_write_write(1);
+		while(!hdmi_out0_driver_clocking_pll_drdy_read());
+	}
+#endif
+#ifdef CSR_HDMI_IN0_BASE
+	program_hdmi_in0(data);
+#endif
+#ifdef CSR_HDMI_IN1_BASE
+	program_hdmi_in1(data);
 #endif
 }
 
@@ -82,6 +101,30 @@ void pll_config_for_clock(int freq)
 #endif
 }
 
+/*
+ * Input PLL only, for the TMDS clock measured by its frequency meter
+ * (the PLL should be held in reset).
+ */
+void pll_config_hdmi_in_for_clock(int n, int freq)
+{
+	const unsigned short *data;
+
+	/* see pll_config_for_clock */
+	data = pll_config_20x;
+#ifdef XILINX_SPARTAN6_WORKS_AMAZINGLY_WELL
+	if(freq >= 4500)
+		data = pll_config_10x;
+#endif
+#ifdef CSR_HDMI_IN0_BASE
+	if(n == 0)
+		program_hdmi_in0(data);
+#endif
+#ifdef CSR_HDMI_IN1_BASE
+	if(n == 1)
+		program_hdmi_in1(data);
+#endif
+}
+
 void pll_dump(void)
 {
 	int i;
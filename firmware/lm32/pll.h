@@ -2,6 +2,7 @@
 #define __PLL_H
 
 void pll_config_for_clock(int freq);
+void pll_config_hdmi_in_for_clock(int n, int freq);
 void pll_dump(void);
 
 #endif
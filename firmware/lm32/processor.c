@@ -498,6 +498,23 @@ void processor_update(void)
 #endif
 }
 
+#ifdef ENCODER_BASE
+/* motion on the encoder source since the last call (motion detector or
+   tile hashes, always for sources without them) */
+static int processor_encoder_motion(void)
+{
+#if defined(CSR_HDMI_IN0_FRAME_MOTION_EV_PENDING_ADDR) || defined(CSR_HDMI_IN0_DMA_TILE_DIRTY_COUNT_ADDR)
+	if(processor_encoder_source == VIDEO_IN_HDMI_IN0)
+		return hdmi_in0_motion();
+#endif
+#if defined(CSR_HDMI_IN1_FRAME_MOTION_EV_PENDING_ADDR) || defined(CSR_HDMI_IN1_DMA_TILE_DIRTY_COUNT_ADDR)
+	if(processor_encoder_source == VIDEO_IN_HDMI_IN1)
+		return hdmi_in1_motion();
+#endif
+	return 1;
+}
+#endif
+
 void processor_service(void)
 {
 #ifdef CSR_HDMI_IN0_BASE
@@ -508,6 +525,8 @@ void processor_service(void)
 #endif
 	processor_update();
 #ifdef ENCODER_BASE
-		encoder_service();
+	if(processor_encoder_motion())
+		encoder_motion = 1;
+	encoder_service();
 #endif
 }
@@ -0,0 +1,118 @@
+# compare: data/image comparison for testbenches and hardware dumps
+
+import numpy as np
+
+
+def _asarray(data):
+    data = np.asarray(data)
+    if data.dtype == object:
+        data = data.astype(np.int64)
+    return data
+
+
+def find_shift(ref, res):
+    """Number of leading elements of res to drop so that res starts with ref[0]"""
+    ref, res = _asarray(ref), _asarray(res)
+    matches = np.flatnonzero(res[:-1] == ref[0]) if len(res) > 1 else []
+    return int(matches[0]) if len(matches) else max(len(res) - 1, 0)
+
+
+def align(p1, p2):
+    """Align the shorter of p1/p2 on the first element of the longer one
+
+    Returns (ref, res, shift): ref is the longer one, res the shifted shorter
+    one, both truncated to the same length.
+    """
+    p1, p2 = _asarray(p1), _asarray(p2)
+    ref, res = (p1, p2) if len(p1) >= len(p2) else (p2, p1)
+    shift = find_shift(ref, res)
+    res = res[shift:]
+    length = min(len(ref), len(res))
+    return ref[:length], res[:length], shift
+
+
+def check(p1, p2):
+    """Returns (shift, length, errors), see align"""
+    if isinstance(p1, int):
+        return 0, 1, int(p1 != p2)
+    ref, res, shift = align(p1, p2)
+    return shift, len(ref), int(np.count_nonzero(ref != res))
+
+
+def unpack_planes(words, dw=8, n=3):
+    """Split packed words in n planes (first plane in MSBs)"""
+    words = _asarray(words).astype(np.int64)
+    return [(words >> (dw*(n-1-i))) & (2**dw - 1) for i in range(n)]
+
+
+def psnr(reference, data, peak=255):
+    mse = np.mean((np.asarray(reference, dtype=np.float64) - np.asarray(data, dtype=np.float64))**2)
+    return float("inf") if mse == 0 else float(10*np.log10(peak**2/mse))
+
+
+def _box_mean(x, size):
+    # mean over all size x size windows (valid), with an integral image
+    s = np.pad(x.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    return (s[size:, size:] - s[:-size, size:] - s[size:, :-size] + s[:-size, :-size])/size**2
+
+
+def ssim(reference, data, width=None, peak=255, size=8):
+    """Mean SSIM over size x size windows (single line if width is None)"""
+    x = np.asarray(reference, dtype=np.float64)
+    y = np.asarray(data, dtype=np.float64)
+    width = len(x) if width is None or len(x) < width else width
+    x = x[:len(x)//width*width].reshape(-1, width)
+    y = y[:len(y)//width*width].reshape(-1, width)
+    size = min(size, x.shape[0], x.shape[1])
+    c1 = (0.01*peak)**2
+    c2 = (0.03*peak)**2
+    mx, my = _box_mean(x, size), _box_mean(y, size)
+    vx = _box_mean(x*x, size) - mx*mx
+    vy = _box_mean(y*y, size) - my*my
+    cxy = _box_mean(x*y, size) - mx*my
+    s = ((2*mx*my + c1)*(2*cxy + c2))/((mx*mx + my*my + c1)*(vx + vy + c2))
+    return float(s.mean())
+
+
+def compare_planes(ref_planes, res_planes, width=None, names=None, peak=255):
+    """Per plane comparison of aligned planes
+
+    Returns a list of dicts: name, errors, max_error, psnr, ssim and
+    first_error ((x, y) of the first different pixel or None).
+    """
+    names = names or ["plane" + str(i) for i in range(len(ref_planes))]
+    results = []
+    for name, ref, res in zip(names, ref_planes, res_planes):
+        ref = _asarray(ref).astype(np.int64)
+        res = _asarray(res).astype(np.int64)
+        assert len(ref) == len(res), "{}: {} pixels, expected {}".format(name, len(res), len(ref))
+        diff = np.abs(ref - res)
+        errors = np.flatnonzero(diff)
+        first_error = None
+        if len(errors):
+            first_error = (int(errors[0] % width), int(errors[0]//width)) if width else (int(errors[0]), 0)
+        results.append({
+            "name": name,
+            "errors": len(errors),
+            "max_error": int(diff.max()) if len(diff) else 0,
+            "psnr": psnr(ref, res, peak),
+            "ssim": ssim(ref, res, width, peak) if len(ref) else 1.0,
+            "first_error": first_error
+        })
+    return results
+
+
+def compare_packed(p1, p2, width=None, names=["c0", "c1", "c2"], dw=8):
+    """Align packed pixels (see check) and compare them plane by plane"""
+    ref, res, shift = align(p1, p2)
+    planes = compare_planes(unpack_planes(ref, dw, len(names)),
+                            unpack_planes(res, dw, len(names)),
+                            width, names, 2**dw - 1)
+    return shift, len(ref), planes
+
+
+def print_comparison(planes):
+    for p in planes:
+        print("{:>6s}: errors {:d} / max error {:d} / psnr {:.2f} dB / ssim {:.4f}{}".format(
+            p["name"], p["errors"], p["max_error"], p["psnr"], p["ssim"],
+            "" if p["first_error"] is None else " / first error at {}".format(p["first_error"])))
@@ -0,0 +1,242 @@
+# colormatrix
+
+from migen.fhdl.std import *
+from migen.genlib.record import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.bank.description import *
+from migen.flow.actor import *
+
+from gateware.csc.common import *
+from gateware.csc.rgb2ycbcr import rgb2ycbcr_coefs
+from gateware.csc.ycbcr2rgb import ycbcr2rgb_coefs
+
+
+_standards = {
+    "bt601": (0.299, 0.114),
+    "bt709": (0.2126, 0.0722)
+}
+
+
+def _invert(m):
+    det = (m[0][0]*(m[1][1]*m[2][2] - m[1][2]*m[2][1]) -
+           m[0][1]*(m[1][0]*m[2][2] - m[1][2]*m[2][0]) +
+           m[0][2]*(m[1][0]*m[2][1] - m[1][1]*m[2][0]))
+    cofactors = [[(m[(j+1)%3][(i+1)%3]*m[(j+2)%3][(i+2)%3] -
+                   m[(j+1)%3][(i+2)%3]*m[(j+2)%3][(i+1)%3])/det
+                  for j in range(3)] for i in range(3)]
+    return cofactors
+
+
+def _legacy_matrix(direction, dw):
+    if direction == "rgb2ycbcr":
+        # equation from XAPP930 (RGB2YCbCr)
+        c = rgb2ycbcr_coefs(dw)
+        ky = 1 - c["ca"] - c["cb"]
+        m = [[c["ca"], ky, c["cb"]],
+             [-c["cc"]*c["ca"], -c["cc"]*ky, c["cc"]*(1 - c["cb"])],
+             [c["cd"]*(1 - c["ca"]), -c["cd"]*ky, -c["cd"]*c["cb"]]]
+        return m, [0, 0, 0], [c["yoffset"], c["coffset"], c["coffset"]]
+    else:
+        # equation from XAPP931 (YCbCr2RGB)
+        c = ycbcr2rgb_coefs(dw)
+        m = [[1, 0, c["acoef"]],
+             [1, c["bcoef"], c["ccoef"]],
+             [1, c["dcoef"], 0]]
+        return m, [c["yoffset"], c["coffset"], c["coffset"]], [0, 0, 0]
+
+
+def color_matrix_coefs(standard="bt601", direction="rgb2ycbcr", full_range=False, dw=8, frac_w=12):
+    """Coefficients set for ColorMatrix
+
+    standard: "bt601", "bt709" or "legacy" (fixed RGB2YCbCr/YCbCr2RGB equations)
+    direction: "rgb2ycbcr" or "ycbcr2rgb"
+    full_range: YCbCr on 0..2**dw-1 instead of 16..235/240 (scaled to dw)
+
+    Returns a dict of integers indexed by ColorMatrixControl CSR names.
+    """
+    if standard == "legacy":
+        m, ioffset, ooffset = _legacy_matrix(direction, dw)
+    else:
+        kr, kb = _standards[standard]
+        kg = 1 - kr - kb
+        yscale = 1 if full_range else 219*2**(dw-8)/(2**dw-1)
+        cscale = 1 if full_range else 224*2**(dw-8)/(2**dw-1)
+        yoffset = 0 if full_range else 16*2**(dw-8)
+        coffset = 2**(dw-1)
+        m = [[kr*yscale, kg*yscale, kb*yscale],
+             [-kr*cscale/(2*(1-kb)), -kg*cscale/(2*(1-kb)), (1-kb)*cscale/(2*(1-kb))],
+             [(1-kr)*cscale/(2*(1-kr)), -kg*cscale/(2*(1-kr)), -kb*cscale/(2*(1-kr))]]
+        ioffset = [0, 0, 0]
+        ooffset = [yoffset, coffset, coffset]
+        if direction == "ycbcr2rgb":
+            m = _invert(m)
+            ioffset, ooffset = ooffset, ioffset
+
+    coefs = {}
+    for i in range(3):
+        for j in range(3):
+            coefs["m"+str(i)+str(j)] = int(round(m[i][j]*2**frac_w))
+        coefs["ioffset"+str(i)] = int(ioffset[i])
+        coefs["ooffset"+str(i)] = int(ooffset[i])
+    return coefs
+
+
+def color_matrix_layout(coef_w, offset_w):
+    layout = [("m"+str(i)+str(j), coef_w) for i in range(3) for j in range(3)]
+    layout += [("ioffset"+str(i), offset_w) for i in range(3)]
+    layout += [("ooffset"+str(i), offset_w) for i in range(3)]
+    return layout
+
+
+datapath_latency = 4
+
+# stages fused to reduce pipeline_depth, by order of preference:
+# - input offset + multiply (fits DSP48 pre-adder)
+# - sum + saturate
+_fused_stages = [1, 3]
+
+
+def color_matrix_registered_stages(pipeline_depth):
+    assert pipeline_depth in range(datapath_latency - len(_fused_stages), datapath_latency + 1)
+    registered = [True]*datapath_latency
+    for n in _fused_stages[:datapath_latency - pipeline_depth]:
+        registered[n-1] = False
+    return registered
+
+
+@DecorateModule(InsertCE)
+class ColorMatrixDatapath(Module):
+    def __init__(self, sink_layout, source_layout, coef_w, offset_w, frac_w,
+                 pipeline_depth=datapath_latency):
+        self.sink = sink = Record(sink_layout)
+        self.source = source = Record(source_layout)
+        self.coefs = coefs = Record(color_matrix_layout(coef_w, offset_w))
+
+        # # #
+
+        sink_names = [name for name, dw in sink_layout]
+        source_names = [name for name, dw in source_layout]
+        dw_i = sink_layout[0][1]
+        dw_o = source_layout[0][1]
+
+        # coefficients are two's complement
+        m = [[Signal((coef_w, True)) for j in range(3)] for i in range(3)]
+        ioffset = [Signal((offset_w, True)) for i in range(3)]
+        ooffset = [Signal((offset_w, True)) for i in range(3)]
+        for i in range(3):
+            for j in range(3):
+                self.comb += m[i][j].eq(getattr(coefs, "m"+str(i)+str(j)))
+            self.comb += [
+                ioffset[i].eq(getattr(coefs, "ioffset"+str(i))),
+                ooffset[i].eq(getattr(coefs, "ooffset"+str(i)))
+            ]
+
+        # registered or combinatorial stages
+        registered = color_matrix_registered_stages(pipeline_depth)
+        stages = [self.sync if r else self.comb for r in registered]
+
+        # Hardware implementation:
+        #   out_i = m_i0*(in_0 - ioffset_0) +
+        #           m_i1*(in_1 - ioffset_1) +
+        #           m_i2*(in_2 - ioffset_2) + ooffset_i
+
+        # stage 1
+        # in_j - ioffset_j
+        operand_w = max(dw_i, offset_w) + 2
+        operands = [Signal((operand_w, True)) for j in range(3)]
+        stages[0] += [operands[j].eq(getattr(sink, name) - ioffset[j])
+            for j, name in enumerate(sink_names)]
+
+        # stage 2
+        # m_ij*(in_j - ioffset_j)
+        products = [[Signal((operand_w + coef_w, True)) for j in range(3)] for i in range(3)]
+        stages[1] += [products[i][j].eq(operands[j]*m[i][j])
+            for i in range(3) for j in range(3)]
+
+        # stage 3
+        # sum of products + ooffset_i (+ rounding)
+        sums = [Signal((operand_w + coef_w + 2, True)) for i in range(3)]
+        stages[2] += [sums[i].eq(products[i][0] + products[i][1] + products[i][2] +
+                                 (ooffset[i] << frac_w) + 2**(frac_w-1))
+            for i in range(3)]
+
+        # stage 4
+        # saturate
+        results = [Signal((operand_w + coef_w + 2 - frac_w, True)) for i in range(3)]
+        self.comb += [results[i].eq(sums[i][frac_w:]) for i in range(3)]
+        stages[3] += [saturate(results[i], getattr(source, name), 0, 2**dw_o-1)
+            for i, name in enumerate(source_names)]
+
+
+class ColorMatrix(PipelinedActor, Module):
+    """3x3 matrix + offsets color space converter
+
+    Coefficients are taken from coefs (in the actor's clock domain), see
+    ColorMatrixControl.
+
+    Coefficients are programmable, so zero entries are not optimized: the
+    datapath uses 9 multipliers (9 DSP48A1 with the default widths) where
+    the fixed RGB2YCbCr/YCbCr2RGB use 4.
+    """
+    def __init__(self, sink_layout, source_layout, coef_w=16, offset_w=10, frac_w=12,
+                 pipeline_depth=datapath_latency):
+        self.sink = sink = Sink(EndpointDescription(sink_layout, packetized=True))
+        self.source = source = Source(EndpointDescription(source_layout, packetized=True))
+        self.coefs = Record(color_matrix_layout(coef_w, offset_w))
+        PipelinedActor.__init__(self, pipeline_depth)
+        self.latency = pipeline_depth
+
+        # # #
+
+        self.submodules.datapath = ColorMatrixDatapath(sink_layout, source_layout,
+                                                       coef_w, offset_w, frac_w,
+                                                       pipeline_depth)
+        self.comb += [
+            self.datapath.ce.eq(self.pipe_ce),
+            self.datapath.coefs.eq(self.coefs)
+        ]
+        for name, dw in sink_layout:
+            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
+        for name, dw in source_layout:
+            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+
+
+class ColorMatrixControl(Module, AutoCSR):
+    """Double buffered ColorMatrix coefficients
+
+    Coefficients CSRs can be written at any time, a write to update loads
+    them in the pix clock domain on the next latch pulse (typically at
+    vsync). pending stays set until then: wait for it to clear before
+    writing a new set.
+    """
+    def __init__(self, coefs, coef_w=16, offset_w=10):
+        self.latch = Signal()
+        self.coefs = Record(color_matrix_layout(coef_w, offset_w))
+
+        self._update = CSR()
+        self._pending = CSRStatus()
+
+        # # #
+
+        self.submodules.update = PulseSynchronizer("sys", "pix")
+        self.comb += self.update.i.eq(self._update.re)
+
+        pending = Signal()
+        self.sync.pix += \
+            If(self.update.o,
+                pending.eq(1)
+            ).Elif(self.latch,
+                pending.eq(0)
+            )
+        self.specials += MultiReg(pending, self._pending.status)
+
+        for name, width in color_matrix_layout(coef_w, offset_w):
+            reset = coefs[name] & (2**width - 1)
+            storage = CSRStorage(width, reset=reset, name=name)
+            setattr(self, "_" + name, storage)
+
+            storage_pix = Signal(width, reset=reset)
+            active = Signal(width, reset=reset)
+            self.specials += MultiReg(storage.storage, storage_pix, "pix")
+            self.sync.pix += If(self.latch & pending, active.eq(storage_pix))
+            self.comb += getattr(self.coefs, name).eq(active)
@@ -26,3 +26,15 @@ def ycbcr444_layout(dw):
 
 def ycbcr422_layout(dw):
     return [("y", dw), ("cb_cr", dw)]
+
+
+def lanes_layout(layout, lanes):
+    if lanes == 1:
+        return layout
+    return [("p"+str(i), layout) for i in range(lanes)]
+
+
+def get_lane(payload, n, lanes):
+    if lanes == 1:
+        return payload
+    return getattr(payload, "p"+str(n))
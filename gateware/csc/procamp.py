@@ -0,0 +1,196 @@
+# procamp
+
+from migen.fhdl.std import *
+from migen.genlib.record import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.bank.description import *
+from migen.flow.actor import *
+
+from gateware.csc.common import *
+
+
+def gamma_lut(gamma, dw=8):
+    vmax = 2**dw - 1
+    return [int(round(vmax*(i/vmax)**(1/gamma))) for i in range(2**dw)]
+
+
+def procamp_layout(dw, gain_w):
+    layout = []
+    for name in ["y", "cb", "cr"]:
+        layout += [
+            (name + "_gain", gain_w, DIR_M_TO_S),
+            (name + "_offset", dw + 1, DIR_M_TO_S),
+            (name + "_lut_adr", dw, DIR_S_TO_M),
+            (name + "_lut_re", 1, DIR_S_TO_M),
+            (name + "_lut_dat", dw, DIR_M_TO_S)
+        ]
+    return layout
+
+
+datapath_latency = 3
+
+@DecorateModule(InsertCE)
+class ProcAmpDatapath(Module):
+    """Per channel gain and offset
+
+      y = (y - 16)*y_gain + 16 + y_offset
+      c = (c - 128)*c_gain + 128 + c_offset
+
+    gains are unsigned with frac_w fractional bits, offsets are signed.
+    """
+    def __init__(self, dw, gain_w, frac_w):
+        self.sink = sink = Record(ycbcr444_layout(dw))
+        self.source = source = Record(ycbcr444_layout(dw))
+        self.gains = [Signal(gain_w) for i in range(3)]
+        self.offsets = [Signal((dw + 1, True)) for i in range(3)]
+
+        # # #
+
+        pivots = [2**(dw-4), 2**(dw-1), 2**(dw-1)]
+        names = ["y", "cb", "cr"]
+
+        # stage 1
+        # c - pivot
+        centered = [Signal((dw + 1, True)) for i in range(3)]
+        self.sync += [centered[i].eq(getattr(sink, name) - pivots[i])
+            for i, name in enumerate(names)]
+
+        # stage 2
+        # (c - pivot)*gain
+        scaled = [Signal((dw + gain_w + 2, True)) for i in range(3)]
+        self.sync += [scaled[i].eq(centered[i]*self.gains[i]) for i in range(3)]
+
+        # stage 3
+        # (c - pivot)*gain + pivot + offset (+ rounding), saturate
+        sums = [Signal((dw + gain_w + 3, True)) for i in range(3)]
+        results = [Signal((dw + gain_w + 3 - frac_w, True)) for i in range(3)]
+        for i, name in enumerate(names):
+            self.comb += [
+                sums[i].eq(scaled[i] + ((pivots[i] + self.offsets[i]) << frac_w) + 2**(frac_w-1)),
+                results[i].eq(sums[i][frac_w:])
+            ]
+            self.sync += saturate(results[i], getattr(source, name), 0, 2**dw-1)
+
+
+class ProcAmp(PipelinedActor, Module):
+    """Proc-amp: per channel gain/offset followed by Y and Cb/Cr LUTs (gamma)
+
+    Parameters and LUTs come from control (in the actor's clock domain), see
+    ProcAmpControl.
+    """
+    def __init__(self, dw=8, gain_w=10, frac_w=8):
+        self.sink = sink = Sink(EndpointDescription(ycbcr444_layout(dw), packetized=True))
+        self.source = source = Source(EndpointDescription(ycbcr444_layout(dw), packetized=True))
+        self.control = control = Record(procamp_layout(dw, gain_w))
+        latency = datapath_latency + 1
+        PipelinedActor.__init__(self, latency)
+        self.latency = latency
+
+        # # #
+
+        self.submodules.datapath = ProcAmpDatapath(dw, gain_w, frac_w)
+        self.comb += self.datapath.ce.eq(self.pipe_ce)
+        for i, name in enumerate(["y", "cb", "cr"]):
+            self.comb += [
+                getattr(self.datapath.sink, name).eq(getattr(sink, name)),
+                self.datapath.gains[i].eq(getattr(control, name + "_gain")),
+                self.datapath.offsets[i].eq(getattr(control, name + "_offset")),
+
+                # LUTs (synchronous read)
+                getattr(control, name + "_lut_adr").eq(getattr(self.datapath.source, name)),
+                getattr(control, name + "_lut_re").eq(self.pipe_ce),
+                getattr(source, name).eq(getattr(control, name + "_lut_dat"))
+            ]
+
+
+class ProcAmpControl(Module, AutoCSR):
+    """ProcAmp parameters and double buffered LUTs
+
+    LUTs are written to the inactive bank through lut_sel (0: Y, 1: Cb/Cr),
+    lut_adr, lut_dat and lut_we. A write to update loads gains/offsets and
+    swaps the banks of the LUTs written since the last swap in the pix clock
+    domain on the next latch pulse (typically at vsync), other LUTs are kept.
+    pending stays set until then: wait for it to clear before writing new
+    parameters or LUTs.
+    """
+    def __init__(self, dw=8, gain_w=10, frac_w=8):
+        self.latch = Signal()
+        self.control = control = Record(procamp_layout(dw, gain_w))
+
+        self._update = CSR()
+        self._pending = CSRStatus()
+        for name in ["y", "cb", "cr"]:
+            setattr(self, "_" + name + "_gain", CSRStorage(gain_w, reset=2**frac_w, name=name + "_gain"))
+            setattr(self, "_" + name + "_offset", CSRStorage(dw + 1, name=name + "_offset"))
+        self._lut_sel = CSRStorage()
+        self._lut_adr = CSRStorage(dw)
+        self._lut_dat = CSRStorage(dw)
+        self._lut_we = CSR()
+
+        # # #
+
+        # update
+        self.submodules.update = PulseSynchronizer("sys", "pix")
+        self.comb += self.update.i.eq(self._update.re)
+
+        pending = Signal()
+        self.sync.pix += \
+            If(self.update.o,
+                pending.eq(1)
+            ).Elif(self.latch,
+                pending.eq(0)
+            )
+        self.specials += MultiReg(pending, self._pending.status)
+
+        # gains/offsets
+        for name in ["y", "cb", "cr"]:
+            for param, reset in [("_gain", 2**frac_w), ("_offset", 0)]:
+                storage = getattr(self, "_" + name + param)
+                storage_pix = Signal(flen(storage.storage), reset=reset)
+                active = Signal(flen(storage.storage), reset=reset)
+                self.specials += MultiReg(storage.storage, storage_pix, "pix")
+                self.sync.pix += If(self.latch & pending, active.eq(storage_pix))
+                self.comb += getattr(control, name + param).eq(active)
+
+        # LUTs banks (identity at reset): pix reads the active one, sys
+        # writes the other one. Y and Cb/Cr banks are only swapped if written
+        # since their last swap (the inactive bank is stale otherwise)
+        banks = []
+        banks_sys = []
+        for sel in range(2):
+            bank = Signal()
+            bank_sys = Signal()
+            bank_sys_r = Signal()
+            written = Signal()
+            written_pix = Signal()
+            self.sync += [
+                bank_sys_r.eq(bank_sys),
+                If(self._lut_we.re & (self._lut_sel.storage == sel),
+                    written.eq(1)
+                ).Elif(bank_sys != bank_sys_r,
+                    written.eq(0)
+                )
+            ]
+            self.specials += MultiReg(written, written_pix, "pix")
+            self.sync.pix += If(self.latch & pending & written_pix, bank.eq(~bank))
+            self.specials += MultiReg(bank, bank_sys)
+            banks.append(bank)
+            banks_sys.append(bank_sys)
+
+        # LUTs, Cb and Cr LUTs have the same content (one read port each)
+        for sel, name in [(0, "y"), (1, "cb"), (1, "cr")]:
+            bank = banks[sel]
+            bank_sys = banks_sys[sel]
+            lut = Memory(dw, 2**(dw+1), init=list(range(2**dw))*2)
+            wrport = lut.get_port(write_capable=True)
+            rdport = lut.get_port(has_re=True, clock_domain="pix")
+            self.specials += lut, wrport, rdport
+            self.comb += [
+                wrport.adr.eq(Cat(self._lut_adr.storage, ~bank_sys)),
+                wrport.dat_w.eq(self._lut_dat.storage),
+                wrport.we.eq(self._lut_we.re & (self._lut_sel.storage == sel)),
+
+                rdport.adr.eq(Cat(getattr(control, name + "_lut_adr"), bank)),
+                rdport.re.eq(getattr(control, name + "_lut_re")),
+                getattr(control, name + "_lut_dat").eq(rdport.dat_r)
+            ]
@@ -6,9 +6,6 @@ from migen.flow.actor import *
 
 from gateware.csc.common import *
 
-# TODO:
-# - see if we can regroup some stages without impacting timings (would reduce latency and registers).
-
 def rgb2ycbcr_coefs(dw, cw=None):
     return {
         "ca" : coef(0.1819, cw),
@@ -26,10 +23,26 @@ def rgb2ycbcr_coefs(dw, cw=None):
 
 datapath_latency = 8
 
+# stages fused (first stage of the pair made combinatorial) to reduce
+# pipeline_depth, by order of preference:
+# - offset + saturate
+# - subtract + multiply (r-g/b-g)
+# - subtract + multiply (r-yraw/b-yraw)
+# - add + add (yraw)
+_fused_stages = [7, 1, 5, 3]
+
+
+def rgb2ycbcr_registered_stages(pipeline_depth):
+    assert pipeline_depth in range(datapath_latency - len(_fused_stages), datapath_latency + 1)
+    registered = [True]*datapath_latency
+    for n in _fused_stages[:datapath_latency - pipeline_depth]:
+        registered[n-1] = False
+    return registered
+
 
 @DecorateModule(InsertCE)
 class RGB2YCbCrDatapath(Module):
-    def __init__(self, rgb_w, ycbcr_w, coef_w):
+    def __init__(self, rgb_w, ycbcr_w, coef_w, pipeline_depth=datapath_latency):
         self.sink = sink = Record(rgb_layout(rgb_w))
         self.source = source = Record(ycbcr444_layout(ycbcr_w))
 
@@ -37,9 +50,15 @@ class RGB2YCbCrDatapath(Module):
 
         coefs = rgb2ycbcr_coefs(ycbcr_w, coef_w)
 
+        # registered or combinatorial stages
+        registered = rgb2ycbcr_registered_stages(pipeline_depth)
+        stages = [self.sync if r else self.comb for r in registered]
+        def delay(n):
+            return sum(registered[:n-1])
+
         # delay rgb signals
         rgb_delayed = [sink]
-        for i in range(datapath_latency):
+        for i in range(pipeline_depth):
             rgb_n = Record(rgb_layout(rgb_w))
             for name in ["r", "g", "b"]:
                 self.sync += getattr(rgb_n, name).eq(getattr(rgb_delayed[-1], name))
@@ -55,7 +74,7 @@ class RGB2YCbCrDatapath(Module):
         # (r-g) & (b-g)
         r_minus_g = Signal((rgb_w + 1, True))
         b_minus_g = Signal((rgb_w + 1, True))
-        self.sync += [
+        stages[0] += [
             r_minus_g.eq(sink.r - sink.g),
             b_minus_g.eq(sink.b - sink.g)
         ]
@@ -64,7 +83,7 @@ class RGB2YCbCrDatapath(Module):
         # ca*(r-g) & cb*(b-g)
         ca_mult_rg = Signal((rgb_w + coef_w + 1, True))
         cb_mult_bg = Signal((rgb_w + coef_w + 1, True))
-        self.sync += [
+        stages[1] += [
             ca_mult_rg.eq(r_minus_g * coefs["ca"]),
             cb_mult_bg.eq(b_minus_g * coefs["cb"])
         ]
@@ -72,15 +91,15 @@ class RGB2YCbCrDatapath(Module):
         # stage 3
         # ca*(r-g) + cb*(b-g)
         carg_plus_cbbg = Signal((rgb_w + coef_w + 9, True)) # XXX
-        self.sync += [
+        stages[2] += [
             carg_plus_cbbg.eq(ca_mult_rg + cb_mult_bg)
         ]
 
         # stage 4
         # yraw = ca*(r-g) + cb*(b-g) + g
         yraw = Signal((rgb_w + 3, True))
-        self.sync += [
-            yraw.eq(carg_plus_cbbg[coef_w:] + rgb_delayed[3].g)
+        stages[3] += [
+            yraw.eq(carg_plus_cbbg[coef_w:] + rgb_delayed[delay(4)].g)
         ]
 
         # stage 5
@@ -89,9 +108,9 @@ class RGB2YCbCrDatapath(Module):
         b_minus_yraw = Signal((rgb_w + 4, True))
         r_minus_yraw = Signal((rgb_w + 4, True))
         yraw_r0 = Signal((rgb_w + 3, True))
-        self.sync += [
-            b_minus_yraw.eq(rgb_delayed[4].b - yraw),
-            r_minus_yraw.eq(rgb_delayed[4].r - yraw),
+        stages[4] += [
+            b_minus_yraw.eq(rgb_delayed[delay(5)].b - yraw),
+            r_minus_yraw.eq(rgb_delayed[delay(5)].r - yraw),
             yraw_r0.eq(yraw)
         ]
 
@@ -101,7 +120,7 @@ class RGB2YCbCrDatapath(Module):
         cc_mult_ryraw = Signal((rgb_w + coef_w + 4, True))
         cd_mult_byraw = Signal((rgb_w + coef_w + 4, True))
         yraw_r1 = Signal((rgb_w + 3, True))
-        self.sync += [
+        stages[5] += [
             cc_mult_ryraw.eq(b_minus_yraw * coefs["cc"]),
             cd_mult_byraw.eq(r_minus_yraw * coefs["cd"]),
             yraw_r1.eq(yraw_r0)
@@ -114,7 +133,7 @@ class RGB2YCbCrDatapath(Module):
         y = Signal((rgb_w + 3, True))
         cb = Signal((rgb_w + 4, True))
         cr = Signal((rgb_w + 4, True))
-        self.sync += [
+        stages[6] += [
             y.eq(yraw_r1 + coefs["yoffset"]),
             cb.eq(cc_mult_ryraw[coef_w:] + coefs["coffset"]),
             cr.eq(cd_mult_byraw[coef_w:] + coefs["coffset"])
@@ -122,7 +141,7 @@ class RGB2YCbCrDatapath(Module):
 
         # stage 8
         # saturate
-        self.sync += [
+        stages[7] += [
             saturate(y, source.y, coefs["ymin"], coefs["ymax"]),
             saturate(cb, source.cb, coefs["cmin"], coefs["cmax"]),
             saturate(cr, source.cr, coefs["cmin"], coefs["cmax"])
@@ -130,17 +149,22 @@ class RGB2YCbCrDatapath(Module):
 
 
 class RGB2YCbCr(PipelinedActor, Module):
-    def __init__(self, rgb_w=8, ycbcr_w=8, coef_w=8):
-        self.sink = sink = Sink(EndpointDescription(rgb_layout(rgb_w), packetized=True))
-        self.source = source = Source(EndpointDescription(ycbcr444_layout(ycbcr_w), packetized=True))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
+    def __init__(self, rgb_w=8, ycbcr_w=8, coef_w=8, lanes=1, pipeline_depth=datapath_latency):
+        self.sink = sink = Sink(EndpointDescription(lanes_layout(rgb_layout(rgb_w), lanes), packetized=True))
+        self.source = source = Source(EndpointDescription(lanes_layout(ycbcr444_layout(ycbcr_w), lanes), packetized=True))
+        PipelinedActor.__init__(self, pipeline_depth)
+        self.latency = pipeline_depth
 
         # # #
 
-        self.submodules.datapath = RGB2YCbCrDatapath(rgb_w, ycbcr_w, coef_w)
-        self.comb += self.datapath.ce.eq(self.pipe_ce)
-        for name in ["r", "g", "b"]:
-            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
-        for name in ["y", "cb", "cr"]:
-            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        # one datapath per lane, lane 0 carries the first pixel
+        for i in range(lanes):
+            datapath = RGB2YCbCrDatapath(rgb_w, ycbcr_w, coef_w, pipeline_depth)
+            self.submodules += datapath
+            self.comb += datapath.ce.eq(self.pipe_ce)
+            sink_lane = get_lane(sink.payload, i, lanes)
+            source_lane = get_lane(source.payload, i, lanes)
+            for name in ["r", "g", "b"]:
+                self.comb += getattr(datapath.sink, name).eq(getattr(sink_lane, name))
+            for name in ["y", "cb", "cr"]:
+                self.comb += getattr(source_lane, name).eq(getattr(datapath.source, name))
@@ -0,0 +1,154 @@
+import argparse
+
+import numpy as np
+
+from gateware.csc.ycbcr444to422 import chroma_filters
+
+from gateware.csc.test.common import *
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(description="Compare YCbCr444to422 chroma "
+        "filters: resampling PSNR and behavioral JPEG bitstream size")
+    parser.add_argument("--quality", default=75, type=int, help="JPEG quality")
+    parser.add_argument("--size", default=256, type=int, help="image size")
+    return parser.parse_args()
+
+
+# Behavioral JPEG model (baseline, 8x8 DCT, Annex K quantization tables,
+# Huffman tables optimized per image: entropy coded size is estimated
+# with the entropy of the DC size / AC run-size symbols)
+_luma_quant = np.array([
+    16, 11, 10, 16,  24,  40,  51,  61,
+    12, 12, 14, 19,  26,  58,  60,  55,
+    14, 13, 16, 24,  40,  57,  69,  56,
+    14, 17, 22, 29,  51,  87,  80,  62,
+    18, 22, 37, 56,  68, 109, 103,  77,
+    24, 35, 55, 64,  81, 104, 113,  92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103,  99]).reshape(8, 8)
+
+_chroma_quant = np.array([
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99]).reshape(8, 8)
+
+_zigzag = sorted(range(64), key=lambda i: (i//8 + i%8, (i//8 if (i//8 + i%8) % 2 else i%8)))
+
+_dct = np.array([[np.sqrt((1 if k == 0 else 2)/8)*np.cos((2*n + 1)*k*np.pi/16)
+    for n in range(8)] for k in range(8)])
+
+
+def _quant_table(table, quality):
+    scale = 5000/quality if quality < 50 else 200 - 2*quality
+    return np.clip((table*scale + 50)//100, 1, 255)
+
+
+def _blocks(plane):
+    h, w = plane.shape
+    plane = np.pad(plane, ((0, -h % 8), (0, -w % 8)), mode="edge")
+    h, w = plane.shape
+    return plane.reshape(h//8, 8, w//8, 8).swapaxes(1, 2).reshape(-1, 8, 8), (h, w)
+
+
+def _unblocks(blocks, shape, crop):
+    h, w = shape
+    plane = blocks.reshape(h//8, w//8, 8, 8).swapaxes(1, 2).reshape(h, w)
+    return plane[:crop[0], :crop[1]]
+
+
+def _size(v):
+    v = np.abs(v)
+    size = np.zeros(v.shape, dtype=np.int64)
+    nz = v > 0
+    size[nz] = np.floor(np.log2(v[nz])).astype(np.int64) + 1
+    return size
+
+
+def _entropy_bits(symbols):
+    values, counts = np.unique(symbols, return_counts=True)
+    p = counts/counts.sum()
+    return float(-(counts*np.log2(p)).sum())
+
+
+def _encode_plane(plane, quant):
+    blocks, shape = _blocks(plane.astype(np.float64) - 128)
+    coefs = np.einsum("ij,bjk,lk->bil", _dct, blocks, _dct)
+    q = np.round(coefs/quant).astype(np.int64)
+    decoded = np.einsum("ji,bjk,kl->bil", _dct, q*quant, _dct) + 128
+    zz = q.reshape(-1, 64)[:, _zigzag]
+
+    # DC: differential, size symbols + amplitude bits
+    dc_diff = np.diff(zz[:, 0], prepend=0)
+    dc_size = _size(dc_diff)
+
+    # AC: (run, size) symbols + amplitude bits, ZRL and EOB
+    ac = zz[:, 1:]
+    block, pos = np.nonzero(ac)
+    prev = np.full(len(pos), -1)
+    same = np.r_[False, block[1:] == block[:-1]]
+    prev[same] = pos[:-1][same[1:]]
+    run = pos - prev - 1
+    zrl = run//16
+    ac_size = _size(ac[block, pos])
+    last = np.full(len(ac), -1)
+    last[block] = pos
+    eob = np.count_nonzero(last != 62)
+    ac_symbols = np.r_[(run % 16)*16 + ac_size,
+                       np.full(zrl.sum(), 0xf0), np.zeros(eob, dtype=np.int64)]
+
+    bits = _entropy_bits(dc_size) + dc_size.sum()
+    bits += _entropy_bits(ac_symbols) + ac_size.sum()
+    return bits, _unblocks(np.clip(np.round(decoded), 0, 255), shape, plane.shape)
+
+
+def jpeg_model(y, cb_cr, width, quality=75):
+    """Encode 422 planes, returns bitstream size (bytes) and decoded 444 planes"""
+    y = y.reshape(-1, width)
+    cb_cr = cb_cr.reshape(-1, width)
+    bits = 0
+    planes = []
+    for plane, quant in [(y, _luma_quant), (cb_cr[:, 0::2], _chroma_quant), (cb_cr[:, 1::2], _chroma_quant)]:
+        plane_bits, decoded = _encode_plane(plane, _quant_table(quant, quality))
+        bits += plane_bits
+        planes.append(decoded)
+    y, cb, cr = planes
+    return int(bits//8), y.reshape(-1), np.repeat(cb, 2, axis=1).reshape(-1), np.repeat(cr, 2, axis=1).reshape(-1)
+
+
+def bench(name, filename, size, quality):
+    print(name)
+    for chroma_filter in ["average"] + sorted(chroma_filters.keys()):
+        raw_image = RAWImage(None, filename, size)
+        raw_image.rgb2ycbcr()
+        y, cb, cr = raw_image.y.copy(), raw_image.cb.copy(), raw_image.cr.copy()
+        r, g, b = raw_image.r.copy(), raw_image.g.copy(), raw_image.b.copy()
+        y422, cb_cr = ycbcr444to422(y, cb, cr, chroma_filter, raw_image.width)
+
+        # resampling PSNR (chroma replicated/interpolated back to 444)
+        chroma_psnr = []
+        for chroma_upsampling in ["replicate", "linear"]:
+            _, cb444, cr444 = ycbcr422to444(y422, cb_cr, chroma_upsampling, raw_image.width)
+            chroma_psnr.append(psnr(np.r_[cb, cr], np.r_[cb444, cr444]))
+
+        # JPEG size and PSNR of the decoded image
+        nbytes, *decoded = jpeg_model(y422, cb_cr, raw_image.width, quality)
+        raw_image.set_ycbcr(*decoded)
+        raw_image.ycbcr2rgb()
+        rgb_psnr = psnr(np.r_[r, g, b], np.clip(np.r_[raw_image.r, raw_image.g, raw_image.b], 0, 255))
+
+        print("  {:10s}: chroma PSNR {:6.2f} dB (linear: {:6.2f} dB) / "
+              "JPEG {:7d} bytes, RGB PSNR {:6.2f} dB".format(
+            chroma_filter, *chroma_psnr, nbytes, rgb_psnr))
+
+
+if __name__ == "__main__":
+    args = _get_args()
+    text_image(args.size).save("text.png")
+    bench("lena.png", "lena.png", args.size, args.quality)
+    bench("text.png", "text.png", args.size, args.quality)
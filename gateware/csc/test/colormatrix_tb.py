@@ -0,0 +1,70 @@
+import sys
+
+from migen.fhdl.std import *
+from migen.sim.generic import run_simulation
+from migen.flow.actor import EndpointDescription
+
+from gateware.csc.common import *
+from gateware.csc.rgb2ycbcr import rgb2ycbcr_coefs
+from gateware.csc.colormatrix import color_matrix_coefs, color_matrix_layout, ColorMatrix
+
+from gateware.csc.test.common import *
+
+
+class TB(Module):
+    def __init__(self, standard="bt601"):
+        self.coefs = color_matrix_coefs(standard, "rgb2ycbcr")
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)], packetized=True))
+        self.submodules.colormatrix = ColorMatrix(rgb_layout(8), ycbcr444_layout(8))
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)], packetized=True))
+        self.checked = False
+
+        self.comb += [
+            Record.connect(self.streamer.source, self.colormatrix.sink, leave_out=["data"]),
+            self.colormatrix.sink.payload.r.eq(self.streamer.source.data[16:24]),
+            self.colormatrix.sink.payload.g.eq(self.streamer.source.data[8:16]),
+            self.colormatrix.sink.payload.b.eq(self.streamer.source.data[0:8]),
+
+            Record.connect(self.colormatrix.source, self.logger.sink, leave_out=["y", "cb", "cr"]),
+            self.logger.sink.data[16:24].eq(self.colormatrix.source.y),
+            self.logger.sink.data[8:16].eq(self.colormatrix.source.cb),
+            self.logger.sink.data[0:8].eq(self.colormatrix.source.cr)
+        ]
+        for name, width in color_matrix_layout(16, 10):
+            self.comb += getattr(self.colormatrix.coefs, name).eq(self.coefs[name] & (2**width-1))
+
+
+    def gen_simulation(self, selfp):
+        for i in range(16):
+            yield
+
+        # convert image using colormatrix implementation
+        raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", 64)
+        raw_image.pack_rgb()
+        packet = Packet(raw_image.data)
+        self.streamer.send(packet)
+        yield from self.logger.receive()
+
+        # check implementation against bit exact model
+        reference = RAWImage(None, "lena.png", 64)
+        reference.color_matrix_rgb_model(self.coefs)
+        reference.pack_ycbcr()
+        s, l, e = check(reference.data.tolist(), self.logger.packet)
+        print("shift " + str(s))
+        print("length " + str(l))
+        print("errors " + str(e))
+        print_comparison(compare_packed(reference.data, self.logger.packet, reference.width,
+                                        ["y", "cb", "cr"])[2])
+
+        raw_image.set_data(self.logger.packet)
+        raw_image.unpack_ycbcr()
+        raw_image.ycbcr2rgb()
+        raw_image.save("lena_colormatrix.png")
+        assert l == reference.length and e == 0
+        self.checked = True
+
+if __name__ == "__main__":
+    standard = sys.argv[1] if len(sys.argv) > 1 else "bt601"
+    tb = TB(standard)
+    run_simulation(tb, ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    assert tb.checked
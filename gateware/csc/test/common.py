@@ -1,12 +1,19 @@
-from PIL import Image
+from PIL import Image, ImageDraw
 
 import random
-import copy
+from collections import deque
+
+import numpy as np
 
 from migen.fhdl.std import *
 from migen.flow.actor import Sink, Source
 from migen.genlib.record import *
 
+from gateware.csc.rgb2ycbcr import rgb2ycbcr_coefs
+from gateware.csc.ycbcr2rgb import ycbcr2rgb_coefs
+from gateware.csc.ycbcr444to422 import chroma_filters
+from gateware.compare import *
+
 
 def seed_to_data(seed, random=True):
     if random:
@@ -23,53 +30,232 @@ def comp(p1, p2):
     return r
 
 
-def check(p1, p2):
-    p1 = copy.deepcopy(p1)
-    p2 = copy.deepcopy(p2)
-    if isinstance(p1, int):
-        return 0, 1, int(p1 != p2)
-    else:
-        if len(p1) >= len(p2):
-            ref, res = p1, p2
+def randn(max_n):
+    return random.randint(0, max_n-1)
+
+
+# Plane helpers for the RAWImage models: same evaluation order as the
+# scalar expressions they replace, accumulated in place.
+def _lincomb(offset, *terms):
+    r = None
+    for a, x in terms:
+        if r is None:
+            r = x.copy() if a == 1 else a*x
         else:
-            ref, res = p2, p1
-        shift = 0
-        while((ref[0] != res[0]) and (len(res) > 1)):
-            res.pop(0)
-            shift += 1
-        length = min(len(ref), len(res))
-        errors = 0
-        for i in range(length):
-            if ref.pop(0) != res.pop(0):
-                errors += 1
-        return shift, length, errors
+            r += x if a == 1 else a*x
+    if offset:
+        r += offset
+    return r
 
 
-def randn(max_n):
-    return random.randint(0, max_n-1)
+# Planes are evaluated by chunks so that temporaries stay in cache
+_CHUNK = 1 << 15
+
+
+def _map_planes(f, *planes):
+    n = len(planes[0])
+    results = None
+    for start in range(0, n, _CHUNK):
+        s = slice(start, start + _CHUNK)
+        chunks = f(*[p[s].astype(np.float64) for p in planes])
+        if results is None:
+            results = [np.empty(n, dtype=np.int32) for c in chunks]
+        for result, c in zip(results, chunks):
+            result[s] = c # truncates towards zero like int()
+    return tuple(results)
+
+
+# Two's complement wrap of x to a signed nbits Signal
+def _wrap(x, nbits):
+    return ((x + 2**(nbits-1)) & (2**nbits - 1)) - 2**(nbits-1)
+
+
+def rgb2ycbcr_datapath(r, g, b, rgb_w=8, ycbcr_w=8, coef_w=8):
+    """Bit exact model of RGB2YCbCrDatapath
+
+    Follows the 8 pipeline stages with the same Signal widths, truncations
+    and saturation as the gateware (rgb_delayed alignment is implicit).
+    """
+    coefs = rgb2ycbcr_coefs(ycbcr_w, coef_w)
+    r = np.asarray(r, dtype=np.int64)
+    g = np.asarray(g, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+
+    # stage 1
+    r_minus_g = _wrap(r - g, rgb_w + 1)
+    b_minus_g = _wrap(b - g, rgb_w + 1)
+    # stage 2
+    ca_mult_rg = _wrap(r_minus_g*coefs["ca"], rgb_w + coef_w + 1)
+    cb_mult_bg = _wrap(b_minus_g*coefs["cb"], rgb_w + coef_w + 1)
+    # stage 3
+    carg_plus_cbbg = _wrap(ca_mult_rg + cb_mult_bg, rgb_w + coef_w + 9)
+    # stage 4
+    yraw = _wrap((carg_plus_cbbg >> coef_w) + g, rgb_w + 3)
+    # stage 5
+    b_minus_yraw = _wrap(b - yraw, rgb_w + 4)
+    r_minus_yraw = _wrap(r - yraw, rgb_w + 4)
+    # stage 6
+    cc_mult_ryraw = _wrap(b_minus_yraw*coefs["cc"], rgb_w + coef_w + 4)
+    cd_mult_byraw = _wrap(r_minus_yraw*coefs["cd"], rgb_w + coef_w + 4)
+    # stage 7
+    y = _wrap(yraw + coefs["yoffset"], rgb_w + 3)
+    cb = _wrap((cc_mult_ryraw >> coef_w) + coefs["coffset"], rgb_w + 4)
+    cr = _wrap((cd_mult_byraw >> coef_w) + coefs["coffset"], rgb_w + 4)
+    # stage 8
+    y = np.clip(y, coefs["ymin"], coefs["ymax"])
+    cb = np.clip(cb, coefs["cmin"], coefs["cmax"])
+    cr = np.clip(cr, coefs["cmin"], coefs["cmax"])
+    return y, cb, cr
+
+
+def ycbcr2rgb_datapath(y, cb, cr, ycbcr_w=8, rgb_w=8, coef_w=8):
+    """Bit exact model of YCbCr2RGBDatapath"""
+    coefs = ycbcr2rgb_coefs(rgb_w, coef_w)
+    y = np.asarray(y, dtype=np.int64)
+    cb = np.asarray(cb, dtype=np.int64)
+    cr = np.asarray(cr, dtype=np.int64)
+    xcoef_w = coef_w - 2
+
+    # stage 1
+    cb_minus_coffset = _wrap(cb - coefs["coffset"], ycbcr_w + 1)
+    cr_minus_coffset = _wrap(cr - coefs["coffset"], ycbcr_w + 1)
+    # stage 2
+    y_minus_yoffset = _wrap(y - coefs["yoffset"], ycbcr_w + 1)
+    cr_minus_coffset_mult_acoef = _wrap(cr_minus_coffset*coefs["acoef"], ycbcr_w + coef_w + 4)
+    cb_minus_coffset_mult_bcoef = _wrap(cb_minus_coffset*coefs["bcoef"], ycbcr_w + coef_w + 4)
+    cr_minus_coffset_mult_ccoef = _wrap(cr_minus_coffset*coefs["ccoef"], ycbcr_w + coef_w + 4)
+    cb_minus_coffset_mult_dcoef = _wrap(cb_minus_coffset*coefs["dcoef"], ycbcr_w + coef_w + 4)
+    # stage 3
+    r = _wrap(y_minus_yoffset + (cr_minus_coffset_mult_acoef >> xcoef_w), ycbcr_w + 4)
+    g = _wrap(y_minus_yoffset + (cb_minus_coffset_mult_bcoef >> xcoef_w) +
+              (cr_minus_coffset_mult_ccoef >> xcoef_w), ycbcr_w + 4)
+    b = _wrap(y_minus_yoffset + (cb_minus_coffset_mult_dcoef >> xcoef_w), ycbcr_w + 4)
+    # stage 4
+    r = np.clip(r, 0, 2**rgb_w-1)
+    g = np.clip(g, 0, 2**rgb_w-1)
+    b = np.clip(b, 0, 2**rgb_w-1)
+    return r, g, b
+
+
+# Bit exact model of ColorMatrixDatapath (4 stages)
+def color_matrix_datapath(c0, c1, c2, coefs, dw_o=8, frac_w=12):
+    operands = [c - coefs["ioffset"+str(j)] for j, c in enumerate([c0, c1, c2])]
+    results = []
+    for i in range(3):
+        s = coefs["ooffset"+str(i)] << frac_w
+        s += 2**(frac_w-1)
+        for j in range(3):
+            s = s + coefs["m"+str(i)+str(j)]*operands[j]
+        results.append(np.clip(s >> frac_w, 0, 2**dw_o-1))
+    return results
+
+
+# Model of ProcAmp (gains/offsets then LUTs)
+def procamp(y, cb, cr, gains, offsets, luts, dw=8, frac_w=8):
+    pivots = [2**(dw-4), 2**(dw-1), 2**(dw-1)]
+    results = []
+    for c, pivot, gain, offset, lut in zip([y, cb, cr], pivots, gains, offsets, luts):
+        v = ((c - pivot)*gain + ((pivot + offset) << frac_w) + 2**(frac_w-1)) >> frac_w
+        results.append(np.asarray(lut)[np.clip(v, 0, 2**dw-1)])
+    return results
+
+
+# Low-pass filter of each line, edge pixels replicated outside of the line
+def _filter_lines(c, taps, shift, line_width, dw=8):
+    half = len(taps)//2
+    lines = np.pad(c.reshape(-1, line_width), ((0, 0), (half, half)), mode="edge")
+    filtered = np.zeros((lines.shape[0], line_width), dtype=c.dtype)
+    for i, tap in enumerate(taps):
+        if tap:
+            filtered += tap*lines[:, 2*half-i:2*half-i+line_width]
+    return np.clip((filtered + 2**(shift-1)) >> shift, 0, 2**dw-1)
+
+
+# YCbCr444to422/YCbCr422to444 models (pairs aligned on the first pixel)
+def ycbcr444to422(y, cb, cr, chroma_filter="average", line_width=None):
+    if chroma_filter == "average":
+        cb_mean = (cb[0::2] + cb[1::2]) >> 1
+        cr_mean = (cr[0::2] + cr[1::2]) >> 1
+        cb_cr = np.empty_like(y)
+        cb_cr[0::2] = cb_mean
+        cb_cr[1::2] = cr_mean
+        return y, cb_cr
+    # co-sited chroma filtered around even pixels, line_width=None for a
+    # single line
+    taps, shift = chroma_filters[chroma_filter]
+    line_width = len(y) if line_width is None else line_width
+    cb_filtered = _filter_lines(cb, taps, shift, line_width)
+    cr_filtered = _filter_lines(cr, taps, shift, line_width)
+    cb_cr = np.empty_like(cb_filtered)
+    cb_cr[:, 0::2] = cb_filtered[:, 0::2]
+    cb_cr[:, 1::2] = cr_filtered[:, 0:line_width-1:2]
+    return y, cb_cr.reshape(-1)
+
+
+def ycbcr422to444(y, cb_cr, chroma_upsampling="replicate", line_width=None):
+    if chroma_upsampling == "replicate":
+        cb = np.repeat(cb_cr[0::2], 2)
+        cr = np.repeat(cb_cr[1::2], 2)
+        return y, cb, cr
+    # odd pixels interpolated from the current and next pair, last pair of
+    # each line replicated, line_width=None for a single line
+    line_width = len(y) if line_width is None else line_width
+    lines = cb_cr.reshape(-1, line_width)
+    planes = []
+    for c in [lines[:, 0::2], lines[:, 1::2]]:
+        c_next = np.concatenate([c[:, 1:], c[:, -1:]], axis=1)
+        c444 = np.empty_like(lines)
+        c444[:, 0::2] = c
+        c444[:, 1::2] = (c + c_next + 1) >> 1
+        planes.append(c444.reshape(-1))
+    return y, planes[0], planes[1]
+
+
+# Pack/unpack consecutive pixels of a packet into lanes words (lane 0 first)
+def pack_lanes(data, lanes, dw=24):
+    data = np.asarray(data, dtype=object).reshape(-1, lanes)
+    words = data[:, 0].copy()
+    for i in range(1, lanes):
+        words |= data[:, i] << (dw*i)
+    return words.tolist()
+
+
+def unpack_lanes(words, lanes, dw=24):
+    data = []
+    for word in words:
+        for i in range(lanes):
+            data.append((word >> (dw*i)) & (2**dw - 1))
+    return data
 
 
 class Packet(list):
     def __init__(self, init=[]):
+        if isinstance(init, np.ndarray):
+            init = init.ravel().tolist()
+        list.__init__(self, init)
         self.ongoing = False
         self.done = False
-        for data in init:
-            self.append(data)
 
 
 class PacketStreamer(Module):
-    def __init__(self, description, last_be=None):
+    """Streams packets (lists or NumPy arrays), one word per cycle
+
+    level: probability (%) of an idle cycle between words.
+    """
+    def __init__(self, description, last_be=None, level=0):
         self.source = Source(description)
         self.last_be = last_be
+        self.level = level
 
         # # #
 
-        self.packets = []
+        self.packets = deque()
         self.packet = Packet()
         self.packet.done = True
+        self.index = 0
 
     def send(self, packet):
-        packet = copy.deepcopy(packet)
+        packet = Packet(packet)
         self.packets.append(packet)
         return packet
 
@@ -79,36 +265,40 @@ class PacketStreamer(Module):
             yield
 
     def do_simulation(self, selfp):
-        if len(self.packets) and self.packet.done:
-            self.packet = self.packets.pop(0)
-        if not self.packet.ongoing and not self.packet.done:
-            selfp.source.stb = 1
-            if self.source.description.packetized:
-                selfp.source.sop = 1
-            selfp.source.data = self.packet.pop(0)
-            self.packet.ongoing = True
-        elif selfp.source.stb == 1 and selfp.source.ack == 1:
-            if self.source.description.packetized:
-                selfp.source.sop = 0
-                if len(self.packet) == 1:
-                    selfp.source.eop = 1
-                    if self.last_be is not None:
-                        selfp.source.last_be = self.last_be
-                else:
-                    selfp.source.eop = 0
-                    if self.last_be is not None:
-                        selfp.source.last_be = 0
-            if len(self.packet) > 0:
+        pending = self.packet.ongoing
+        if pending and selfp.source.ack:
+            self.index += 1
+            pending = False
+            if self.index == len(self.packet):
+                self.packet.ongoing = False
+                self.packet.done = True
+        if not pending:
+            if self.packet.done and len(self.packets):
+                self.packet = self.packets.popleft()
+                self.index = 0
+            if not self.packet.done and randn(100) >= self.level:
                 selfp.source.stb = 1
-                selfp.source.data = self.packet.pop(0)
+                selfp.source.data = self.packet[self.index]
+                if self.source.description.packetized:
+                    last = self.index == len(self.packet) - 1
+                    selfp.source.sop = self.index == 0
+                    selfp.source.eop = last
+                    if self.last_be is not None:
+                        selfp.source.last_be = self.last_be if last else 0
+                self.packet.ongoing = True
             else:
-                self.packet.done = True
                 selfp.source.stb = 0
+                self.packet.ongoing = False
 
 
 class PacketLogger(Module):
-    def __init__(self, description):
+    """Logs packets
+
+    level: probability (%) of deasserting ack on a cycle.
+    """
+    def __init__(self, description, level=0):
         self.sink = Sink(description)
+        self.level = level
 
         # # #
 
@@ -120,8 +310,7 @@ class PacketLogger(Module):
             yield
 
     def do_simulation(self, selfp):
-        selfp.sink.ack = 1
-        if selfp.sink.stb:
+        if selfp.sink.stb and selfp.sink.ack:
             if self.sink.description.packetized:
                 if selfp.sink.sop:
                     self.packet = Packet()
@@ -132,6 +321,7 @@ class PacketLogger(Module):
                     self.packet.done = True
             else:
                 self.packet.append(selfp.sink.data)
+        selfp.sink.ack = randn(100) >= self.level
 
 
 class AckRandomizer(Module):
@@ -159,6 +349,18 @@ class AckRandomizer(Module):
             selfp.run = 1
 
 
+# Synthetic text/UI image (sharp colored edges)
+def text_image(size):
+    img = Image.new("RGB", (size, size), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    colors = [(255, 0, 0), (0, 128, 0), (0, 0, 255), (255, 0, 255), (0, 0, 0)]
+    for i in range(size//12):
+        draw.text((2, 12*i), "HDMI2USB chroma filter test 0123456789"*2, fill=colors[i % len(colors)])
+    for i in range(0, size, 16):
+        draw.line((i, 0, size - i, size - 1), fill=colors[(i//16) % len(colors)])
+    return img
+
+
 class RAWImage:
     def __init__(self, coefs, filename=None, size=None):
         self.r = None
@@ -173,6 +375,7 @@ class RAWImage:
 
         self.coefs = coefs
         self.size = size
+        self.width, self.height = (size, size) if isinstance(size, int) else (size or (None, None))
         self.length = None
 
         if filename is not None:
@@ -180,125 +383,144 @@ class RAWImage:
 
 
     def open(self, filename):
-        img = Image.open(filename)
+        img = Image.open(filename).convert("RGB")
         if self.size is not None:
-            img = img.resize((self.size, self.size), Image.ANTIALIAS)
-        r, g, b = zip(*list(img.getdata()))
-        self.set_rgb(r, g, b)
+            img = img.resize((self.width, self.height), Image.LANCZOS)
+        self.width, self.height = img.size
+        rgb = np.asarray(img).reshape(-1, 3)
+        self.set_rgb(*[np.ascontiguousarray(rgb[:, i], dtype=np.int32) for i in range(3)])
 
 
     def save(self, filename):
-        img = Image.new("RGB" ,(self.size, self.size))
-        img.putdata(list(zip(self.r, self.g, self.b)))
+        rgb = np.stack([self.r, self.g, self.b], axis=-1)
+        rgb = np.clip(rgb, 0, 255).astype(np.uint8)
+        img = Image.fromarray(rgb.reshape(self.height, self.width, 3), "RGB")
         img.save(filename)
 
 
     def set_rgb(self, r, g, b):
-        self.r = r
-        self.g = g
-        self.b = b
-        self.length = len(r)
+        self.r = np.asarray(r, dtype=np.int32)
+        self.g = np.asarray(g, dtype=np.int32)
+        self.b = np.asarray(b, dtype=np.int32)
+        self.length = len(self.r)
 
 
     def set_ycbcr(self, y, cb, cr):
-        self.y = y
-        self.cb = cb
-        self.cr = cr
-        self.length = len(y)
+        self.y = np.asarray(y, dtype=np.int32)
+        self.cb = np.asarray(cb, dtype=np.int32)
+        self.cr = np.asarray(cr, dtype=np.int32)
+        self.length = len(self.y)
 
 
     def set_data(self, data):
         self.data = data
 
 
-    def pack_rgb(self):
-        self.data = []
-        for i in range(self.length):
-            data = (self.r[i] & 0xff) << 16
-            data |= (self.g[i] & 0xff) << 8
-            data |= (self.b[i] & 0xff) << 0
-            self.data.append(data)
+    def _pack(self, c0, c1, c2):
+        data = (c0 & 0xff) << 16
+        data |= (c1 & 0xff) << 8
+        data |= c2 & 0xff
+        self.data = data
         return self.data
 
 
+    def _unpack(self):
+        data = np.asarray(self.data, dtype=np.int32)
+        return (data >> 16) & 0xff, (data >> 8) & 0xff, data & 0xff
+
+
+    def pack_rgb(self):
+        return self._pack(self.r, self.g, self.b)
+
+
     def pack_ycbcr(self):
-        self.data = []
-        for i in range(self.length):
-            data = (self.y[i] & 0xff) << 16
-            data |= (self.cb[i] & 0xff) << 8
-            data |= (self.cr[i] & 0xff) << 0
-            self.data.append(data)
-        return self.data
+        return self._pack(self.y, self.cb, self.cr)
 
 
     def unpack_rgb(self):
-        self.r = []
-        self.g = []
-        self.b = []
-        for data in self.data:
-            self.r.append((data >> 16) & 0xff)
-            self.g.append((data >> 8) & 0xff)
-            self.b.append((data >> 0) & 0xff)
+        self.r, self.g, self.b = self._unpack()
         return self.r, self.g, self.b
 
 
     def unpack_ycbcr(self):
-        self.y = []
-        self.cb = []
-        self.cr = []
-        for data in self.data:
-            self.y.append((data >> 16) & 0xff)
-            self.cb.append((data >> 8) & 0xff)
-            self.cr.append((data >> 0) & 0xff)
+        self.y, self.cb, self.cr = self._unpack()
         return self.y, self.cb, self.cr
 
 
     # Model for our implementation
     def rgb2ycbcr_model(self):
-        self.y  = []
-        self.cb = []
-        self.cr = []
-        for r, g, b in zip(self.r, self.g, self.b):
-            yraw = self.coefs["ca"]*(r-g) + self.coefs["cb"]*(b-g) + g
-            self.y.append(int(yraw + self.coefs["yoffset"]))
-            self.cb.append(int(self.coefs["cc"]*(b-yraw) + self.coefs["coffset"]))
-            self.cr.append(int(self.coefs["cd"]*(r-yraw) + self.coefs["coffset"]))
+        coefs = self.coefs
+        def model(r, g, b):
+            yraw = coefs["ca"]*(r - g)
+            yraw += coefs["cb"]*(b - g)
+            yraw += g
+            return (yraw + coefs["yoffset"],
+                    _lincomb(coefs["coffset"], (coefs["cc"], b - yraw)),
+                    _lincomb(coefs["coffset"], (coefs["cd"], r - yraw)))
+        self.y, self.cb, self.cr = _map_planes(model, self.r, self.g, self.b)
+        return self.y, self.cb, self.cr
+
+
+    # Bit exact model of our implementation
+    def rgb2ycbcr_datapath_model(self, rgb_w=8, ycbcr_w=8, coef_w=8):
+        self.y, self.cb, self.cr = rgb2ycbcr_datapath(self.r, self.g, self.b,
+                                                      rgb_w, ycbcr_w, coef_w)
         return self.y, self.cb, self.cr
 
 
     # Wikipedia implementation used as reference
     def rgb2ycbcr(self):
-        self.y = []
-        self.cb = []
-        self.cr = []
-        for r, g, b in zip(self.r, self.g, self.b):
-            self.y.append(int(0.299*r + 0.587*g + 0.114*b))
-            self.cb.append(int(-0.1687*r - 0.3313*g + 0.5*b + 128))
-            self.cr.append(int(0.5*r - 0.4187*g - 0.0813*b + 128))
+        def model(r, g, b):
+            return (_lincomb(0, (0.299, r), (0.587, g), (0.114, b)),
+                    _lincomb(128, (-0.1687, r), (-0.3313, g), (0.5, b)),
+                    _lincomb(128, (0.5, r), (-0.4187, g), (-0.0813, b)))
+        self.y, self.cb, self.cr = _map_planes(model, self.r, self.g, self.b)
         return self.y, self.cb, self.cr
 
 
     # Model for our implementation
     def ycbcr2rgb_model(self):
-        self.r = []
-        self.g = []
-        self.b = []
-        for y, cb, cr in zip(self.y, self.cb, self.cr):
-            self.r.append(int(y - self.coefs["yoffset"] + (cr - self.coefs["coffset"])*self.coefs["acoef"]))
-            self.g.append(int(y - self.coefs["yoffset"] + (cb - self.coefs["coffset"])*self.coefs["bcoef"] + (cr - self.coefs["coffset"])*self.coefs["ccoef"]))
-            self.b.append(int(y - self.coefs["yoffset"] + (cb - self.coefs["coffset"])*self.coefs["dcoef"]))
+        coefs = self.coefs
+        def model(y, cb, cr):
+            y = y - coefs["yoffset"]
+            cb = cb - coefs["coffset"]
+            cr = cr - coefs["coffset"]
+            return (_lincomb(0, (1, y), (coefs["acoef"], cr)),
+                    _lincomb(0, (1, y), (coefs["bcoef"], cb), (coefs["ccoef"], cr)),
+                    _lincomb(0, (1, y), (coefs["dcoef"], cb)))
+        self.r, self.g, self.b = _map_planes(model, self.y, self.cb, self.cr)
         return self.r, self.g, self.b
 
 
-    # Wikipedia implementation used as reference
-    def ycbcr2rgb(self):
-        self.r = []
-        self.g = []
-        self.b = []
-        for y, cb, cr in zip(self.y, self.cb, self.cr):
-            self.r.append(int(y + (cr - 128) *  1.402))
-            self.g.append(int(y + (cb - 128) * -0.34414 + (cr - 128) * -0.71414))
-            self.b.append(int(y + (cb - 128) *  1.772))
+    # Bit exact model of our implementation
+    def ycbcr2rgb_datapath_model(self, ycbcr_w=8, rgb_w=8, coef_w=8):
+        self.r, self.g, self.b = ycbcr2rgb_datapath(self.y, self.cb, self.cr,
+                                                    ycbcr_w, rgb_w, coef_w)
         return self.r, self.g, self.b
 
 
+    # Bit exact model of ColorMatrix (from RGB)
+    def color_matrix_rgb_model(self, coefs, dw_o=8, frac_w=12):
+        self.y, self.cb, self.cr = color_matrix_datapath(self.r, self.g, self.b,
+                                                         coefs, dw_o, frac_w)
+        return self.y, self.cb, self.cr
+
+
+    # Model of YCbCr444to422 followed by YCbCr422to444
+    def ycbcr_resampling_model(self, chroma_filter="average", chroma_upsampling="replicate",
+                               line_width=None):
+        y, cb_cr = ycbcr444to422(self.y, self.cb, self.cr, chroma_filter, line_width)
+        self.y, self.cb, self.cr = ycbcr422to444(y, cb_cr, chroma_upsampling, line_width)
+        return self.y, self.cb, self.cr
+
+
+    # Wikipedia implementation used as reference
+    def ycbcr2rgb(self):
+        def model(y, cb, cr):
+            cb = cb - 128
+            cr = cr - 128
+            return (_lincomb(0, (1, y), (1.402, cr)),
+                    _lincomb(0, (1, y), (-0.34414, cb), (-0.71414, cr)),
+                    _lincomb(0, (1, y), (1.772, cb)))
+        self.r, self.g, self.b = _map_planes(model, self.y, self.cb, self.cr)
+        return self.r, self.g, self.b
@@ -0,0 +1,94 @@
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from migen.fhdl.std import *
+from migen.sim.generic import run_simulation
+from migen.flow.actor import EndpointDescription, Source
+
+from gateware.csc.test.common import *
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(description="Simulated cycles per second of "
+        "PacketStreamer/PacketLogger vs packet size")
+    parser.add_argument("--level", default=0, type=int, help="backpressure/idle level (%%)")
+    parser.add_argument("--legacy", action="store_true",
+        help="also run the previous list based streamer (pop(0) per cycle)")
+    return parser.parse_args()
+
+
+class ListPacketStreamer(Module):
+    """Previous list based streamer (deepcopy and pop(0)), for reference"""
+    def __init__(self, description, level=0):
+        self.source = Source(description)
+
+        # # #
+
+        self.packets = []
+        self.packet = Packet()
+        self.packet.done = True
+
+    def send(self, packet):
+        packet = copy.deepcopy(Packet(packet))
+        self.packets.append(packet)
+        return packet
+
+    def do_simulation(self, selfp):
+        if len(self.packets) and self.packet.done:
+            self.packet = self.packets.pop(0)
+        if not self.packet.ongoing and not self.packet.done:
+            selfp.source.stb = 1
+            selfp.source.sop = 1
+            selfp.source.data = self.packet.pop(0)
+            self.packet.ongoing = True
+        elif selfp.source.stb == 1 and selfp.source.ack == 1:
+            selfp.source.sop = 0
+            selfp.source.eop = len(self.packet) == 1
+            if len(self.packet) > 0:
+                selfp.source.stb = 1
+                selfp.source.data = self.packet.pop(0)
+            else:
+                self.packet.done = True
+                selfp.source.stb = 0
+
+
+class LoopbackTB(Module):
+    def __init__(self, streamer_cls, frame, level=0):
+        self.frame = frame
+        description = EndpointDescription([("data", 24)], packetized=True)
+        self.submodules.streamer = streamer_cls(description, level=level)
+        self.submodules.logger = PacketLogger(description, level=level)
+        self.comb += Record.connect(self.streamer.source, self.logger.sink)
+        self.received = False
+
+    def gen_simulation(self, selfp):
+        self.streamer.send(self.frame)
+        yield from self.logger.receive()
+        self.received = True
+
+
+def bench(streamer_cls, sizes, level):
+    for width, height in sizes:
+        frame = np.random.randint(0, 2**24, width*height)
+        tb = LoopbackTB(streamer_cls, frame, level)
+        # idle cycles on both sides, 20% margin
+        ncycles = int(1.2*width*height/(1 - level/100)**2) + 256
+        start = time.time()
+        run_simulation(tb, ncycles=ncycles)
+        elapsed = time.time() - start
+        ok = tb.received and np.array_equal(np.array(tb.logger.packet), frame)
+        print("  {:4d}x{:<4d}: {:8d} cycles in {:7.2f}s, {:8.0f} cycles/s ({})".format(
+            width, height, ncycles, elapsed, ncycles/elapsed, "ok" if ok else "FAILED"))
+
+
+if __name__ == "__main__":
+    args = _get_args()
+    sizes = [(64, 64), (256, 256), (640, 480), (1280, 720)]
+    print("PacketStreamer/PacketLogger (level={})".format(args.level))
+    bench(PacketStreamer, sizes, args.level)
+    if args.legacy:
+        print("ListPacketStreamer (level=0)")
+        bench(ListPacketStreamer, sizes[:3], 0)
@@ -0,0 +1,34 @@
+import random
+
+from migen.fhdl.std import *
+from migen.sim.generic import run_simulation
+from migen.flow.actor import EndpointDescription
+
+from gateware.csc.test.common import *
+
+
+class TB(Module):
+    def __init__(self, packets, streamer_level=0, logger_level=0):
+        self.packets = packets
+        description = EndpointDescription([("data", 24)], packetized=True)
+        self.submodules.streamer = PacketStreamer(description, level=streamer_level)
+        self.submodules.logger = PacketLogger(description, level=logger_level)
+        self.comb += Record.connect(self.streamer.source, self.logger.sink)
+        self.received = []
+
+    def gen_simulation(self, selfp):
+        for packet in self.packets:
+            self.streamer.send(packet)
+            yield from self.logger.receive()
+            self.received.append(list(self.logger.packet))
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    packets = [[random.randrange(2**24) for i in range(n)] for n in [1, 2, 17, 1000]]
+    words = sum(len(packet) for packet in packets)
+    for streamer_level, logger_level in [(0, 0), (30, 0), (0, 30), (30, 30), (70, 70)]:
+        print("streamer level {}, logger level {}".format(streamer_level, logger_level))
+        tb = TB(packets, streamer_level, logger_level)
+        run_simulation(tb, ncycles=20*words)
+        assert tb.received == packets
@@ -0,0 +1,43 @@
+from migen.fhdl.std import *
+from migen.fhdl.tools import list_targets
+from migen.sim.generic import run_simulation
+
+from gateware.csc.common import *
+from gateware.csc.rgb2ycbcr import RGB2YCbCr
+from gateware.csc.colormatrix import ColorMatrix
+
+
+def register_count(actor):
+    fragment = actor.get_fragment()
+    return sum(flen(s) for s in list_targets(fragment.sync["sys"]))
+
+
+class LatencyTB(Module):
+    def __init__(self, actor):
+        self.submodules.actor = actor
+        self.comb += [
+            actor.sink.stb.eq(1),
+            actor.source.ack.eq(1)
+        ]
+        self.cycles = 0
+        self.latency = None
+
+    def do_simulation(self, selfp):
+        if self.latency is None and selfp.actor.source.stb:
+            self.latency = self.cycles
+        self.cycles += 1
+
+
+def bench(name, actor_cls, depths):
+    for pipeline_depth in depths:
+        registers = register_count(actor_cls(pipeline_depth))
+        tb = LatencyTB(actor_cls(pipeline_depth))
+        run_simulation(tb, ncycles=32)
+        print("{:12s} pipeline_depth={:d}: latency={} measured={} registers={:d}".format(
+            name, pipeline_depth, tb.actor.latency, tb.latency, registers))
+
+
+if __name__ == "__main__":
+    bench("RGB2YCbCr", lambda d: RGB2YCbCr(pipeline_depth=d), range(8, 3, -1))
+    bench("ColorMatrix", lambda d: ColorMatrix(rgb_layout(8), ycbcr444_layout(8), pipeline_depth=d),
+        range(4, 1, -1))
@@ -0,0 +1,137 @@
+from migen.fhdl.std import *
+from migen.sim.generic import run_simulation
+from migen.flow.actor import EndpointDescription
+
+from gateware.csc.common import *
+from gateware.csc.procamp import gamma_lut, ProcAmp, ProcAmpControl
+
+from gateware.csc.test.common import *
+
+
+class TB(Module):
+    def __init__(self):
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)], packetized=True))
+        self.submodules.procamp = ProcAmp()
+        self.submodules.procamp_control = RenameClockDomains(ProcAmpControl(), {"pix": "sys"})
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)], packetized=True))
+
+        self.comb += [
+            Record.connect(self.streamer.source, self.procamp.sink, leave_out=["data"]),
+            self.procamp.sink.payload.y.eq(self.streamer.source.data[16:24]),
+            self.procamp.sink.payload.cb.eq(self.streamer.source.data[8:16]),
+            self.procamp.sink.payload.cr.eq(self.streamer.source.data[0:8]),
+
+            Record.connect(self.procamp.source, self.logger.sink, leave_out=["y", "cb", "cr"]),
+            self.logger.sink.data[16:24].eq(self.procamp.source.y),
+            self.logger.sink.data[8:16].eq(self.procamp.source.cb),
+            self.logger.sink.data[0:8].eq(self.procamp.source.cr),
+
+            Record.connect(self.procamp_control.control, self.procamp.control)
+        ]
+
+        # parameter sets: gains, offsets, Y and Cb/Cr LUTs
+        self.parameters = [
+            ([320, 200, 200], [-10, 4, -4], [gamma_lut(2.2), gamma_lut(1.2)]),
+            ([200, 300, 240], [12, -6, 8], [gamma_lut(0.8), gamma_lut(1.6)])
+        ]
+        self.checked = False
+
+
+    def load(self, control, parameters, write_luts=True):
+        gains, offsets, luts = parameters
+
+        # gains/offsets
+        for i, name in enumerate(["y", "cb", "cr"]):
+            getattr(control, "_" + name + "_gain").storage = gains[i]
+            getattr(control, "_" + name + "_offset").storage = offsets[i] & 0x1ff
+
+        # luts (inactive bank)
+        if not write_luts:
+            return
+        for sel, lut in enumerate(luts):
+            control._lut_sel.storage = sel
+            for adr, dat in enumerate(lut):
+                control._lut_adr.storage = adr
+                control._lut_dat.storage = dat
+                control._lut_we.re = 1
+                yield
+                control._lut_we.re = 0
+
+
+    def update(self, control):
+        # update at next latch
+        control._update.re = 1
+        yield
+        control._update.re = 0
+        for i in range(8):
+            yield
+        control.latch = 1
+        yield
+        control.latch = 0
+        for i in range(8):
+            yield
+
+
+    def process(self, parameters, filename):
+        gains, offsets, luts = parameters
+
+        # process image using procamp implementation
+        raw_image = RAWImage(None, "lena.png", 64)
+        raw_image.rgb2ycbcr()
+        raw_image.pack_ycbcr()
+        packet = Packet(raw_image.data)
+        self.streamer.send(packet)
+        yield from self.logger.receive()
+
+        # check implementation against model
+        reference = RAWImage(None, "lena.png", 64)
+        reference.rgb2ycbcr()
+        reference.set_ycbcr(*procamp(reference.y, reference.cb, reference.cr,
+                                     gains, offsets, [luts[0]] + 2*[luts[1]]))
+        reference.pack_ycbcr()
+        s, l, e = check(reference.data.tolist(), self.logger.packet)
+        print("shift " + str(s))
+        print("length " + str(l))
+        print("errors " + str(e))
+        print_comparison(compare_packed(reference.data, self.logger.packet, reference.width,
+                                        ["y", "cb", "cr"])[2])
+
+        raw_image.set_data(self.logger.packet)
+        raw_image.unpack_ycbcr()
+        raw_image.ycbcr2rgb()
+        raw_image.save(filename)
+
+        assert l == reference.length and e == 0
+
+
+    def gen_simulation(self, selfp):
+        control = selfp.procamp_control
+        first, second = self.parameters
+
+        print("first parameters, after latch")
+        yield from self.load(control, first)
+        yield from self.update(control)
+        yield from self.process(first, "lena_procamp.png")
+
+        # second set written to the inactive bank: no effect until latch
+        print("second parameters written, before latch")
+        yield from self.load(control, second)
+        yield from self.process(first, "lena_procamp_pending.png")
+
+        print("second parameters, after latch (bank swap)")
+        yield from self.update(control)
+        yield from self.process(second, "lena_procamp_swapped.png")
+
+        # gains only: the LUTs of the second set are kept
+        print("gains updated, LUTs not written (no bank swap)")
+        gains_only = ([256, 280, 220], second[1], second[2])
+        yield from self.load(control, gains_only, write_luts=False)
+        yield from self.update(control)
+        yield from self.process(gains_only, "lena_procamp_gains.png")
+
+        self.checked = True
+
+if __name__ == "__main__":
+    tb = TB()
+    run_simulation(tb, ncycles=65536, vcd_name="my.vcd", keep_files=True)
+    assert tb.checked
@@ -0,0 +1,61 @@
+import argparse
+import time
+
+import numpy as np
+
+from gateware.csc.rgb2ycbcr import rgb2ycbcr_coefs
+
+from gateware.csc.test.common import *
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(description="Exhaustive RGB sweep of the "
+        "RGB2YCbCrDatapath bit exact model against a float reference")
+    parser.add_argument("--rgb_w", default=8, type=int, help="RGB width")
+    parser.add_argument("--ycbcr_w", default=8, type=int, help="YCbCr width")
+    parser.add_argument("--coef_w", default=8, type=int, help="coefficients width")
+    parser.add_argument("--step", default=1, type=int, help="sweep step on each component")
+    return parser.parse_args()
+
+
+def sweep(rgb_w, ycbcr_w, coef_w, step=1):
+    """Error histograms of the datapath against its own equation and
+    coefficients (rgb2ycbcr_coefs) in floating point: rounding errors only"""
+    values = np.arange(0, 2**rgb_w, step, dtype=np.int64)
+    g, b = [x.ravel() for x in np.meshgrid(values, values, indexing="ij")]
+    ymax = 2**ycbcr_w - 1
+
+    raw_image = RAWImage(rgb2ycbcr_coefs(ycbcr_w))
+    histograms = {name: {} for name in ["y", "cb", "cr"]}
+    for r in values:
+        r = np.full_like(g, r)
+        raw_image.set_rgb(r, g, b)
+        raw_image.rgb2ycbcr_model()
+        ref = [np.clip(c, 0, ymax) for c in [raw_image.y, raw_image.cb, raw_image.cr]]
+        res = raw_image.rgb2ycbcr_datapath_model(rgb_w, ycbcr_w, coef_w)
+        for name, c_ref, c_res in zip(["y", "cb", "cr"], ref, res):
+            errors, counts = np.unique(c_res - c_ref, return_counts=True)
+            for error, count in zip(errors.tolist(), counts.tolist()):
+                histograms[name][error] = histograms[name].get(error, 0) + count
+    return histograms
+
+
+def print_histograms(histograms):
+    for name, histogram in histograms.items():
+        total = sum(histogram.values())
+        errors = np.array(sorted(histogram.keys()))
+        counts = np.array([histogram[e] for e in errors])
+        print("{}: max abs error: {} / mean error: {:.4f} / exact: {:.2f}%".format(
+            name, np.abs(errors).max(), (errors*counts).sum()/total,
+            100*histogram.get(0, 0)/total))
+        for error, count in zip(errors, counts):
+            print("  {:4d}: {:9d} ({:6.2f}%)".format(error, count, 100*count/total))
+
+
+if __name__ == "__main__":
+    args = _get_args()
+    start = time.time()
+    histograms = sweep(args.rgb_w, args.ycbcr_w, args.coef_w, args.step)
+    print("rgb_w={} ycbcr_w={} coef_w={} ({:.1f}s)".format(
+        args.rgb_w, args.ycbcr_w, args.coef_w, time.time() - start))
+    print_histograms(histograms)
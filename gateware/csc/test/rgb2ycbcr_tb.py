@@ -1,3 +1,5 @@
+import sys
+
 from migen.fhdl.std import *
 from migen.sim.generic import run_simulation
 from migen.flow.actor import EndpointDescription
@@ -9,22 +11,30 @@ from gateware.csc.test.common import *
 
 
 class TB(Module):
-    def __init__(self):
-        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)], packetized=True))
-        self.submodules.rgb2ycbcr = RGB2YCbCr()
-        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)], packetized=True))
+    def __init__(self, lanes=1):
+        self.lanes = lanes
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.submodules.rgb2ycbcr = RGB2YCbCr(lanes=lanes)
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.checked = False
 
         self.comb += [
-        	Record.connect(self.streamer.source, self.rgb2ycbcr.sink, leave_out=["data"]),
-            self.rgb2ycbcr.sink.payload.r.eq(self.streamer.source.data[16:24]),
-            self.rgb2ycbcr.sink.payload.g.eq(self.streamer.source.data[8:16]),
-            self.rgb2ycbcr.sink.payload.b.eq(self.streamer.source.data[0:8]),
-
-            Record.connect(self.rgb2ycbcr.source, self.logger.sink, leave_out=["y", "cb", "cr"]),
-            self.logger.sink.data[16:24].eq(self.rgb2ycbcr.source.y),
-            self.logger.sink.data[8:16].eq(self.rgb2ycbcr.source.cb),
-            self.logger.sink.data[0:8].eq(self.rgb2ycbcr.source.cr)
+            Record.connect(self.streamer.source, self.rgb2ycbcr.sink, leave_out=["data"]),
+            Record.connect(self.rgb2ycbcr.source, self.logger.sink,
+                leave_out=["y", "cb", "cr"] + ["p"+str(i) for i in range(lanes)])
         ]
+        for i in range(lanes):
+            sink = get_lane(self.rgb2ycbcr.sink.payload, i, lanes)
+            source = get_lane(self.rgb2ycbcr.source.payload, i, lanes)
+            self.comb += [
+                sink.r.eq(self.streamer.source.data[24*i+16:24*i+24]),
+                sink.g.eq(self.streamer.source.data[24*i+8:24*i+16]),
+                sink.b.eq(self.streamer.source.data[24*i+0:24*i+8]),
+
+                self.logger.sink.data[24*i+16:24*i+24].eq(source.y),
+                self.logger.sink.data[24*i+8:24*i+16].eq(source.cb),
+                self.logger.sink.data[24*i+0:24*i+8].eq(source.cr)
+            ]
 
 
     def gen_simulation(self, selfp):
@@ -40,13 +50,32 @@ class TB(Module):
         # convert image using rgb2ycbcr implementation
         raw_image = RAWImage(rgb2ycbcr_coefs(8), "lena.png", 64)
         raw_image.pack_rgb()
-        packet = Packet(raw_image.data)
+        packet = Packet(pack_lanes(raw_image.data, self.lanes))
         self.streamer.send(packet)
         yield from self.logger.receive()
-        raw_image.set_data(self.logger.packet)
+        data = unpack_lanes(self.logger.packet, self.lanes)
+
+        # check implementation against bit exact model
+        reference = RAWImage(None, "lena.png", 64)
+        reference.rgb2ycbcr_datapath_model()
+        reference.pack_ycbcr()
+        s, l, e = check(reference.data.tolist(), data)
+        print("shift " + str(s))
+        print("length " + str(l))
+        print("errors " + str(e))
+        print_comparison(compare_packed(reference.data, data, reference.width,
+                                        ["y", "cb", "cr"])[2])
+
+        raw_image.set_data(data)
         raw_image.unpack_ycbcr()
         raw_image.ycbcr2rgb()
         raw_image.save("lena_rgb2ycbcr.png")
 
+        assert l == reference.length and e == 0
+        self.checked = True
+
 if __name__ == "__main__":
-    run_simulation(TB(), ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    lanes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    tb = TB(lanes)
+    run_simulation(tb, ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    assert tb.checked
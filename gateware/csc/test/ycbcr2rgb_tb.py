@@ -1,3 +1,5 @@
+import sys
+
 from migen.fhdl.std import *
 from migen.sim.generic import run_simulation
 from migen.flow.actor import EndpointDescription
@@ -8,22 +10,30 @@ from gateware.csc.ycbcr2rgb import ycbcr2rgb_coefs, YCbCr2RGB
 from gateware.csc.test.common import *
 
 class TB(Module):
-    def __init__(self):
-        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)], packetized=True))
-        self.submodules.ycbcr2rgb = YCbCr2RGB()
-        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)], packetized=True))
+    def __init__(self, lanes=1):
+        self.lanes = lanes
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.submodules.ycbcr2rgb = YCbCr2RGB(lanes=lanes)
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.checked = False
 
         self.comb += [
             Record.connect(self.streamer.source, self.ycbcr2rgb.sink, leave_out=["data"]),
-            self.ycbcr2rgb.sink.payload.y.eq(self.streamer.source.data[16:24]),
-            self.ycbcr2rgb.sink.payload.cb.eq(self.streamer.source.data[8:16]),
-            self.ycbcr2rgb.sink.payload.cr.eq(self.streamer.source.data[0:8]),
-
-            Record.connect(self.ycbcr2rgb.source, self.logger.sink, leave_out=["r", "g", "b"]),
-            self.logger.sink.data[16:24].eq(self.ycbcr2rgb.source.r),
-            self.logger.sink.data[8:16].eq(self.ycbcr2rgb.source.g),
-            self.logger.sink.data[0:8].eq(self.ycbcr2rgb.source.b)
+            Record.connect(self.ycbcr2rgb.source, self.logger.sink,
+                leave_out=["r", "g", "b"] + ["p"+str(i) for i in range(lanes)])
         ]
+        for i in range(lanes):
+            sink = get_lane(self.ycbcr2rgb.sink.payload, i, lanes)
+            source = get_lane(self.ycbcr2rgb.source.payload, i, lanes)
+            self.comb += [
+                sink.y.eq(self.streamer.source.data[24*i+16:24*i+24]),
+                sink.cb.eq(self.streamer.source.data[24*i+8:24*i+16]),
+                sink.cr.eq(self.streamer.source.data[24*i+0:24*i+8]),
+
+                self.logger.sink.data[24*i+16:24*i+24].eq(source.r),
+                self.logger.sink.data[24*i+8:24*i+16].eq(source.g),
+                self.logger.sink.data[24*i+0:24*i+8].eq(source.b)
+            ]
 
     def gen_simulation(self, selfp):
         # convert image using ycbcr2rgb model
@@ -39,13 +49,32 @@ class TB(Module):
         raw_image = RAWImage(ycbcr2rgb_coefs(8), "lena.png", 64)
         raw_image.rgb2ycbcr()
         raw_image.pack_ycbcr()
-        packet = Packet(raw_image.data)
+        packet = Packet(pack_lanes(raw_image.data, self.lanes))
         self.streamer.send(packet)
         yield from self.logger.receive()
-        raw_image.set_data(self.logger.packet)
+        data = unpack_lanes(self.logger.packet, self.lanes)
+
+        # check implementation against bit exact model
+        reference = RAWImage(None, "lena.png", 64)
+        reference.rgb2ycbcr()
+        reference.ycbcr2rgb_datapath_model()
+        reference.pack_rgb()
+        s, l, e = check(reference.data.tolist(), data)
+        print("shift " + str(s))
+        print("length " + str(l))
+        print("errors " + str(e))
+        print_comparison(compare_packed(reference.data, data, reference.width,
+                                        ["r", "g", "b"])[2])
+
+        raw_image.set_data(data)
         raw_image.unpack_rgb()
         raw_image.save("lena_ycbcr2rgb.png")
+        assert l == reference.length and e == 0
+        self.checked = True
 
 
 if __name__ == "__main__":
-    run_simulation(TB(), ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    lanes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    tb = TB(lanes)
+    run_simulation(tb, ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    assert tb.checked
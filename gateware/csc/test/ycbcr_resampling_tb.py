@@ -1,3 +1,5 @@
+import sys
+
 from migen.fhdl.std import *
 from migen.sim.generic import run_simulation
 from migen.flow.actor import EndpointDescription
@@ -9,43 +11,101 @@ from gateware.csc.ycbcr422to444 import YCbCr422to444
 from gateware.csc.test.common import *
 
 
+# round trip PSNR regression thresholds (dB, 64x64 images streamed as a
+# single line): numpy models results - 0.5 dB
+psnr_thresholds = {
+    ("average",  "replicate"): {"lena.png": 39.1, "text.png": 22.2},
+    ("average",  "linear"):    {"lena.png": 37.4, "text.png": 21.5},
+    ("121",      "replicate"): {"lena.png": 36.9, "text.png": 21.4},
+    ("121",      "linear"):    {"lena.png": 38.8, "text.png": 22.0},
+    ("halfband", "replicate"): {"lena.png": 36.9, "text.png": 21.4},
+    ("halfband", "linear"):    {"lena.png": 39.2, "text.png": 22.1}
+}
+
+
 class TB(Module):
-    def __init__(self):
-        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24)], packetized=True))
-        self.submodules.ycbcr444to422 = YCbCr444to422()
-        self.submodules.ycbcr422to444 = YCbCr422to444()
-        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24)], packetized=True))
+    def __init__(self, lanes=1, chroma_filter="average", chroma_upsampling="replicate"):
+        self.lanes = lanes
+        self.chroma_filter = chroma_filter
+        self.chroma_upsampling = chroma_upsampling
+        self.submodules.streamer = PacketStreamer(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.submodules.ycbcr444to422 = YCbCr444to422(lanes=lanes, chroma_filter=chroma_filter)
+        self.submodules.ycbcr422to444 = YCbCr422to444(lanes=lanes, chroma_upsampling=chroma_upsampling)
+        self.submodules.logger = PacketLogger(EndpointDescription([("data", 24*lanes)], packetized=True))
+        self.checked = False
 
         self.comb += [
             Record.connect(self.streamer.source, self.ycbcr444to422.sink, leave_out=["data"]),
-            self.ycbcr444to422.sink.payload.y.eq(self.streamer.source.data[16:24]),
-            self.ycbcr444to422.sink.payload.cb.eq(self.streamer.source.data[8:16]),
-            self.ycbcr444to422.sink.payload.cr.eq(self.streamer.source.data[0:8]),
-
             Record.connect(self.ycbcr444to422.source, self.ycbcr422to444.sink),
-
-            Record.connect(self.ycbcr422to444.source, self.logger.sink, leave_out=["y", "cb", "cr"]),
-            self.logger.sink.data[16:24].eq(self.ycbcr422to444.source.y),
-            self.logger.sink.data[8:16].eq(self.ycbcr422to444.source.cb),
-            self.logger.sink.data[0:8].eq(self.ycbcr422to444.source.cr)
+            Record.connect(self.ycbcr422to444.source, self.logger.sink,
+                leave_out=["y", "cb", "cr"] + ["p"+str(i) for i in range(lanes)])
         ]
+        for i in range(lanes):
+            sink = get_lane(self.ycbcr444to422.sink.payload, i, lanes)
+            source = get_lane(self.ycbcr422to444.source.payload, i, lanes)
+            self.comb += [
+                sink.y.eq(self.streamer.source.data[24*i+16:24*i+24]),
+                sink.cb.eq(self.streamer.source.data[24*i+8:24*i+16]),
+                sink.cr.eq(self.streamer.source.data[24*i+0:24*i+8]),
+
+                self.logger.sink.data[24*i+16:24*i+24].eq(source.y),
+                self.logger.sink.data[24*i+8:24*i+16].eq(source.cb),
+                self.logger.sink.data[24*i+0:24*i+8].eq(source.cr)
+            ]
 
 
     def gen_simulation(self, selfp):
         for i in range(16):
             yield
 
-        # chain ycbcr444to422 and ycbcr422to444
-        raw_image = RAWImage(None, "lena.png", 64)
-        raw_image.rgb2ycbcr()
-        raw_image.pack_ycbcr()
-        packet = Packet(raw_image.data)
-        self.streamer.send(packet)
-        yield from self.logger.receive()
-        raw_image.set_data(self.logger.packet)
-        raw_image.unpack_ycbcr()
-        raw_image.ycbcr2rgb()
-        raw_image.save("lena_resampling.png")
+        text_image(64).save("text.png")
+        for filename in ["lena.png", "text.png"]:
+            print(filename)
+
+            # chain ycbcr444to422 and ycbcr422to444
+            raw_image = RAWImage(None, filename, 64)
+            raw_image.rgb2ycbcr()
+            raw_image.pack_ycbcr()
+            original = raw_image.data.copy()
+            packet = Packet(pack_lanes(raw_image.data, self.lanes))
+            self.streamer.send(packet)
+            yield from self.logger.receive()
+            data = unpack_lanes(self.logger.packet, self.lanes)
+            # last pixels are not flushed out of the pipelines
+            length = len(data) - self.lanes*(self.ycbcr444to422.latency + self.ycbcr422to444.latency)
+
+            # check implementation against model
+            reference = RAWImage(None, filename, 64)
+            reference.rgb2ycbcr()
+            reference.ycbcr_resampling_model(self.chroma_filter, self.chroma_upsampling)
+            reference.pack_ycbcr()
+            s, l, e = check(reference.data[:length].tolist(), data[:length])
+            print("shift " + str(s))
+            print("length " + str(l))
+            print("errors " + str(e))
+            print_comparison(compare_packed(reference.data, data, reference.width,
+                                            ["y", "cb", "cr"])[2])
+            assert l == length and e == 0
+
+            # round trip PSNR regression
+            raw_image.set_data(data)
+            raw_image.unpack_ycbcr()
+            reference.set_data(original)
+            reference.unpack_ycbcr()
+            p = psnr(np.r_[reference.y[:length], reference.cb[:length], reference.cr[:length]],
+                     np.r_[raw_image.y[:length], raw_image.cb[:length], raw_image.cr[:length]])
+            threshold = psnr_thresholds[(self.chroma_filter, self.chroma_upsampling)][filename]
+            print("psnr {:.2f} dB (threshold {:.2f} dB)".format(p, threshold))
+            assert p >= threshold
+
+            raw_image.ycbcr2rgb()
+            raw_image.save(filename.replace(".png", "_resampling.png"))
+        self.checked = True
 
 if __name__ == "__main__":
-    run_simulation(TB(), ncycles=8192, vcd_name="my.vcd", keep_files=True)
+    lanes = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    chroma_filter = sys.argv[2] if len(sys.argv) > 2 else "average"
+    chroma_upsampling = sys.argv[3] if len(sys.argv) > 3 else "replicate"
+    tb = TB(lanes, chroma_filter, chroma_upsampling)
+    run_simulation(tb, ncycles=16384, vcd_name="my.vcd", keep_files=True)
+    assert tb.checked
@@ -105,17 +105,22 @@ class YCbCr2RGBDatapath(Module):
 
 
 class YCbCr2RGB(PipelinedActor, Module):
-    def __init__(self, ycbcr_w=8, rgb_w=8, coef_w=8):
-        self.sink = sink = Sink(EndpointDescription(ycbcr444_layout(ycbcr_w), packetized=True))
-        self.source = source = Source(EndpointDescription(rgb_layout(rgb_w), packetized=True))
+    def __init__(self, ycbcr_w=8, rgb_w=8, coef_w=8, lanes=1):
+        self.sink = sink = Sink(EndpointDescription(lanes_layout(ycbcr444_layout(ycbcr_w), lanes), packetized=True))
+        self.source = source = Source(EndpointDescription(lanes_layout(rgb_layout(rgb_w), lanes), packetized=True))
         PipelinedActor.__init__(self, datapath_latency)
         self.latency = datapath_latency
 
         # # #
 
-        self.submodules.datapath = YCbCr2RGBDatapath(ycbcr_w, rgb_w, coef_w)
-        self.comb += self.datapath.ce.eq(self.pipe_ce)
-        for name in ["y", "cb", "cr"]:
-            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
-        for name in ["r", "g", "b"]:
-            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        # one datapath per lane, lane 0 carries the first pixel
+        for i in range(lanes):
+            datapath = YCbCr2RGBDatapath(ycbcr_w, rgb_w, coef_w)
+            self.submodules += datapath
+            self.comb += datapath.ce.eq(self.pipe_ce)
+            sink_lane = get_lane(sink.payload, i, lanes)
+            source_lane = get_lane(source.payload, i, lanes)
+            for name in ["y", "cb", "cr"]:
+                self.comb += getattr(datapath.sink, name).eq(getattr(sink_lane, name))
+            for name in ["r", "g", "b"]:
+                self.comb += getattr(source_lane, name).eq(getattr(datapath.source, name))
@@ -49,21 +49,163 @@ class YCbCr422to444Datapath(Module):
             )
         ]
 
-class YCbCr422to444(PipelinedActor, Module):
-    def __init__(self, dw=8):
-        self.sink = sink = Sink(EndpointDescription(ycbcr422_layout(dw), packetized=True))
-        self.source = source = Source(EndpointDescription(ycbcr444_layout(dw), packetized=True))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
+linear_datapath_latency = 3
+
+@DecorateModule(InsertCE)
+class YCbCr422to444LinearDatapath(Module):
+    """YCbCr 422 to 444 with linear interpolation of chroma on odd pixels
+
+      Input:                    Output:
+        Y0    Y1    Y2   Y3       Y0         Y1    Y2         Y3
+      Cb01  Cr01  Cb23 Cr23  --> Cb01  (Cb01+Cb23)/2 Cb23  (Cb23+Cb45)/2
+                                 Cr01  (Cr01+Cr23)/2 Cr23  (Cr23+Cr45)/2
+
+    Chroma of the last pair of a line (followed by start) is replicated.
+    """
+    def __init__(self, dw):
+        self.sink = sink = Record(ycbcr422_layout(dw))
+        self.source = source = Record(ycbcr444_layout(dw))
+        self.start = Signal()
 
         # # #
 
-        self.submodules.datapath = YCbCr422to444Datapath(dw)
+        # parity of sink pixel (0 for the first pixel of a line)
+        odd = Signal()
+        odd_r = Signal()
+        self.comb += odd.eq(~self.start & ~odd_r)
+        self.sync += odd_r.eq(odd)
+
+        # delay ycbcr and start/parity signals, output pixel is [2]
+        ycbcr_delayed = [sink]
+        start_delayed = [self.start]
+        odd_delayed = [odd]
+        for i in range(linear_datapath_latency):
+            ycbcr_n = Record(ycbcr422_layout(dw))
+            start_n = Signal()
+            odd_n = Signal()
+            for name in ["y", "cb_cr"]:
+                self.sync += getattr(ycbcr_n, name).eq(getattr(ycbcr_delayed[-1], name))
+            self.sync += [
+                start_n.eq(start_delayed[-1]),
+                odd_n.eq(odd_delayed[-1])
+            ]
+            ycbcr_delayed.append(ycbcr_n)
+            start_delayed.append(start_n)
+            odd_delayed.append(odd_n)
+
+        # next pair chroma (replicate current pair at the end of a line)
+        cb_next = Signal(dw)
+        cr_next = Signal(dw)
+        self.comb += [
+            If(start_delayed[1],
+                cb_next.eq(ycbcr_delayed[3].cb_cr)
+            ).Else(
+                cb_next.eq(ycbcr_delayed[1].cb_cr)
+            ),
+            If(start_delayed[1] | start_delayed[0],
+                cr_next.eq(ycbcr_delayed[2].cb_cr)
+            ).Else(
+                cr_next.eq(sink.cb_cr)
+            )
+        ]
+
+        # compute mean of current and next pair chroma (+ rounding)
+        cb_sum = Signal(dw+1)
+        cr_sum = Signal(dw+1)
         self.comb += [
-            self.datapath.start.eq(sink.stb & sink.sop),
-            self.datapath.ce.eq(sink.stb & self.pipe_ce)
+            cb_sum.eq(ycbcr_delayed[3].cb_cr + cb_next + 1),
+            cr_sum.eq(ycbcr_delayed[2].cb_cr + cr_next + 1)
         ]
-        for name in ["y", "cb_cr"]:
-            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
-        for name in ["y", "cb", "cr"]:
-            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+
+        # output
+        self.sync += [
+            self.source.y.eq(ycbcr_delayed[2].y),
+            If(odd_delayed[2],
+                self.source.cb.eq(cb_sum[1:]),
+                self.source.cr.eq(cr_sum[1:])
+            ).Else(
+                self.source.cb.eq(ycbcr_delayed[2].cb_cr),
+                self.source.cr.eq(ycbcr_delayed[1].cb_cr)
+            )
+        ]
+
+
+pair_datapath_latency = 1
+
+@DecorateModule(InsertCE)
+class YCbCr422to444PairDatapath(Module):
+    """YCbCr 422 to 444 on a pixel pair (even pixel on sink0)
+
+      Input:          Output:
+        Y0    Y1        Y0   Y1
+      Cb01  Cr01  --> Cb01 Cb01
+                      Cr01 Cr01
+    """
+    def __init__(self, dw):
+        self.sink0 = sink0 = Record(ycbcr422_layout(dw))
+        self.sink1 = sink1 = Record(ycbcr422_layout(dw))
+        self.source0 = source0 = Record(ycbcr444_layout(dw))
+        self.source1 = source1 = Record(ycbcr444_layout(dw))
+
+        # # #
+
+        # output
+        self.sync += [
+            source0.y.eq(sink0.y),
+            source0.cb.eq(sink0.cb_cr),
+            source0.cr.eq(sink1.cb_cr),
+            source1.y.eq(sink1.y),
+            source1.cb.eq(sink0.cb_cr),
+            source1.cr.eq(sink1.cb_cr)
+        ]
+
+
+class YCbCr422to444(PipelinedActor, Module):
+    """YCbCr 422 to 444
+
+    chroma_upsampling: "replicate" (chroma of the pair on both pixels) or
+    "linear" (odd pixels interpolated, requires lanes == 1).
+    """
+    def __init__(self, dw=8, lanes=1, chroma_upsampling="replicate"):
+        assert lanes == 1 or lanes % 2 == 0
+        assert chroma_upsampling in ["replicate", "linear"]
+        assert lanes == 1 or chroma_upsampling == "replicate"
+        self.sink = sink = Sink(EndpointDescription(lanes_layout(ycbcr422_layout(dw), lanes), packetized=True))
+        self.source = source = Source(EndpointDescription(lanes_layout(ycbcr444_layout(dw), lanes), packetized=True))
+        if chroma_upsampling == "linear":
+            latency = linear_datapath_latency
+        elif lanes == 1:
+            latency = datapath_latency
+        else:
+            latency = pair_datapath_latency
+        PipelinedActor.__init__(self, latency)
+        self.latency = latency
+
+        # # #
+
+        if lanes == 1:
+            if chroma_upsampling == "linear":
+                self.submodules.datapath = YCbCr422to444LinearDatapath(dw)
+            else:
+                self.submodules.datapath = YCbCr422to444Datapath(dw)
+            self.comb += [
+                self.datapath.start.eq(sink.stb & sink.sop),
+                self.datapath.ce.eq(sink.stb & self.pipe_ce)
+            ]
+            for name in ["y", "cb_cr"]:
+                self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
+            for name in ["y", "cb", "cr"]:
+                self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        else:
+            # even lanes carry even pixels: pairs never straddle two words
+            for i in range(lanes//2):
+                datapath = YCbCr422to444PairDatapath(dw)
+                self.submodules += datapath
+                self.comb += datapath.ce.eq(sink.stb & self.pipe_ce)
+                for j in range(2):
+                    sink_lane = get_lane(sink.payload, 2*i + j, lanes)
+                    source_lane = get_lane(source.payload, 2*i + j, lanes)
+                    for name in ["y", "cb_cr"]:
+                        self.comb += getattr(getattr(datapath, "sink"+str(j)), name).eq(getattr(sink_lane, name))
+                    for name in ["y", "cb", "cr"]:
+                        self.comb += getattr(source_lane, name).eq(getattr(getattr(datapath, "source"+str(j)), name))
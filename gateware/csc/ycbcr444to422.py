@@ -2,6 +2,7 @@
 
 from migen.fhdl.std import *
 from migen.genlib.record import *
+from migen.genlib.misc import optree
 from migen.flow.actor import *
 
 from gateware.csc.common import *
@@ -66,21 +67,222 @@ class YCbCr444to422Datapath(Module):
         ]
 
 
-class YCbCr444to422(PipelinedActor, Module):
-    def __init__(self, dw=8):
-        self.sink = sink = Sink(EndpointDescription(ycbcr444_layout(dw), packetized=True))
-        self.source = source = Source(EndpointDescription(ycbcr422_layout(dw), packetized=True))
-        PipelinedActor.__init__(self, datapath_latency)
-        self.latency = datapath_latency
+# chroma low-pass filters: (taps, shift), taps sum to 2**shift
+chroma_filters = {
+    "121":      ([1, 2, 1], 2),
+    "halfband": ([-1, 0, 9, 16, 9, 0, -1], 5)
+}
+
+
+def filtered_datapath_latency(chroma_filter):
+    taps, shift = chroma_filters[chroma_filter]
+    return len(taps)//2 + 3
+
+
+@DecorateModule(InsertCE)
+class YCbCr444to422FilteredDatapath(Module):
+    """YCbCr 444 to 422 with low-pass filtered (co-sited) chroma
+
+      Input:                Output:
+      Y0    Y1  Y2  Y3        Y0    Y1    Y2   Y3
+      Cb0  Cb1 Cb2 Cb3  --> Cb0'  Cr0'  Cb2' Cr2'
+      Cr0  Cr1 Cr2 Cr3
+
+    Cb0'/Cr0' are filtered around pixel 0. start marks the first pixel of a
+    line: filter taps outside of the line replicate its first/last pixel
+    (the last pixel of a line is known when the start of the next line
+    enters the filter).
+    """
+    def __init__(self, dw, chroma_filter):
+        self.sink = sink = Record(ycbcr444_layout(dw))
+        self.source = source = Record(ycbcr422_layout(dw))
+        self.start = Signal()
 
         # # #
 
-        self.submodules.datapath = YCbCr444to422Datapath(dw)
+        taps, shift = chroma_filters[chroma_filter]
+        half = len(taps)//2
+
+        # parity of sink pixel (0 for the first pixel of a line)
+        odd = Signal()
+        odd_r = Signal()
+        self.comb += odd.eq(~self.start & ~odd_r)
+        self.sync += odd_r.eq(odd)
+
+        # delay data and start/parity signals, center of the filter is [half]
+        ycbcr_delayed = [sink]
+        start_delayed = [self.start]
+        odd_delayed = [odd]
+        for i in range(2*half):
+            ycbcr_n = Record(ycbcr444_layout(dw))
+            start_n = Signal()
+            odd_n = Signal()
+            for name in ["y", "cb", "cr"]:
+                self.sync += getattr(ycbcr_n, name).eq(getattr(ycbcr_delayed[-1], name))
+            self.sync += [
+                start_n.eq(start_delayed[-1]),
+                odd_n.eq(odd_delayed[-1])
+            ]
+            ycbcr_delayed.append(ycbcr_n)
+            start_delayed.append(start_n)
+            odd_delayed.append(odd_n)
+
+        # stage 1
+        # replicate edge pixels on taps outside of the line
+        cb_taps = [Signal(dw) for i in range(2*half + 1)]
+        cr_taps = [Signal(dw) for i in range(2*half + 1)]
+        y = Signal(dw)
+        y_odd = Signal()
+        self.sync += [
+            cb_taps[half].eq(ycbcr_delayed[half].cb),
+            cr_taps[half].eq(ycbcr_delayed[half].cr),
+            y.eq(ycbcr_delayed[half].y),
+            y_odd.eq(odd_delayed[half])
+        ]
+        cb_edge = [ycbcr_delayed[half].cb]
+        cr_edge = [ycbcr_delayed[half].cr]
+        for i in range(half - 1, -1, -1):
+            # newer pixels (next line if a start is between them and the center)
+            next_line = optree("|", start_delayed[i:half])
+            cb_edge.append(Mux(next_line, cb_edge[-1], ycbcr_delayed[i].cb))
+            cr_edge.append(Mux(next_line, cr_edge[-1], ycbcr_delayed[i].cr))
+            self.sync += [
+                cb_taps[i].eq(cb_edge[-1]),
+                cr_taps[i].eq(cr_edge[-1])
+            ]
+        cb_edge = [ycbcr_delayed[half].cb]
+        cr_edge = [ycbcr_delayed[half].cr]
+        for i in range(half + 1, 2*half + 1):
+            # older pixels (previous line if a start is between the center and them)
+            previous_line = optree("|", start_delayed[half:i])
+            cb_edge.append(Mux(previous_line, cb_edge[-1], ycbcr_delayed[i].cb))
+            cr_edge.append(Mux(previous_line, cr_edge[-1], ycbcr_delayed[i].cr))
+            self.sync += [
+                cb_taps[i].eq(cb_edge[-1]),
+                cr_taps[i].eq(cr_edge[-1])
+            ]
+
+        # stage 2
+        # weighted sum (+ rounding)
+        cb_sum = Signal((dw + shift + 2, True))
+        cr_sum = Signal((dw + shift + 2, True))
+        y_r = Signal(dw)
+        y_odd_r = Signal()
+        self.sync += [
+            cb_sum.eq(optree("+", [cb_taps[i]*taps[i] for i in range(len(taps)) if taps[i]]) +
+                      2**(shift-1)),
+            cr_sum.eq(optree("+", [cr_taps[i]*taps[i] for i in range(len(taps)) if taps[i]]) +
+                      2**(shift-1)),
+            y_r.eq(y),
+            y_odd_r.eq(y_odd)
+        ]
+
+        # stage 3
+        # saturate and output: Cb on even pixels, Cr (computed on the even
+        # pixel) on odd pixels
+        cb_mean = Signal((dw + 2, True))
+        cr_mean = Signal((dw + 2, True))
+        cr_hold = Signal(dw)
         self.comb += [
-            self.datapath.start.eq(self.sink.stb & sink.sop),
-            self.datapath.ce.eq(self.sink.stb & self.pipe_ce),
+            cb_mean.eq(cb_sum[shift:]),
+            cr_mean.eq(cr_sum[shift:])
         ]
-        for name in ["y", "cb", "cr"]:
-            self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
-        for name in ["y", "cb_cr"]:
-            self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        self.sync += [
+            source.y.eq(y_r),
+            If(y_odd_r,
+                source.cb_cr.eq(cr_hold)
+            ).Else(
+                saturate(cb_mean, source.cb_cr, 0, 2**dw-1),
+                saturate(cr_mean, cr_hold, 0, 2**dw-1)
+            )
+        ]
+
+
+pair_datapath_latency = 2
+
+@DecorateModule(InsertCE)
+class YCbCr444to422PairDatapath(Module):
+    """YCbCr 444 to 422 on a pixel pair (even pixel on sink0)
+
+      Input:                Output:
+      Y0    Y1                Y0    Y1
+      Cb0  Cb1      -->     Cb01  Cr01
+      Cr0  Cr1
+    """
+    def __init__(self, dw):
+        self.sink0 = sink0 = Record(ycbcr444_layout(dw))
+        self.sink1 = sink1 = Record(ycbcr444_layout(dw))
+        self.source0 = source0 = Record(ycbcr422_layout(dw))
+        self.source1 = source1 = Record(ycbcr422_layout(dw))
+
+        # # #
+
+        # compute sum of cb and cr compoments
+        y0 = Signal(dw)
+        y1 = Signal(dw)
+        cb_sum = Signal(dw+1)
+        cr_sum = Signal(dw+1)
+        self.sync += [
+            y0.eq(sink0.y),
+            y1.eq(sink1.y),
+            cb_sum.eq(sink0.cb + sink1.cb),
+            cr_sum.eq(sink0.cr + sink1.cr)
+        ]
+
+        # output mean
+        self.sync += [
+            source0.y.eq(y0),
+            source0.cb_cr.eq(cb_sum[1:]),
+            source1.y.eq(y1),
+            source1.cb_cr.eq(cr_sum[1:])
+        ]
+
+
+class YCbCr444to422(PipelinedActor, Module):
+    """YCbCr 444 to 422
+
+    chroma_filter: "average" (mean of each pair) or a low-pass filter of
+    chroma_filters ("121", "halfband"), filtered modes require lanes == 1.
+    """
+    def __init__(self, dw=8, lanes=1, chroma_filter="average"):
+        assert lanes == 1 or lanes % 2 == 0
+        assert lanes == 1 or chroma_filter == "average"
+        self.sink = sink = Sink(EndpointDescription(lanes_layout(ycbcr444_layout(dw), lanes), packetized=True))
+        self.source = source = Source(EndpointDescription(lanes_layout(ycbcr422_layout(dw), lanes), packetized=True))
+        if chroma_filter != "average":
+            latency = filtered_datapath_latency(chroma_filter)
+        elif lanes == 1:
+            latency = datapath_latency
+        else:
+            latency = pair_datapath_latency
+        PipelinedActor.__init__(self, latency)
+        self.latency = latency
+
+        # # #
+
+        if lanes == 1:
+            if chroma_filter != "average":
+                self.submodules.datapath = YCbCr444to422FilteredDatapath(dw, chroma_filter)
+            else:
+                self.submodules.datapath = YCbCr444to422Datapath(dw)
+            self.comb += [
+                self.datapath.start.eq(self.sink.stb & sink.sop),
+                self.datapath.ce.eq(self.sink.stb & self.pipe_ce),
+            ]
+            for name in ["y", "cb", "cr"]:
+                self.comb += getattr(self.datapath.sink, name).eq(getattr(sink, name))
+            for name in ["y", "cb_cr"]:
+                self.comb += getattr(source, name).eq(getattr(self.datapath.source, name))
+        else:
+            # even lanes carry even pixels: pairs never straddle two words
+            for i in range(lanes//2):
+                datapath = YCbCr444to422PairDatapath(dw)
+                self.submodules += datapath
+                self.comb += datapath.ce.eq(self.sink.stb & self.pipe_ce)
+                for j in range(2):
+                    sink_lane = get_lane(sink.payload, 2*i + j, lanes)
+                    source_lane = get_lane(source.payload, 2*i + j, lanes)
+                    for name in ["y", "cb", "cr"]:
+                        self.comb += getattr(getattr(datapath, "sink"+str(j)), name).eq(getattr(sink_lane, name))
+                    for name in ["y", "cb_cr"]:
+                        self.comb += getattr(source_lane, name).eq(getattr(getattr(datapath, "source"+str(j)), name))
@@ -14,7 +14,6 @@ from migen.bank.eventmanager import *
 from misoclib.mem.sdram.frontend import dma_lasmi
 
 from gateware.csc.ycbcr422to444 import YCbCr422to444
-from gateware.csc.ymodulator import YModulator
 
 
 class EncoderReader(Module, AutoCSR):
@@ -70,7 +69,7 @@ class EncoderBandwidth(Module, AutoCSR):
 
 
 class Encoder(Module, AutoCSR):
-    def __init__(self, platform):
+    def __init__(self, platform, chroma_upsampling="replicate"):
         self.sink = Sink(EndpointDescription([("data", 16)], packetized=True))
         self.source = Source([("data", 8)])
         self.bus = wishbone.Interface()
@@ -78,7 +77,7 @@ class Encoder(Module, AutoCSR):
         # # #
 
         # chroma upsampler
-        self.submodules.chroma_upsampler = chroma_upsampler = YCbCr422to444()
+        self.submodules.chroma_upsampler = chroma_upsampler = YCbCr422to444(chroma_upsampling=chroma_upsampling)
         self.comb += [
             Record.connect(self.sink, chroma_upsampler.sink, leave_out=["data"]),
             chroma_upsampler.sink.y.eq(self.sink.data[:8]),
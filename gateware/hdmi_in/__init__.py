@@ -1,6 +1,8 @@
 from migen.fhdl.std import *
-from migen.bank.description import AutoCSR
+from migen.bank.description import AutoCSR, CSR
+from migen.bank.eventmanager import SharedIRQ
 
+from gateware.csc import colormatrix
 from gateware.hdmi_in.edid import EDID
 from gateware.hdmi_in.clocking import Clocking
 from gateware.hdmi_in.datacapture import DataCapture
@@ -13,14 +15,19 @@ from gateware.hdmi_in.dma import DMA
 
 
 class HDMIIn(Module, AutoCSR):
-    def __init__(self, pads, lasmim, n_dma_slots=2, fifo_depth=512):
+    def __init__(self, pads, lasmim, n_dma_slots=2, fifo_depth=512, procamp=False, auto_phase=False,
+                 eye_scan=False, chansync_skew=None, crop=False, downscaler=False,
+                 tile_hash=None, statistics=None, motion=False,
+                 pipeline_depth=colormatrix.datapath_latency, chroma_filter="average",
+                 freqmeter_before_pll=True):
         self.submodules.edid = EDID(pads)
-        self.submodules.clocking = Clocking(pads)
+        self.submodules.clocking = Clocking(pads, freqmeter_before_pll)
 
         for datan in range(3):
             name = "data" + str(datan)
 
-            cap = DataCapture(getattr(pads, name + "_p"), getattr(pads, name + "_n"), 8)
+            cap = DataCapture(getattr(pads, name + "_p"), getattr(pads, name + "_n"), 8,
+                              auto_phase, eye_scan)
             setattr(self.submodules, name + "_cap", cap)
             self.comb += cap.serdesstrobe.eq(self.clocking.serdesstrobe)
 
@@ -31,6 +38,11 @@ class HDMIIn(Module, AutoCSR):
             wer = WER()
             setattr(self.submodules, name + "_wer", wer)
             self.comb += wer.data.eq(charsync.data)
+            if eye_scan:
+                self.comb += [
+                    cap.scan.wer_value.eq(wer.value),
+                    cap.scan.wer_updated.eq(wer.updated)
+                ]
 
             decoding = Decoding()
             setattr(self.submodules, name + "_decod", decoding)
@@ -39,7 +51,7 @@ class HDMIIn(Module, AutoCSR):
                 decoding.input.eq(charsync.data)
             ]
 
-        self.submodules.chansync = ChanSync()
+        self.submodules.chansync = ChanSync(skew_budget=chansync_skew)
         self.comb += [
             self.chansync.valid_i.eq(self.data0_decod.valid_o & \
               self.data1_decod.valid_o & self.data2_decod.valid_o),
@@ -60,10 +72,14 @@ class HDMIIn(Module, AutoCSR):
         self.comb += [
             self.resdetection.valid_i.eq(self.syncpol.valid_o),
             self.resdetection.de.eq(self.syncpol.de),
-            self.resdetection.vsync.eq(self.syncpol.vsync)
+            self.resdetection.hsync.eq(self.syncpol.hsync),
+            self.resdetection.vsync.eq(self.syncpol.vsync),
+            self.resdetection.polarity.eq(self.syncpol.polarity)
         ]
 
-        self.submodules.frame = FrameExtraction(lasmim.dw, fifo_depth)
+        self.submodules.frame = FrameExtraction(lasmim.dw, fifo_depth, procamp, crop, downscaler,
+                                                statistics, motion, pipeline_depth,
+                                                chroma_filter)
         self.comb += [
             self.frame.valid_i.eq(self.syncpol.valid_o),
             self.frame.de.eq(self.syncpol.de),
@@ -73,8 +89,18 @@ class HDMIIn(Module, AutoCSR):
             self.frame.b.eq(self.syncpol.b)
         ]
 
-        self.submodules.dma = DMA(lasmim, n_dma_slots)
+        self.submodules.dma = DMA(lasmim, n_dma_slots, tile_hash)
         self.comb += self.frame.frame.connect(self.dma.frame)
-        self.ev = self.dma.ev
+        if motion:
+            self.submodules.ev = SharedIRQ(self.dma.ev, self.resdetection.ev, self.frame.motion.ev)
+        else:
+            self.submodules.ev = SharedIRQ(self.dma.ev, self.resdetection.ev)
+
+        # write path telemetry snapshot (and clear)
+        self._telemetry_snapshot = CSR()
+        self.comb += [
+            self.frame.snapshot.eq(self._telemetry_snapshot.re),
+            self.dma.snapshot.eq(self._telemetry_snapshot.re)
+        ]
 
     autocsr_exclude = {"ev"}
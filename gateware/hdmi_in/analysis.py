@@ -1,14 +1,24 @@
 from migen.fhdl.std import *
-from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.genlib.cdc import MultiReg, PulseSynchronizer, GrayCounter
 from migen.genlib.fifo import AsyncFIFO
 from migen.genlib.record import Record
+from migen.genlib.misc import optree
 from migen.bank.description import *
+from migen.bank.eventmanager import *
 from migen.flow.actor import *
 
 from gateware.hdmi_in.common import channel_layout
 
-from gateware.csc.rgb2ycbcr import RGB2YCbCr
+from gateware.csc.common import rgb_layout, ycbcr444_layout
+from gateware.csc import colormatrix
+from gateware.csc.colormatrix import ColorMatrix, ColorMatrixControl, color_matrix_coefs
 from gateware.csc.ycbcr444to422 import YCbCr444to422
+from gateware.csc.procamp import ProcAmp, ProcAmpControl
+
+from gateware.hdmi_in.crop import Crop
+from gateware.hdmi_in.downscaler import Downscaler
+from gateware.hdmi_in.stats import FrameStatistics
+from gateware.hdmi_in.motion import MotionDetector
 
 class SyncPolarity(Module):
     def __init__(self):
@@ -24,6 +34,8 @@ class SyncPolarity(Module):
         self.r = Signal(8)
         self.g = Signal(8)
         self.b = Signal(8)
+        # bit 0: hsync, bit 1: vsync, 1: active high
+        self.polarity = Signal(2)
 
         ###
 
@@ -36,7 +48,8 @@ class SyncPolarity(Module):
         self.comb += [
             self.de.eq(de_r),
             self.hsync.eq(c_out[0]),
-            self.vsync.eq(c_out[1])
+            self.vsync.eq(c_out[1]),
+            self.polarity.eq(~c_polarity)
         ]
 
         self.sync.pix += [
@@ -56,13 +69,39 @@ class SyncPolarity(Module):
 
 
 class ResolutionDetection(Module, AutoCSR):
-    def __init__(self, nbits=11):
+    """Input timing measurement
+
+    hres/vres: active pixels/lines.
+    Measured on each frame (latched at vsync):
+    - htotal, hsync_width: in pixels.
+    - vtotal, vsync_width: in lines.
+    - polarity: bit 0: hsync, bit 1: vsync (1: active high).
+    - frame_period: in sys clock cycles.
+    stable is set when the timings (all but frame_period) have been the same
+    for stable_frames frames. Events: change (timings differ from the
+    previous frame or input lost) and stable (stable rises).
+    """
+    def __init__(self, nbits=11, stable_frames=4):
         self.valid_i = Signal()
         self.vsync = Signal()
+        self.hsync = Signal()
         self.de = Signal()
+        self.polarity = Signal(2)
 
         self._hres = CSRStatus(nbits)
         self._vres = CSRStatus(nbits)
+        self._htotal = CSRStatus(nbits+1)
+        self._vtotal = CSRStatus(nbits+1)
+        self._hsync_width = CSRStatus(nbits)
+        self._vsync_width = CSRStatus(nbits)
+        self._polarity = CSRStatus(2)
+        self._frame_period = CSRStatus(32)
+        self._stable = CSRStatus()
+
+        self.submodules.ev = EventManager()
+        self.ev.change = EventSourcePulse()
+        self.ev.stable = EventSourcePulse()
+        self.ev.finalize()
 
         ###
 
@@ -91,8 +130,12 @@ class ResolutionDetection(Module, AutoCSR):
         # VRES
         vsync_r = Signal()
         p_vsync = Signal()
+        n_vsync = Signal()
         self.sync.pix += vsync_r.eq(self.vsync),
-        self.comb += p_vsync.eq(self.vsync & ~vsync_r)
+        self.comb += [
+            p_vsync.eq(self.vsync & ~vsync_r),
+            n_vsync.eq(~self.vsync & vsync_r)
+        ]
 
         vcounter = Signal(nbits)
         self.sync.pix += If(self.valid_i & p_vsync,
@@ -109,9 +152,115 @@ class ResolutionDetection(Module, AutoCSR):
             )
         self.specials += MultiReg(vcounter_st, self._vres.status)
 
+        # HTOTAL / HSYNC width (last line of the frame)
+        hsync_r = Signal()
+        p_hsync = Signal()
+        n_hsync = Signal()
+        self.sync.pix += hsync_r.eq(self.hsync)
+        self.comb += [
+            p_hsync.eq(self.hsync & ~hsync_r),
+            n_hsync.eq(~self.hsync & hsync_r)
+        ]
+
+        htotal_counter = Signal(nbits+1)
+        htotal = Signal(nbits+1)
+        hsync_counter = Signal(nbits)
+        hsync_width = Signal(nbits)
+        self.sync.pix += [
+            If(p_hsync,
+                htotal_counter.eq(1),
+                htotal.eq(htotal_counter)
+            ).Else(
+                htotal_counter.eq(htotal_counter + 1)
+            ),
+            If(self.hsync,
+                hsync_counter.eq(hsync_counter + 1)
+            ).Else(
+                hsync_counter.eq(0)
+            ),
+            If(n_hsync, hsync_width.eq(hsync_counter))
+        ]
+
+        # VTOTAL / VSYNC width (in lines, an hsync coincident with vsync
+        # belongs to the new frame)
+        vtotal_counter = Signal(nbits+1)
+        vsync_counter = Signal(nbits)
+        vsync_width = Signal(nbits)
+        self.sync.pix += [
+            If(p_vsync,
+                vtotal_counter.eq(p_hsync)
+            ).Elif(p_hsync,
+                vtotal_counter.eq(vtotal_counter + 1)
+            ),
+            If(self.vsync,
+                If(p_hsync, vsync_counter.eq(vsync_counter + 1))
+            ).Else(
+                vsync_counter.eq(0)
+            ),
+            If(n_vsync, vsync_width.eq(vsync_counter))
+        ]
+
+        # Frame timings and stability
+        timings = [hcounter_st, vcounter, htotal, vtotal_counter, hsync_width, vsync_width, self.polarity]
+        timings_st = [Signal(flen(t)) for t in timings]
+        changed = Signal()
+        self.comb += changed.eq(optree("|", [t != t_st for t, t_st in zip(timings, timings_st)]))
+
+        stable_counter = Signal(max=stable_frames+1)
+        stable = Signal()
+        valid_r = Signal()
+        change = Signal()
+        stable_rise = Signal()
+        self.comb += stable.eq(stable_counter == stable_frames)
+        self.sync.pix += [
+            valid_r.eq(self.valid_i),
+            change.eq((self.valid_i & p_vsync & changed) | (valid_r & ~self.valid_i)),
+            stable_rise.eq(0),
+            If(~self.valid_i,
+                stable_counter.eq(0),
+                [t_st.eq(0) for t_st in timings_st]
+            ).Elif(p_vsync,
+                [t_st.eq(t) for t, t_st in zip(timings, timings_st)],
+                If(changed,
+                    stable_counter.eq(0)
+                ).Elif(~stable,
+                    stable_counter.eq(stable_counter + 1),
+                    stable_rise.eq(stable_counter == (stable_frames - 1))
+                )
+            )
+        ]
+        for t_st, csr in zip(timings_st[2:], [self._htotal, self._vtotal,
+                                              self._hsync_width, self._vsync_width,
+                                              self._polarity]):
+            self.specials += MultiReg(t_st, csr.status)
+        self.specials += MultiReg(stable, self._stable.status)
+
+        # Events
+        self.submodules.change_sys = PulseSynchronizer("pix", "sys")
+        self.submodules.stable_sys = PulseSynchronizer("pix", "sys")
+        self.comb += [
+            self.change_sys.i.eq(change),
+            self.stable_sys.i.eq(stable_rise),
+            self.ev.change.trigger.eq(self.change_sys.o),
+            self.ev.stable.trigger.eq(self.stable_sys.o)
+        ]
+
+        # FRAME_PERIOD
+        self.submodules.vsync_sys = PulseSynchronizer("pix", "sys")
+        self.comb += self.vsync_sys.i.eq(self.valid_i & p_vsync)
+        period_counter = Signal(32)
+        self.sync += If(self.vsync_sys.o,
+                period_counter.eq(1),
+                self._frame_period.status.eq(period_counter)
+            ).Else(
+                period_counter.eq(period_counter + 1)
+            )
+
 
 class FrameExtraction(Module, AutoCSR):
-    def __init__(self, word_width, fifo_depth):
+    def __init__(self, word_width, fifo_depth, procamp=False, crop=False, downscaler=False,
+                 statistics=None, motion=False, pipeline_depth=colormatrix.datapath_latency,
+                 chroma_filter="average"):
         # in pix clock domain
         self.valid_i = Signal()
         self.vsync = Signal()
@@ -127,28 +276,63 @@ class FrameExtraction(Module, AutoCSR):
 
         self._overflow = CSR()
 
+        # write path telemetry: fifo_max_frame is the highest FIFO level of
+        # the last frame, other values are accumulated over frames until the
+        # last snapshot
+        level_bits = log2_int(fifo_depth) + 1
+        self.snapshot = Signal()
+        self._fifo_max_frame = CSRStatus(level_bits)
+        self._fifo_max = CSRStatus(level_bits)
+        self._dropped_words = CSRStatus(32)
+        self._overflow_frames = CSRStatus(32)
+
         ###
 
         de_r = Signal()
         self.sync.pix += de_r.eq(self.de)
 
-        rgb2ycbcr = RGB2YCbCr()
+        rgb2ycbcr = ColorMatrix(rgb_layout(8), ycbcr444_layout(8), pipeline_depth=pipeline_depth)
         self.submodules += RenameClockDomains(rgb2ycbcr, "pix")
-        chroma_downsampler = YCbCr444to422()
+        self.submodules.csc = ColorMatrixControl(color_matrix_coefs("legacy", "rgb2ycbcr"))
+        vsync_i_r = Signal()
+        self.sync.pix += vsync_i_r.eq(self.vsync)
+        self.comb += [
+            rgb2ycbcr.coefs.eq(self.csc.coefs),
+            self.csc.latch.eq(self.vsync & ~vsync_i_r)
+        ]
+        chroma_downsampler = YCbCr444to422(chroma_filter=chroma_filter)
         self.submodules += RenameClockDomains(chroma_downsampler, "pix")
         self.comb += [
             rgb2ycbcr.sink.stb.eq(self.valid_i),
-            rgb2ycbcr.sink.sop.eq(self.de & ~de_r),
             rgb2ycbcr.sink.r.eq(self.r),
             rgb2ycbcr.sink.g.eq(self.g),
             rgb2ycbcr.sink.b.eq(self.b),
-            Record.connect(rgb2ycbcr.source, chroma_downsampler.sink),
             chroma_downsampler.source.ack.eq(1)
         ]
+        if chroma_filter == "average":
+            self.comb += rgb2ycbcr.sink.sop.eq(self.de & ~de_r)
+        else:
+            # blanking also starts a packet: filter taps replicate the edge
+            # pixels of the line instead of pulling in blanking chroma
+            self.comb += rgb2ycbcr.sink.sop.eq(self.de ^ de_r)
+        latency = rgb2ycbcr.latency + chroma_downsampler.latency
+        if procamp:
+            procamp = ProcAmp()
+            self.submodules += RenameClockDomains(procamp, "pix")
+            self.submodules.procamp = ProcAmpControl()
+            self.comb += [
+                Record.connect(rgb2ycbcr.source, procamp.sink),
+                Record.connect(procamp.source, chroma_downsampler.sink),
+                Record.connect(self.procamp.control, procamp.control),
+                self.procamp.latch.eq(self.vsync & ~vsync_i_r)
+            ]
+            latency += procamp.latency
+        else:
+            self.comb += Record.connect(rgb2ycbcr.source, chroma_downsampler.sink)
         # XXX need clean up
         de = self.de
         vsync = self.vsync
-        for i in range(rgb2ycbcr.latency + chroma_downsampler.latency):
+        for i in range(latency):
             next_de = Signal()
             next_vsync = Signal()
             self.sync.pix += [
@@ -158,17 +342,105 @@ class FrameExtraction(Module, AutoCSR):
             de = next_de
             vsync = next_vsync
 
+        # de/vsync at the output of the color space conversion
+        csc_de = self.de
+        csc_vsync = self.vsync
+        if statistics is not None or motion:
+            for i in range(rgb2ycbcr.latency):
+                next_de = Signal()
+                next_vsync = Signal()
+                self.sync.pix += [
+                    next_de.eq(csc_de),
+                    next_vsync.eq(csc_vsync)
+                ]
+                csc_de = next_de
+                csc_vsync = next_vsync
+
+        # frame statistics (statistics: number of histogram bins)
+        if statistics is not None:
+            self.submodules.statistics = FrameStatistics(statistics)
+            self.comb += [
+                self.statistics.valid.eq(rgb2ycbcr.source.stb & csc_de),
+                self.statistics.vsync.eq(csc_vsync),
+                self.statistics.y.eq(rgb2ycbcr.source.y),
+                self.statistics.cb.eq(rgb2ycbcr.source.cb),
+                self.statistics.cr.eq(rgb2ycbcr.source.cr)
+            ]
+
+        # motion detection
+        if motion:
+            self.submodules.motion = MotionDetector()
+            self.comb += [
+                self.motion.valid.eq(rgb2ycbcr.source.stb & csc_de),
+                self.motion.vsync.eq(csc_vsync),
+                self.motion.y.eq(rgb2ycbcr.source.y)
+            ]
+
         # start of frame detection
         vsync_r = Signal()
         new_frame = Signal()
         self.comb += new_frame.eq(vsync & ~vsync_r)
         self.sync.pix += vsync_r.eq(vsync)
 
+        # pixel stream: stb/sop qualify y/cb_cr
+        pixel_stb = Signal()
+        pixel_sop = Signal()
+        pixel_y = Signal(8)
+        pixel_cb_cr = Signal(8)
+        sop_de_r = Signal()
+        self.sync.pix += sop_de_r.eq(de)
+        self.comb += [
+            pixel_stb.eq(chroma_downsampler.source.stb & de),
+            pixel_sop.eq(de & ~sop_de_r),
+            pixel_y.eq(chroma_downsampler.source.y),
+            pixel_cb_cr.eq(chroma_downsampler.source.cb_cr)
+        ]
+
+        # cropping
+        if crop:
+            self._crop_enable = CSRStorage()
+            self._crop_x = CSRStorage(12)
+            self._crop_y = CSRStorage(12)
+            self._crop_width = CSRStorage(12)
+            self._crop_height = CSRStorage(12)
+            crop = RenameClockDomains(Crop(), "pix")
+            self.submodules += crop
+            for name in ["enable", "x", "y", "width", "height"]:
+                self.specials += MultiReg(getattr(self, "_crop_" + name).storage,
+                                          getattr(crop, name), "pix")
+            self.comb += [
+                crop.stb.eq(pixel_stb),
+                crop.sop.eq(pixel_sop),
+                crop.sof.eq(new_frame)
+            ]
+            pixel_stb, pixel_sop = crop.source_stb, crop.source_sop
+
+        # downscaling
+        if downscaler:
+            self._hscale = CSRStorage(2)
+            self._vscale = CSRStorage(2)
+            downscaler = RenameClockDomains(Downscaler(), "pix")
+            self.submodules += downscaler
+            self.specials += [
+                MultiReg(self._hscale.storage, downscaler.hshift, "pix"),
+                MultiReg(self._vscale.storage, downscaler.vshift, "pix")
+            ]
+            self.comb += [
+                downscaler.stb.eq(pixel_stb),
+                downscaler.sop.eq(pixel_sop),
+                downscaler.sof.eq(new_frame),
+                downscaler.y.eq(pixel_y),
+                downscaler.cb_cr.eq(pixel_cb_cr)
+            ]
+            pixel_stb = downscaler.source_stb
+            pixel_y, pixel_cb_cr = downscaler.source_y, downscaler.source_cb_cr
+
+        encoded_pixel = Signal(16)
+        self.comb += encoded_pixel.eq(Cat(pixel_y, pixel_cb_cr))
+
         # pack pixels into words
         cur_word = Signal(word_width)
         cur_word_valid = Signal()
-        encoded_pixel = Signal(16)
-        self.comb += encoded_pixel.eq(Cat(chroma_downsampler.source.y, chroma_downsampler.source.cb_cr)),
         pack_factor = word_width//16
         assert(pack_factor & (pack_factor - 1) == 0)  # only support powers of 2
         pack_counter = Signal(max=pack_factor)
@@ -177,7 +449,7 @@ class FrameExtraction(Module, AutoCSR):
             If(new_frame,
                 cur_word_valid.eq(pack_counter == (pack_factor - 1)),
                 pack_counter.eq(0),
-            ).Elif(chroma_downsampler.source.stb & de,
+            ).Elif(pixel_stb,
                 [If(pack_counter == (pack_factor-i-1),
                     cur_word[16*i:16*(i+1)].eq(encoded_pixel)) for i in range(pack_factor)],
                 cur_word_valid.eq(pack_counter == (pack_factor - 1)),
@@ -238,3 +510,130 @@ class FrameExtraction(Module, AutoCSR):
             ).Elif(self.overflow_reset_ack.o,
                 overflow_mask.eq(0)
             )
+
+        # FIFO level (upper bound): words written - words read (Gray coded
+        # to cross to pix)
+        self.submodules.fifo_reads = GrayCounter(level_bits)
+        self.comb += self.fifo_reads.ce.eq(fifo.re & fifo.readable)
+        reads_gray = Signal(level_bits)
+        self.specials += MultiReg(self.fifo_reads.q, reads_gray, "pix")
+        reads = Signal(level_bits)
+        self.comb += reads[level_bits-1].eq(reads_gray[level_bits-1])
+        for i in reversed(range(level_bits-1)):
+            self.comb += reads[i].eq(reads[i+1] ^ reads_gray[i])
+        writes = Signal(level_bits)
+        self.sync.pix += If(fifo.we & fifo.writable, writes.eq(writes + 1))
+        level = Signal(level_bits)
+        self.comb += level.eq(writes - reads)
+
+        # per frame statistics (pix), latched at start of frame
+        frame_level_max = Signal(level_bits)
+        frame_dropped = Signal(32)
+        last_level_max = Signal(level_bits)
+        last_dropped = Signal(32)
+        self.sync.pix += \
+            If(new_frame,
+                last_level_max.eq(frame_level_max),
+                last_dropped.eq(frame_dropped),
+                frame_level_max.eq(0),
+                frame_dropped.eq(0)
+            ).Else(
+                If(level > frame_level_max,
+                    frame_level_max.eq(level)
+                ),
+                If(fifo.we & ~fifo.writable,
+                    frame_dropped.eq(frame_dropped + 1)
+                )
+            )
+
+        # accumulate (sys), last_* are stable until the next frame
+        self.submodules.frame_stats = PulseSynchronizer("pix", "sys")
+        self.comb += self.frame_stats.i.eq(new_frame)
+        fifo_max = Signal(level_bits)
+        dropped_words = Signal(32)
+        overflow_frames = Signal(32)
+        self.sync += [
+            If(self.frame_stats.o,
+                self._fifo_max_frame.status.eq(last_level_max)
+            ),
+            If(self.snapshot,
+                self._fifo_max.status.eq(fifo_max),
+                self._dropped_words.status.eq(dropped_words),
+                self._overflow_frames.status.eq(overflow_frames),
+                # a frame ending on the snapshot goes to the next window
+                If(self.frame_stats.o,
+                    fifo_max.eq(last_level_max),
+                    dropped_words.eq(last_dropped),
+                    overflow_frames.eq(last_dropped != 0)
+                ).Else(
+                    fifo_max.eq(0),
+                    dropped_words.eq(0),
+                    overflow_frames.eq(0)
+                )
+            ).Elif(self.frame_stats.o,
+                If(last_level_max > fifo_max,
+                    fifo_max.eq(last_level_max)
+                ),
+                dropped_words.eq(dropped_words + last_dropped),
+                If(last_dropped != 0,
+                    overflow_frames.eq(overflow_frames + 1)
+                )
+            )
+        ]
+
+
+class _TB(Module):
+    def __init__(self, streams):
+        self.streams = streams
+        self.results = []
+
+        self.submodules.resdetection = RenameClockDomains(ResolutionDetection(), {"pix": "sys"})
+        self.comb += [
+            self.resdetection.valid_i.eq(1),
+            self.resdetection.polarity.eq(0b11)
+        ]
+
+    def gen_simulation(self, selfp):
+        import numpy as np
+        from gateware import tmds
+
+        r = selfp.resdetection
+        for timing, n_frames in self.streams:
+            h_active, v_active = timing[0], timing[4]
+            d, c, de = tmds.video_stream(np.zeros((v_active, h_active, 3), dtype=int), timing)
+            events = 0
+            for frame in range(n_frames):
+                for i in range(len(de)):
+                    r.de = int(de[i])
+                    r.hsync = int(c[0][i] & 1)
+                    r.vsync = int(c[0][i] >> 1)
+                    yield
+                    events += r.ev.change.trigger
+            result = {name: getattr(r, "_" + name).status for name in
+                ["hres", "vres", "htotal", "vtotal", "hsync_width", "vsync_width",
+                 "polarity", "frame_period", "stable"]}
+            result["change_events"] = events
+            self.results.append(result)
+
+if __name__ == "__main__":
+    from migen.sim.generic import run_simulation
+
+    # h_active, h_front_porch, h_sync, h_back_porch, v_active, v_front_porch, v_sync, v_back_porch
+    a = (64, 8, 8, 8, 16, 2, 3, 2)
+    b = (48, 4, 12, 8, 20, 1, 2, 3)
+    tb = _TB([(a, 8), (b, 1), (b, 7)])
+    run_simulation(tb)
+
+    for (timing, n_frames), result in zip(tb.streams, tb.results):
+        print(timing, result)
+    for timing, result in [(a, tb.results[0]), (b, tb.results[2])]:
+        h_active, hfp, hs, hbp, v_active, vfp, vs, vbp = timing
+        h_total = h_active + hfp + hs + hbp
+        v_total = v_active + vfp + vs + vbp
+        expected = {"hres": h_active, "vres": v_active, "htotal": h_total, "vtotal": v_total,
+                    "hsync_width": hs, "vsync_width": vs, "polarity": 0b11,
+                    "frame_period": h_total*v_total, "stable": 1}
+        for name, value in expected.items():
+            assert result[name] == value, (name, result[name], value)
+    assert tb.results[1]["stable"] == 0
+    assert tb.results[1]["change_events"] > 0
@@ -39,14 +39,36 @@ class _SyncBuffer(Module):
         self.sync += If(self.re, _inc(consume, depth))
 
 
+def depth_for_skew(skew_budget):
+    """Smallest (power of 2) buffer depth absorbing skew_budget characters"""
+    return 2**log2_int(skew_budget + 1, False)
+
+
 class ChanSync(Module, AutoCSR):
-    def __init__(self, nchan=3, depth=8):
+    """Channel deskew
+
+    depth is the depth of the per channel buffers, or computed from
+    skew_budget (worst case inter-channel skew in characters) if given.
+
+    skew is the inter-channel skew in characters measured at the last
+    control/data transition of the inputs, skew_max its maximum since valid
+    (saturated to 2**skew_bits-1), lock_time the number of pix cycles between
+    valid and the last channel synchronization.
+    """
+    def __init__(self, nchan=3, depth=8, skew_budget=None, skew_bits=8):
+        if skew_budget is not None:
+            depth = depth_for_skew(skew_budget)
         self.valid_i = Signal()
         self.chan_synced = Signal()
 
         self._channels_synced = CSRStatus()
+        self._depth = CSRStatus(bits_for(depth), reset=depth)
+        self._skew = CSRStatus(skew_bits)
+        self._skew_max = CSRStatus(skew_bits)
+        self._lock_time = CSRStatus(32)
 
         lst_control = []
+        lst_control_in = []
         all_control = Signal()
         for i in range(nchan):
             name = "data_in" + str(i)
@@ -70,6 +92,7 @@ class ChanSync(Module, AutoCSR):
                 syncbuffer.re.eq(~is_control | all_control)
             ]
             lst_control.append(is_control)
+            lst_control_in.append(~data_in.de)
 
         some_control = Signal()
         self.comb += [
@@ -89,10 +112,66 @@ class ChanSync(Module, AutoCSR):
             )
         self.specials += MultiReg(self.chan_synced, self._channels_synced.status)
 
+        # skew: duration of mixed control/data inputs at transitions
+        some_control_in = Signal()
+        all_control_in = Signal()
+        mixed = Signal()
+        mixed_r = Signal()
+        self.comb += [
+            all_control_in.eq(optree("&", lst_control_in)),
+            some_control_in.eq(optree("|", lst_control_in)),
+            mixed.eq(some_control_in & ~all_control_in)
+        ]
+        skew_counter = Signal(skew_bits)
+        skew = Signal(skew_bits)
+        skew_max = Signal(skew_bits)
+        self.sync.pix += [
+            mixed_r.eq(mixed & self.valid_i),
+            If(~self.valid_i,
+                skew_counter.eq(0),
+                skew.eq(0),
+                skew_max.eq(0)
+            ).Elif(mixed,
+                If(skew_counter != 2**skew_bits-1,
+                    skew_counter.eq(skew_counter + 1)
+                )
+            ).Else(
+                skew_counter.eq(0),
+                If(mixed_r,
+                    skew.eq(skew_counter),
+                    If(skew_counter > skew_max,
+                        skew_max.eq(skew_counter)
+                    )
+                )
+            )
+        ]
+        self.specials += [
+            MultiReg(skew, self._skew.status),
+            MultiReg(skew_max, self._skew_max.status)
+        ]
+
+        # lock time
+        lock_counter = Signal(32)
+        lock_time = Signal(32)
+        chan_synced_r = Signal()
+        self.sync.pix += [
+            chan_synced_r.eq(self.chan_synced),
+            If(~self.valid_i,
+                lock_counter.eq(0)
+            ).Elif(lock_counter != 2**32-1,
+                lock_counter.eq(lock_counter + 1)
+            ),
+            If(self.chan_synced & ~chan_synced_r,
+                lock_time.eq(lock_counter)
+            )
+        ]
+        self.specials += MultiReg(lock_time, self._lock_time.status)
+
 
 class _TB(Module):
     def __init__(self, test_seq_it):
         self.test_seq_it = test_seq_it
+        self.results = []
 
         self.submodules.chansync = RenameClockDomains(ChanSync(), {"pix": "sys"})
         self.comb += self.chansync.valid_i.eq(1)
@@ -114,7 +193,13 @@ class _TB(Module):
         out1 = selfp.chansync.data_out1.d
         out2 = selfp.chansync.data_out2.d
 
-        print("{0:5} {1:5} {2:5}".format(out0, out1, out2))
+        skew = selfp.chansync._skew.status
+        skew_max = selfp.chansync._skew_max.status
+        lock_time = selfp.chansync._lock_time.status
+
+        print("{0:5} {1:5} {2:5} skew {3} (max {4}) lock time {5}".format(
+            out0, out1, out2, skew, skew_max, lock_time))
+        self.results.append((out0, out1, out2, selfp.chansync.chan_synced, skew_max))
 
 if __name__ == "__main__":
     from migen.sim.generic import run_simulation
@@ -128,5 +213,12 @@ if __name__ == "__main__":
         (1, 1, 1),
         (1, 1, 1),
     ]
-    tb = _TB(iter(test_seq*2))
+    tb = _TB(iter(test_seq*6))
     run_simulation(tb)
+    for out0, out1, out2, chan_synced, skew_max in tb.results:
+        assert out0 == out1
+    # channel 2 leaves and enters data one character before the others:
+    # once resynchronized, it stays synchronized and lags by one character
+    for out0, out1, out2, chan_synced, skew_max in tb.results[3*len(test_seq):]:
+        assert chan_synced and out2 == out0 - 1
+    assert tb.results[-1][4] == 1
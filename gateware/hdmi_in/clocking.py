@@ -1,10 +1,54 @@
 from migen.fhdl.std import *
-from migen.genlib.cdc import MultiReg
+from migen.genlib.cdc import MultiReg, GrayCounter
 from migen.bank.description import *
 
 
+class FrequencyMeter(Module, AutoCSR):
+    """Counts clock_domain cycles over a window of period sys clock cycles
+
+    value is updated at the end of each window: f = value*f_sys/period
+    (0 when the clock is not running).
+    """
+    def __init__(self, period=2**16, width=32, clock_domain="pix"):
+        self._period = CSRStorage(width, reset=period)
+        self._value = CSRStatus(width)
+
+        ###
+
+        # cycles counter, Gray coded to cross to sys
+        self.submodules.counter = RenameClockDomains(GrayCounter(width), clock_domain)
+        self.comb += self.counter.ce.eq(1)
+        counter_gray = Signal(width)
+        self.specials += MultiReg(self.counter.q, counter_gray)
+
+        counter = Signal(width)
+        self.comb += counter[width-1].eq(counter_gray[width-1])
+        for i in reversed(range(width-1)):
+            self.comb += counter[i].eq(counter[i+1] ^ counter_gray[i])
+
+        # sys window
+        window = Signal(width)
+        counter_last = Signal(width)
+        self.sync += If(window == 0,
+                window.eq(self._period.storage - 1),
+                counter_last.eq(counter),
+                self._value.status.eq(counter - counter_last)
+            ).Else(
+                window.eq(window - 1)
+            )
+
+
 class Clocking(Module, AutoCSR):
-    def __init__(self, pads):
+    """HDMI input clocking: PLL (DRP) generating pix/pix2x/pix10x
+
+    freqmeter_before_pll measures the TMDS clock before the PLL (valid when
+    the PLL does not lock) at the cost of a third BUFG per input, otherwise
+    pix is measured (0 until the PLL locks). Spartan-6 has 16 BUFGs: Atlys
+    HDMI2USB uses 14 with two inputs measured before the PLL (sys/SDRAM 3,
+    inputs 2x3, outputs 2x2, USB 1), HDMI2ETH 15 (Ethernet rx/tx instead
+    of USB).
+    """
+    def __init__(self, pads, freqmeter_before_pll=True):
         self._pll_reset = CSRStorage(reset=1)
         self._locked = CSRStatus()
 
@@ -70,6 +114,15 @@ class Clocking(Module, AutoCSR):
         ]
         self.comb += self._locked.status.eq(self.locked)
 
+        # TMDS clock frequency, measured before the PLL: valid when the PLL
+        # does not lock (pix is held in reset until it does)
+        if freqmeter_before_pll:
+            self.clock_domains._cd_tmds = ClockDomain(reset_less=True)
+            self.specials += Instance("BUFG", i_I=clk_se, o_O=self._cd_tmds.clk)
+            self.submodules.freqmeter = FrequencyMeter(clock_domain="tmds")
+        else:
+            self.submodules.freqmeter = FrequencyMeter(clock_domain="pix")
+
         # sychronize pix+pix2x reset
         pix_rst_n = 1
         for i in range(2):
@@ -0,0 +1,130 @@
+from migen.fhdl.std import *
+
+
+class Crop(Module):
+    """Region of interest cropping of a pixel stream
+
+    Keeps the pixels of the width x height window at (x, y) (x and width are
+    rounded down to even values to keep 4:2:2 pixel pairs), all pixels if
+    enable is 0. Parameters are sampled at start of frame.
+
+    stb/sop/sof as Downscaler, data is not delayed: source_stb/source_sop
+    qualify the input data (source_sop on the first kept pixel of a line).
+    """
+    def __init__(self, bits=12):
+        self.stb = Signal()
+        self.sop = Signal()
+        self.sof = Signal()
+        self.enable = Signal()
+        self.x = Signal(bits)
+        self.y = Signal(bits)
+        self.width = Signal(bits)
+        self.height = Signal(bits)
+
+        self.source_stb = Signal()
+        self.source_sop = Signal()
+
+        ###
+
+        enable = Signal()
+        x = Signal(bits)
+        y = Signal(bits)
+        width = Signal(bits)
+        height = Signal(bits)
+        self.sync += If(self.sof,
+            enable.eq(self.enable),
+            x.eq(Cat(0, self.x[1:])),
+            y.eq(self.y),
+            width.eq(Cat(0, self.width[1:])),
+            height.eq(self.height)
+        )
+
+        # position of the input pixel (vcount is the number of started lines)
+        hcount = Signal(bits)
+        hcount_cur = Signal(bits)
+        vcount = Signal(bits+1)
+        vcount_cur = Signal(bits+1)
+        self.comb += [
+            hcount_cur.eq(Mux(self.sop, 0, hcount)),
+            vcount_cur.eq(Mux(self.sop, vcount + 1, vcount))
+        ]
+        self.sync += [
+            If(self.stb,
+                hcount.eq(hcount_cur + 1)
+            ),
+            If(self.sof,
+                vcount.eq(0)
+            ).Elif(self.stb,
+                vcount.eq(vcount_cur)
+            )
+        ]
+
+        inside = Signal()
+        self.comb += [
+            inside.eq((hcount_cur >= x) & (hcount_cur < x + width) &
+                      (vcount_cur > y) & (vcount_cur <= y + height)),
+            If(enable,
+                self.source_stb.eq(self.stb & inside),
+                self.source_sop.eq(self.stb & inside & (hcount_cur == x))
+            ).Else(
+                self.source_stb.eq(self.stb),
+                self.source_sop.eq(self.stb & self.sop)
+            )
+        ]
+
+
+class _TB(Module):
+    def __init__(self, width, height, window, hblank=3):
+        self.width = width
+        self.height = height
+        self.hblank = hblank
+        self.kept = []
+        self.starts = []
+
+        self.submodules.crop = Crop()
+        x, y, w, h = window
+        self.comb += [
+            self.crop.enable.eq(1),
+            self.crop.x.eq(x),
+            self.crop.y.eq(y),
+            self.crop.width.eq(w),
+            self.crop.height.eq(h)
+        ]
+        self.source_stb = Signal()
+        self.source_sop = Signal()
+        self.sync += [
+            self.source_stb.eq(self.crop.source_stb),
+            self.source_sop.eq(self.crop.source_sop)
+        ]
+
+    def gen_simulation(self, selfp):
+        c = selfp.crop
+        for frame in range(2):
+            c.sof = 1
+            yield
+            c.sof = 0
+            for line in range(self.height):
+                for x in range(self.width + self.hblank):
+                    c.stb = int(x < self.width)
+                    c.sop = int(x == 0)
+                    yield
+                    if frame == 1 and selfp.source_stb:
+                        self.kept.append((x, line))
+                        if selfp.source_sop:
+                            self.starts.append((x, line))
+            c.stb = 0
+
+if __name__ == "__main__":
+    from migen.sim.generic import run_simulation
+
+    width, height = 16, 8
+    for window in [(2, 1, 6, 3), (5, 0, 7, 8), (10, 6, 16, 4), (0, 0, 16, 8)]:
+        tb = _TB(width, height, window)
+        run_simulation(tb)
+        x, y, w, h = window
+        x, w = x & ~1, w & ~1
+        expected = [(i, j) for j in range(y, min(y + h, height)) for i in range(x, min(x + w, width))]
+        starts = [(x, j) for j in range(y, min(y + h, height))]
+        print("window {}: {} pixels kept".format(window, len(tb.kept)))
+        assert tb.kept == expected
+        assert tb.starts == starts
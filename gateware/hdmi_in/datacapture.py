@@ -1,10 +1,303 @@
 from migen.fhdl.std import *
 from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.genlib.fsm import FSM, NextState
 from migen.bank.description import *
 
 
+class PhaseAligner(Module, AutoCSR):
+    """Autonomous IODELAY phase alignment (sys clock domain)
+
+    When enabled (or restarted), calibrates and resets the IODELAYs, then
+    follows the phase detector: too_early increments the delay, too_late
+    decrements it. locked is set once no adjustment was needed for
+    2**lock_bits cycles, time_to_lock is the number of cycles from start.
+    Firmware can still use dly_ctl/phase_reset while enabled, or disable the
+    aligner for full manual control.
+    hold (eye scan in progress) suspends the aligner: no command is issued
+    (pending ones wait) and tracking resumes after a phase detector reset
+    and holdoff once released (or restart from calibration on start).
+    """
+    def __init__(self, lock_bits=20, holdoff=16):
+        self.hold = Signal()
+        self.busy = Signal()
+        self.too_late = Signal()
+        self.too_early = Signal()
+        self.cal = Signal()
+        self.rst = Signal()
+        self.inc = Signal()
+        self.dec = Signal()
+        self.phase_reset = Signal()
+
+        self._enable = CSRStorage()
+        self._restart = CSR()
+        self._locked = CSRStatus()
+        self._tap = CSRStatus(8)
+        self._adjustments = CSRStatus(32)
+        self._time_to_lock = CSRStatus(32)
+
+        ###
+
+        enable = self._enable.storage
+        enable_r = Signal()
+        self.start = start = Signal()
+        self.sync += enable_r.eq(enable)
+        self.comb += start.eq(enable & (~enable_r | self._restart.re))
+
+        fsm = FSM(reset_state="IDLE")
+        self.submodules += fsm
+        fsm.act("IDLE",
+            If(start, NextState("CAL"))
+        )
+        fsm.act("CAL",
+            If(~self.hold,
+                self.cal.eq(1),
+                NextState("WAIT_CAL")
+            )
+        )
+        fsm.act("WAIT_CAL",
+            If(~self.busy, NextState("RST"))
+        )
+        fsm.act("RST",
+            If(~self.hold,
+                self.rst.eq(1),
+                self.phase_reset.eq(1),
+                NextState("HOLDOFF")
+            )
+        )
+        # wait for the new phase detector status to reach sys
+        holdoff_counter = Signal(max=holdoff+1)
+        self.sync += If(fsm.ongoing("HOLDOFF"),
+                holdoff_counter.eq(holdoff_counter + 1)
+            ).Else(
+                holdoff_counter.eq(0)
+            )
+        fsm.act("HOLDOFF",
+            If(~enable,
+                NextState("IDLE")
+            ).Elif(self.hold,
+                NextState("HOLD")
+            ).Elif(holdoff_counter == holdoff,
+                NextState("TRACK")
+            )
+        )
+        fsm.act("TRACK",
+            If(~enable,
+                NextState("IDLE")
+            ).Elif(start,
+                NextState("CAL")
+            ).Elif(self.hold,
+                NextState("HOLD")
+            ).Elif(self.too_late,
+                self.dec.eq(1),
+                NextState("WAIT_ADJUST")
+            ).Elif(self.too_early,
+                self.inc.eq(1),
+                NextState("WAIT_ADJUST")
+            )
+        )
+        fsm.act("WAIT_ADJUST",
+            If(~self.busy & ~self.hold,
+                self.phase_reset.eq(1),
+                NextState("HOLDOFF")
+            )
+        )
+        # the phase detector status is stale after the delays were moved
+        fsm.act("HOLD",
+            If(~enable,
+                NextState("IDLE")
+            ).Elif(start,
+                NextState("CAL")
+            ).Elif(~self.hold,
+                self.phase_reset.eq(1),
+                NextState("HOLDOFF")
+            )
+        )
+
+        # statistics
+        tap = Signal((8, True))
+        elapsed = Signal(32)
+        quiet = Signal(lock_bits)
+        self.comb += self._tap.status.eq(tap)
+        self.sync += [
+            If(start,
+                tap.eq(0),
+                self._adjustments.status.eq(0),
+                self._locked.status.eq(0),
+                self._time_to_lock.status.eq(0),
+                elapsed.eq(0),
+                quiet.eq(0)
+            ).Else(
+                If(self.inc, tap.eq(tap + 1)),
+                If(self.dec, tap.eq(tap - 1)),
+                If(self.inc | self.dec,
+                    self._adjustments.status.eq(self._adjustments.status + 1),
+                    quiet.eq(0)
+                ).Elif(fsm.ongoing("TRACK"),
+                    quiet.eq(quiet + 1)
+                ),
+                If(~fsm.ongoing("IDLE") & ~self._locked.status,
+                    elapsed.eq(elapsed + 1),
+                    If(quiet == (2**lock_bits - 1),
+                        self._locked.status.eq(1),
+                        self._time_to_lock.status.eq(elapsed)
+                    )
+                )
+            )
+        ]
+
+
+class EyeScan(Module, AutoCSR):
+    """IODELAY eye scan with WER (sys clock domain)
+
+    On start, moves the delays taps steps down from the current position,
+    then sweeps 2*taps+1 positions up. At each position, the WER of the first
+    complete period after the move (second WER update) is written to the
+    result table, read with table_adr/table_dat (entry 0 is the lowest
+    position). The delays are then parked in the centre of the widest run of
+    positions with WER <= threshold, or back to the start position if there
+    is none: centre is the final position relative to the start position,
+    width the width of the run.
+    While busy, DataCapture ignores other delay commands.
+    """
+    def __init__(self, wer_bits=24, max_taps=31):
+        self.dly_busy = Signal()
+        self.wer_value = Signal(wer_bits)
+        self.wer_updated = Signal()
+        self.inc = Signal()
+        self.dec = Signal()
+        self.scanning = Signal()
+
+        self._start = CSR()
+        self._taps = CSRStorage(bits_for(max_taps), reset=16)
+        self._threshold = CSRStorage(wer_bits)
+        self._busy = CSRStatus()
+        self._centre = CSRStatus(8)
+        self._width = CSRStatus(8)
+        self._table_adr = CSRStorage(bits_for(2*max_taps))
+        self._table_dat = CSRStatus(wer_bits)
+
+        ###
+
+        taps = self._taps.storage
+        index = Signal(max=2*max_taps+1)
+        moves = Signal(max=2*max_taps+1)
+        updates = Signal(2)
+
+        # result table
+        mem = Memory(wer_bits, 2*max_taps+1)
+        wrport = mem.get_port(write_capable=True)
+        rdport = mem.get_port()
+        self.specials += mem, wrport, rdport
+        self.comb += [
+            wrport.adr.eq(index),
+            wrport.dat_w.eq(self.wer_value),
+            rdport.adr.eq(self._table_adr.storage),
+            self._table_dat.status.eq(rdport.dat_r)
+        ]
+
+        # widest open run
+        is_open = Signal()
+        run = Signal(max=2*max_taps+2)
+        best = Signal(max=2*max_taps+2)
+        best_end = Signal(max=2*max_taps+1)
+        centre_index = Signal(max=2*max_taps+1)
+        self.comb += [
+            is_open.eq(self.wer_value <= self._threshold.storage),
+            If(best == 0,
+                centre_index.eq(taps)
+            ).Else(
+                centre_index.eq(best_end - ((best - 1) >> 1))
+            )
+        ]
+
+        fsm = FSM(reset_state="IDLE")
+        self.submodules += fsm
+        fsm.act("IDLE",
+            If(self._start.re, NextState("MOVE_DOWN"))
+        )
+        fsm.act("MOVE_DOWN",
+            If(moves == 0,
+                NextState("SETTLE")
+            ).Else(
+                self.dec.eq(1),
+                NextState("WAIT_DOWN")
+            )
+        )
+        fsm.act("WAIT_DOWN",
+            If(~self.dly_busy, NextState("MOVE_DOWN"))
+        )
+        fsm.act("SETTLE",
+            If(updates == 2, NextState("RECORD"))
+        )
+        fsm.act("RECORD",
+            wrport.we.eq(1),
+            If(index == 2*taps,
+                NextState("CENTRE")
+            ).Else(
+                NextState("MOVE_UP")
+            )
+        )
+        fsm.act("MOVE_UP",
+            self.inc.eq(1),
+            NextState("WAIT_UP")
+        )
+        fsm.act("WAIT_UP",
+            If(~self.dly_busy, NextState("SETTLE"))
+        )
+        fsm.act("CENTRE",
+            NextState("PARK")
+        )
+        fsm.act("PARK",
+            If(moves == 0,
+                NextState("IDLE")
+            ).Else(
+                self.dec.eq(1),
+                NextState("WAIT_PARK")
+            )
+        )
+        fsm.act("WAIT_PARK",
+            If(~self.dly_busy, NextState("PARK"))
+        )
+
+        self.sync += [
+            If(fsm.ongoing("IDLE"),
+                moves.eq(taps),
+                index.eq(0),
+                run.eq(0),
+                best.eq(0)
+            ),
+            If(self.dec, moves.eq(moves - 1)),
+            If(self.inc, index.eq(index + 1)),
+            If(fsm.ongoing("SETTLE"),
+                If(self.wer_updated, updates.eq(updates + 1))
+            ).Else(
+                updates.eq(0)
+            ),
+            If(fsm.ongoing("RECORD"),
+                If(is_open,
+                    run.eq(run + 1),
+                    If(run + 1 > best,
+                        best.eq(run + 1),
+                        best_end.eq(index)
+                    )
+                ).Else(
+                    run.eq(0)
+                )
+            ),
+            If(fsm.ongoing("CENTRE"),
+                moves.eq(index - centre_index),
+                self._centre.status.eq(centre_index - taps),
+                self._width.status.eq(best)
+            )
+        ]
+        self.comb += [
+            self.scanning.eq(~fsm.ongoing("IDLE")),
+            self._busy.status.eq(self.scanning)
+        ]
+
+
 class DataCapture(Module, AutoCSR):
-    def __init__(self, pad_p, pad_n, ntbits):
+    def __init__(self, pad_p, pad_n, ntbits, auto_phase=False, eye_scan=False):
         self.serdesstrobe = Signal()
         self.d = Signal(10)
 
@@ -163,13 +456,47 @@ class DataCapture(Module, AutoCSR):
             )
         ]
 
+        dly_ctl = [self._dly_ctl.re & self._dly_ctl.r[i] for i in range(6)]
+        phase_reset = self._phase_reset.re
+        if auto_phase:
+            self.submodules.auto = PhaseAligner()
+            self.comb += [
+                self.auto.busy.eq(sys_delay_master_pending | sys_delay_slave_pending),
+                self.auto.too_late.eq(self._phase.status[0]),
+                self.auto.too_early.eq(self._phase.status[1])
+            ]
+            dly_ctl = [dly_ctl[0] | self.auto.cal,
+                       dly_ctl[1] | self.auto.rst,
+                       dly_ctl[2] | self.auto.cal,
+                       dly_ctl[3] | self.auto.rst,
+                       dly_ctl[4] | self.auto.inc,
+                       dly_ctl[5] | self.auto.dec]
+            phase_reset = phase_reset | self.auto.phase_reset
+        if eye_scan:
+            self.submodules.scan = EyeScan()
+            self.comb += self.scan.dly_busy.eq(sys_delay_master_pending | sys_delay_slave_pending)
+            # the scan owns the delays while busy, and the aligner stays on
+            # hold once they are parked until it is restarted
+            if auto_phase:
+                parked = Signal()
+                self.sync += \
+                    If(self.scan.scanning,
+                        parked.eq(1)
+                    ).Elif(self.auto.start,
+                        parked.eq(0)
+                    )
+                self.comb += self.auto.hold.eq(self.scan.scanning | parked)
+            dly_ctl = [c & ~self.scan.scanning for c in dly_ctl]
+            dly_ctl[4] = dly_ctl[4] | self.scan.inc
+            dly_ctl[5] = dly_ctl[5] | self.scan.dec
+
         self.comb += [
-            self.do_delay_master_cal.i.eq(self._dly_ctl.re & self._dly_ctl.r[0]),
-            self.do_delay_master_rst.i.eq(self._dly_ctl.re & self._dly_ctl.r[1]),
-            self.do_delay_slave_cal.i.eq(self._dly_ctl.re & self._dly_ctl.r[2]),
-            self.do_delay_slave_rst.i.eq(self._dly_ctl.re & self._dly_ctl.r[3]),
-            self.do_delay_inc.i.eq(self._dly_ctl.re & self._dly_ctl.r[4]),
-            self.do_delay_dec.i.eq(self._dly_ctl.re & self._dly_ctl.r[5]),
+            self.do_delay_master_cal.i.eq(dly_ctl[0]),
+            self.do_delay_master_rst.i.eq(dly_ctl[1]),
+            self.do_delay_slave_cal.i.eq(dly_ctl[2]),
+            self.do_delay_slave_rst.i.eq(dly_ctl[3]),
+            self.do_delay_inc.i.eq(dly_ctl[4]),
+            self.do_delay_dec.i.eq(dly_ctl[5]),
             self._dly_busy.status.eq(Cat(sys_delay_master_pending, sys_delay_slave_pending))
         ]
 
@@ -178,7 +505,7 @@ class DataCapture(Module, AutoCSR):
         self.submodules.do_reset_lateness = PulseSynchronizer("sys", "pix2x")
         self.comb += [
             reset_lateness.eq(self.do_reset_lateness.o),
-            self.do_reset_lateness.i.eq(self._phase_reset.re)
+            self.do_reset_lateness.i.eq(phase_reset)
         ]
 
         # 5:10 deserialization
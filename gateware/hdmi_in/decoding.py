@@ -2,6 +2,7 @@ from migen.fhdl.std import *
 from migen.genlib.record import Record
 
 from gateware.hdmi_in.common import control_tokens, channel_layout
+from gateware.hdmi_in.charsync import CharSync
 
 
 class Decoding(Module):
@@ -23,3 +24,66 @@ class Decoding(Module):
         for i in range(1, 8):
             self.sync.pix += self.output.d[i].eq(self.input[i] ^ self.input[i-1] ^ ~self.input[8])
         self.sync.pix += self.valid_o.eq(self.valid_i)
+
+
+class _TB(Module):
+    def __init__(self, raw):
+        self.raw = raw
+        self.outs = []
+
+        self.submodules.charsync = RenameClockDomains(CharSync(), {"pix": "sys"})
+        self.submodules.decoding = RenameClockDomains(Decoding(), {"pix": "sys"})
+        self.comb += [
+            self.decoding.valid_i.eq(self.charsync.synced),
+            self.decoding.input.eq(self.charsync.data)
+        ]
+
+    def do_simulation(self, selfp):
+        cycle = selfp.simulator.cycle_counter
+        if cycle == len(self.raw):
+            raise StopSimulation
+        selfp.charsync.raw_data = int(self.raw[cycle])
+        output = selfp.decoding.output
+        self.outs.append((selfp.decoding.valid_o, output.de, output.c, output.d))
+
+
+if __name__ == "__main__":
+    import argparse
+    import numpy as np
+    from migen.sim.generic import run_simulation
+    from gateware import tmds
+
+    parser = argparse.ArgumentParser(description="CharSync/Decoding vs TMDS model on a frame")
+    parser.add_argument("--timing", default="720p", help="video timing ({})".format(", ".join(tmds.timings)))
+    parser.add_argument("--lines", type=int, default=0, help="number of lines to simulate (0: whole frame)")
+    parser.add_argument("--channel", type=int, default=0, help="TMDS channel")
+    parser.add_argument("--slip", type=int, default=3, help="bit slip of the serial stream (0-9)")
+    args = parser.parse_args()
+
+    h_active, hfp, hs, hbp, v_active, vfp, vs, vbp = tmds.timings[args.timing]
+    h_total = h_active + hfp + hs + hbp
+    v_total = v_active + vfp + vs + vbp
+    frame = tmds.test_frame(h_active, v_active)
+    d, c, de = tmds.video_stream(frame, args.timing)
+    length = (args.lines or v_total)*h_total
+    d, c, de = d[args.channel, :length], c[args.channel, :length], de[:length]
+    symbols, cnt = tmds.encode(d, c, de)
+
+    tb = _TB(tmds.serialize(symbols, args.slip))
+    run_simulation(tb)
+
+    # compare d on data symbols, c on control symbols
+    valid, out_de, out_c, out_d = np.array(tb.outs).T
+    expected = (de << 10) | np.where(de, d, c << 8)
+    outs = (out_de << 10) | np.where(out_de, out_d, out_c << 8)
+    synced = np.flatnonzero(valid)
+    assert len(synced)
+    # synced rises with word_sel: the first valid symbol still uses the
+    # previous word_sel
+    start = synced[0] + 1
+    print("synced after {} cycles".format(start))
+    latencies = range(min(start, 16) + 1)
+    errors = [np.count_nonzero(outs[start:] != expected[start - l:len(outs) - l]) for l in latencies]
+    latency = int(np.argmin(errors))
+    print("latency {} cycles, {} errors on {} symbols".format(latency, errors[latency], len(outs) - start))
+    assert errors[latency] == 0
@@ -7,6 +7,8 @@ from migen.flow.actor import *
 from misoclib.mem.sdram.frontend import dma_lasmi
 from misoclib.com.liteethmini.mac.core.crc import LiteEthMACCRC32 as CRC32
 
+from gateware.hdmi_in.tilehash import TileHash
+
 
 # Slot status: EMPTY=0 LOADED=1 PENDING=2
 class _Slot(Module, AutoCSR):
@@ -16,43 +18,100 @@ class _Slot(Module, AutoCSR):
         self.address_reached = Signal(addr_bits)
         self.address_valid = Signal()
         self.address_done = Signal()
+        self.ring = Signal()
+
+        # frame metadata, latched on address_done
+        self.sequence = Signal(32)
+        self.timestamp = Signal(32)
+        self.length = Signal(addr_bits + alignment_bits)
+        self.crc = Signal(32)
 
         self._status = CSRStorage(2, write_from_dev=True)
         self._address = CSRStorage(addr_bits + alignment_bits, alignment_bits=alignment_bits, write_from_dev=True)
+        self._sequence = CSRStatus(32)
+        self._timestamp = CSRStatus(32)
+        self._length = CSRStatus(addr_bits + alignment_bits)
+        self._crc = CSRStatus(32)
 
         ###
 
         self.comb += [
             self.address.eq(self._address.storage),
-            self.address_valid.eq(self._status.storage[0]),
+            If(self.ring,
+                self.address_valid.eq(self._status.storage != 0)
+            ).Else(
+                self.address_valid.eq(self._status.storage[0])
+            ),
             self._status.dat_w.eq(2),
-            self._status.we.eq(self.address_done),
+            self._status.we.eq(self.address_done & ~self.ring),
             self._address.dat_w.eq(self.address_reached),
-            self._address.we.eq(self.address_done),
+            self._address.we.eq(self.address_done & ~self.ring),
             self.ev_source.trigger.eq(self._status.storage[1])
         ]
+        self.sync += If(self.address_done,
+            self._sequence.status.eq(self.sequence),
+            self._timestamp.status.eq(self.timestamp),
+            self._length.status.eq(self.length),
+            self._crc.status.eq(self.crc)
+        )
 
 
 class _SlotArray(Module, AutoCSR):
+    """DMA slots
+
+    By default, frames are written to the first LOADED slot, which becomes
+    PENDING (address is then the end address) until reloaded by firmware.
+
+    In ring mode, slots are filled round-robin, skipping EMPTY slots (firmware
+    can empty a slot to keep it from being overwritten while in use, a slot
+    emptied while being written is completed).
+    Status and address of slots are not modified: the done event signals
+    each frame and last is the index of the last written slot.
+
+    The current slot only changes at the end of a frame or while idle (no
+    frame being written).
+
+    In both modes, each written slot records the frame sequence number,
+    the SOF timestamp (sys cycles), the length (bytes) and CRC of the frame.
+    """
     def __init__(self, nslots, addr_bits, alignment_bits):
         self.submodules.ev = EventManager()
         self.address = Signal(addr_bits)
         self.address_reached = Signal(addr_bits)
         self.address_valid = Signal()
         self.address_done = Signal()
+        self.idle = Signal()
+        self.timestamp = Signal(32)
+        self.length = Signal(addr_bits + alignment_bits)
+        self.crc = Signal(32)
+
+        self._ring = CSRStorage()
+        self._last = CSRStatus(bits_for(max(nslots - 1, 1)))
 
         ###
 
+        ring = self._ring.storage
         slots = [_Slot(addr_bits, alignment_bits) for i in range(nslots)]
         for n, slot in enumerate(slots):
             setattr(self.submodules, "slot"+str(n), slot)
             setattr(self.ev, "slot"+str(n), slot.ev_source)
+        self.ev.done = EventSourcePulse()
         self.ev.finalize()
 
         change_slot = Signal()
         current_slot = Signal(max=nslots)
-        self.sync += If(change_slot, [If(slot.address_valid, current_slot.eq(n)) for n, slot in reversed(list(enumerate(slots)))])
-        self.comb += change_slot.eq(~self.address_valid | self.address_done)
+        self.sync += If(change_slot,
+            If(ring,
+                If(current_slot == nslots - 1,
+                    current_slot.eq(0)
+                ).Else(
+                    current_slot.eq(current_slot + 1)
+                )
+            ).Else(
+                [If(slot.address_valid, current_slot.eq(n)) for n, slot in reversed(list(enumerate(slots)))]
+            )
+        )
+        self.comb += change_slot.eq((~self.address_valid & self.idle) | self.address_done)
 
         self.comb += [
             self.address.eq(Array(slot.address for slot in slots)[current_slot]),
@@ -61,9 +120,36 @@ class _SlotArray(Module, AutoCSR):
         self.comb += [slot.address_reached.eq(self.address_reached) for slot in slots]
         self.comb += [slot.address_done.eq(self.address_done & (current_slot == n)) for n, slot in enumerate(slots)]
 
+        # metadata
+        sequence = Signal(32)
+        self.sync += If(self.address_done,
+            sequence.eq(sequence + 1),
+            self._last.status.eq(current_slot)
+        )
+        for slot in slots:
+            self.comb += [
+                slot.ring.eq(ring),
+                slot.sequence.eq(sequence),
+                slot.timestamp.eq(self.timestamp),
+                slot.length.eq(self.length),
+                slot.crc.eq(self.crc)
+            ]
+        self.comb += self.ev.done.trigger.eq(self.address_done & ring)
+
 
 class DMA(Module):
-    def __init__(self, lasmim, nslots):
+    """Frame DMA
+
+    Frames are captured according to a decimation pattern: bit i of
+    decimation_pattern enables the capture of frame i of each sequence of
+    decimation_period frames (every frame by default), decimation_period is
+    1 to 16 (0 behaves as 1, larger values as 16). Other frames (and frames
+    without a loaded slot) are skipped without SDRAM access.
+    captured/skipped count frames.
+
+    With tile_size, frames are also hashed by tiles (see TileHash).
+    """
+    def __init__(self, lasmim, nslots, tile_size=None):
         bus_aw = lasmim.aw
         bus_dw = lasmim.dw
         alignment_bits = bits_for(bus_dw//8) - 1
@@ -72,6 +158,14 @@ class DMA(Module):
         self.frame = Sink([("sof", 1), ("pixels", fifo_word_width)])
         self._frame_size = CSRStorage(bus_aw + alignment_bits, alignment_bits=alignment_bits)
         self.crc = CSRStorage(32, write_from_dev=True)
+        self._decimation_pattern = CSRStorage(16, reset=1)
+        self._decimation_period = CSRStorage(bits_for(16), reset=1)
+        self._captured = CSRStatus(32)
+        self._skipped = CSRStatus(32)
+        # write path telemetry, values since the last snapshot
+        self.snapshot = Signal()
+        self._transfer_cycles = CSRStatus(32)
+        self._stall_cycles = CSRStatus(32)
         self.submodules._slot_array = _SlotArray(nslots, bus_aw, alignment_bits)
         self.ev = self._slot_array.ev
 
@@ -97,6 +191,24 @@ class DMA(Module):
             )
         ]
 
+        # frame metadata: SOF timestamp, written length
+        cycles = Signal(32)
+        timestamp = Signal(32)
+        words = Signal(bus_aw)
+        self.sync += [
+            cycles.eq(cycles + 1),
+            If(reset_words,
+                timestamp.eq(cycles),
+                words.eq(0)
+            ).Elif(count_word,
+                words.eq(words + 1)
+            )
+        ]
+        self.comb += [
+            self._slot_array.timestamp.eq(timestamp),
+            self._slot_array.length.eq(words << alignment_bits)
+        ]
+
         memory_word = Signal(bus_dw)
         pixbits = []
         for i in range(bus_dw//16):
@@ -110,17 +222,35 @@ class DMA(Module):
             self._bus_accessor.address_data.d.eq(memory_word)
         ]
 
+        # frame decimation
+        new_frame = Signal()
+        capture = Signal()
+        pattern_length = flen(self._decimation_pattern.storage)
+        phase = Signal(max=pattern_length)
+        self.comb += capture.eq(self._decimation_pattern.storage >> phase)
+        self.sync += If(new_frame,
+            If((phase == pattern_length - 1) | (phase + 1 >= self._decimation_period.storage),
+                phase.eq(0)
+            ).Else(
+                phase.eq(phase + 1)
+            )
+        )
+
         # control FSM
         fsm = FSM()
         crcengine = CRC32(bus_dw)
         self.submodules += fsm, crcengine
 
+        start = Signal()
+        self.comb += start.eq(self._slot_array.address_valid & capture)
 
+        self.comb += self._slot_array.idle.eq(fsm.ongoing("WAIT_SOF"))
         fsm.act("WAIT_SOF",
             crcengine.reset.eq(1),
             reset_words.eq(1),
-            self.frame.ack.eq(~self._slot_array.address_valid | ~self.frame.sof),
-            If(self._slot_array.address_valid & self.frame.sof & self.frame.stb, NextState("TRANSFER_PIXELS"))
+            self.frame.ack.eq(~start | ~self.frame.sof),
+            new_frame.eq(self.frame.sof & self.frame.stb),
+            If(start & self.frame.sof & self.frame.stb, NextState("TRANSFER_PIXELS"))
         )
         fsm.act("TRANSFER_PIXELS",
             self.frame.ack.eq(self._bus_accessor.address_data.ack),
@@ -134,6 +264,7 @@ class DMA(Module):
                 )
             )
         )
+        self.comb += self._slot_array.crc.eq(crcengine.value)
         fsm.act("EOF",
             self.crc.dat_w.eq(crcengine.value),
             self.crc.we.eq(1),
@@ -143,5 +274,53 @@ class DMA(Module):
             )
         )
 
+        # tile hashes
+        if tile_size is not None:
+            self.submodules.tilehash = TileHash(bus_dw, tile_size)
+            self.comb += [
+                self.tilehash.start.eq(reset_words),
+                self.tilehash.stb.eq(count_word),
+                self.tilehash.data.eq(self.frame.pixels),
+                self.tilehash.remaining.eq(mwords_remaining),
+                self.tilehash.done.eq(self._slot_array.address_done)
+            ]
+
+        # statistics
+        self.sync += [
+            If(self._slot_array.address_done,
+                self._captured.status.eq(self._captured.status + 1)
+            ),
+            If(new_frame & ~start,
+                self._skipped.status.eq(self._skipped.status + 1)
+            )
+        ]
+
+        # telemetry: cycles transferring a frame, and among them cycles
+        # with a word waiting for the LASMI writer
+        transfer_cycles = Signal(32)
+        stall_cycles = Signal(32)
+        transfer = Signal()
+        stall = Signal()
+        self.comb += [
+            transfer.eq(fsm.ongoing("TRANSFER_PIXELS")),
+            stall.eq(transfer & self.frame.stb & ~self._bus_accessor.address_data.ack)
+        ]
+        self.sync += \
+            If(self.snapshot,
+                self._transfer_cycles.status.eq(transfer_cycles),
+                self._stall_cycles.status.eq(stall_cycles),
+                transfer_cycles.eq(transfer),
+                stall_cycles.eq(stall)
+            ).Else(
+                If(transfer, transfer_cycles.eq(transfer_cycles + 1)),
+                If(stall, stall_cycles.eq(stall_cycles + 1))
+            )
+
     def get_csrs(self):
-        return [self._frame_size, self.crc] + self._slot_array.get_csrs()
+        csrs = [self._frame_size, self.crc,
+                self._decimation_pattern, self._decimation_period,
+                self._captured, self._skipped,
+                self._transfer_cycles, self._stall_cycles] + self._slot_array.get_csrs()
+        if hasattr(self, "tilehash"):
+            csrs += self.tilehash.get_csrs()
+        return csrs
@@ -0,0 +1,247 @@
+from migen.fhdl.std import *
+
+
+class Downscaler(Module):
+    """YCbCr 4:2:2 box downscaler
+
+    Averages blocks of 2**hshift x 2**vshift pixels (hshift, vshift: 0 to 2,
+    sampled at start of frame). Luma is averaged per output pixel, chroma per
+    output pixel pair (over the Cb, resp. Cr, samples of the 2 blocks), so
+    the output is 4:2:2 again. Lines are accumulated in a BRAM line buffer.
+
+    stb/sop/sof (start of frame, before the first line) are pixel strobes,
+    sop is only valid with stb. Incomplete blocks at the end of lines/frames
+    are dropped: line widths should be multiples of 2*2**hshift.
+    Output pixels are signaled by source_stb (at most one every 2**hshift
+    input pixels, as pairs on consecutive cycles).
+    """
+    def __init__(self, dw=8, max_line=2048):
+        self.stb = Signal()
+        self.sop = Signal()
+        self.sof = Signal()
+        self.y = Signal(dw)
+        self.cb_cr = Signal(dw)
+        self.hshift = Signal(2)
+        self.vshift = Signal(2)
+
+        self.source_stb = Signal()
+        self.source_y = Signal(dw)
+        self.source_cb_cr = Signal(dw)
+
+        ###
+
+        # scale factors (latched at start of frame)
+        hshift = Signal(2)
+        vshift = Signal(2)
+        self.sync += If(self.sof,
+            hshift.eq(self.hshift),
+            vshift.eq(self.vshift)
+        )
+        hmask = Signal(2)
+        vmask = Signal(2)
+        self.comb += [
+            Case(hshift, {0: hmask.eq(0), 1: hmask.eq(1), "default": hmask.eq(3)}),
+            Case(vshift, {0: vmask.eq(0), 1: vmask.eq(1), "default": vmask.eq(3)})
+        ]
+
+        # horizontal: position in the group of 2 blocks (pos[0] is the
+        # chroma parity, bit hshift the output pixel parity)
+        pos = Signal(3)
+        pos_cur = Signal(3)
+        odd_block = Signal()
+        block_start = Signal()
+        block_end = Signal()
+        self.comb += [
+            pos_cur.eq(Mux(self.sop, 0, pos)),
+            Case(hshift, {
+                0: odd_block.eq(pos_cur[0]),
+                1: odd_block.eq(pos_cur[1]),
+                "default": odd_block.eq(pos_cur[2])
+            }),
+            block_start.eq((pos_cur[:2] & hmask) == 0),
+            block_end.eq((pos_cur[:2] & hmask) == hmask)
+        ]
+        self.sync += If(self.stb,
+            If(block_end & odd_block,
+                pos.eq(0)
+            ).Else(
+                pos.eq(pos_cur + 1)
+            )
+        )
+
+        y_acc = Signal(dw+2)
+        cb_acc = Signal(dw+2)
+        cr_acc = Signal(dw+2)
+        y_sum = Signal(dw+2)
+        cr_sum = Signal(dw+2)
+        self.comb += [
+            y_sum.eq(Mux(block_start, 0, y_acc) + self.y),
+            cr_sum.eq(Mux(pos_cur == 1, 0, cr_acc) + self.cb_cr)
+        ]
+        y_even = Signal(dw)
+        odd_pending = Signal()
+        odd_y = Signal(dw)
+        odd_cr = Signal(dw)
+
+        hstb = Signal()
+        hy = Signal(dw)
+        hc = Signal(dw)
+        hx = Signal(max=max_line)
+        self.sync += [
+            If(self.stb,
+                y_acc.eq(y_sum),
+                If(pos_cur[0],
+                    cr_acc.eq(cr_sum)
+                ).Else(
+                    cb_acc.eq(Mux(pos_cur == 0, 0, cb_acc) + self.cb_cr)
+                ),
+                If(block_end & ~odd_block,
+                    y_even.eq(y_sum >> hshift)
+                )
+            ),
+            hstb.eq(0),
+            odd_pending.eq(0),
+            If(self.stb & block_end & odd_block,
+                hstb.eq(1),
+                hy.eq(y_even),
+                hc.eq(cb_acc >> hshift),
+                odd_pending.eq(1),
+                odd_y.eq(y_sum >> hshift),
+                odd_cr.eq(cr_sum >> hshift)
+            ).Elif(odd_pending,
+                hstb.eq(1),
+                hy.eq(odd_y),
+                hc.eq(odd_cr)
+            ),
+            If(self.stb & self.sop,
+                hx.eq(0)
+            ).Elif(hstb,
+                hx.eq(hx + 1)
+            )
+        ]
+
+        # vertical: line in the group of 2**vshift lines
+        vline = Signal(2)
+        self.sync += If(self.sof,
+                vline.eq(vmask)
+            ).Elif(self.stb & self.sop,
+                If(vline == vmask,
+                    vline.eq(0)
+                ).Else(
+                    vline.eq(vline + 1)
+                )
+            )
+        first_line = Signal()
+        last_line = Signal()
+        self.comb += [
+            first_line.eq(vline == 0),
+            last_line.eq(vline == vmask)
+        ]
+
+        # line buffer: read column sums with the pixel, write them back
+        # (or output) on the next cycle
+        line_buffer = Memory(2*(dw+2), max_line)
+        wrport = line_buffer.get_port(write_capable=True)
+        rdport = line_buffer.get_port()
+        self.specials += line_buffer, wrport, rdport
+
+        hstb_r = Signal()
+        hy_r = Signal(dw)
+        hc_r = Signal(dw)
+        hx_r = Signal(max=max_line)
+        self.sync += [
+            hstb_r.eq(hstb),
+            hy_r.eq(hy),
+            hc_r.eq(hc),
+            hx_r.eq(hx)
+        ]
+        vy_sum = Signal(dw+2)
+        vc_sum = Signal(dw+2)
+        self.comb += [
+            rdport.adr.eq(hx),
+            vy_sum.eq(Mux(first_line, 0, rdport.dat_r[:dw+2]) + hy_r),
+            vc_sum.eq(Mux(first_line, 0, rdport.dat_r[dw+2:]) + hc_r),
+            wrport.adr.eq(hx_r),
+            wrport.dat_w.eq(Cat(vy_sum, vc_sum)),
+            wrport.we.eq(hstb_r & ~last_line)
+        ]
+        self.sync += [
+            self.source_stb.eq(hstb_r & last_line),
+            self.source_y.eq(vy_sum >> vshift),
+            self.source_cb_cr.eq(vc_sum >> vshift)
+        ]
+
+
+def downscale_model(y, cb_cr, hshift, vshift):
+    """Reference model: y, cb_cr (lines, width) 4:2:2 planes, returns the downscaled planes"""
+    import numpy as np
+    y = np.asarray(y, dtype=np.int64)
+    c = np.asarray(cb_cr, dtype=np.int64)
+    hf, vf = 2**hshift, 2**vshift
+    height, width = y.shape[0]//vf*vf, y.shape[1]//(2*hf)*(2*hf)
+    y, c = y[:height, :width], c[:height, :width]
+
+    # horizontal, truncated at each stage as the gateware
+    y_h = y.reshape(height, -1, hf).sum(axis=2) >> hshift
+    cb = c[:, 0::2].reshape(height, -1, hf).sum(axis=2) >> hshift
+    cr = c[:, 1::2].reshape(height, -1, hf).sum(axis=2) >> hshift
+    c_h = np.stack([cb, cr], axis=2).reshape(height, -1)
+
+    # vertical
+    y_v = y_h.reshape(-1, vf, y_h.shape[1]).sum(axis=1) >> vshift
+    c_v = c_h.reshape(-1, vf, c_h.shape[1]).sum(axis=1) >> vshift
+    return y_v, c_v
+
+
+class _TB(Module):
+    def __init__(self, y, cb_cr, hshift, vshift, hblank=4):
+        self.y = y
+        self.cb_cr = cb_cr
+        self.hblank = hblank
+        self.output = []
+
+        self.submodules.downscaler = Downscaler(max_line=64)
+        self.comb += [
+            self.downscaler.hshift.eq(hshift),
+            self.downscaler.vshift.eq(vshift)
+        ]
+
+    def gen_simulation(self, selfp):
+        d = selfp.downscaler
+        d.sof = 1
+        yield
+        d.sof = 0
+        height, width = self.y.shape
+        for line in range(height):
+            for x in range(width + self.hblank):
+                d.stb = int(x < width)
+                d.sop = int(x == 0)
+                if x < width:
+                    d.y = int(self.y[line, x])
+                    d.cb_cr = int(self.cb_cr[line, x])
+                yield
+                if d.source_stb:
+                    self.output.append((d.source_y, d.source_cb_cr))
+        d.stb = 0
+        for i in range(4):
+            yield
+            if d.source_stb:
+                self.output.append((d.source_y, d.source_cb_cr))
+
+if __name__ == "__main__":
+    import numpy as np
+    from migen.sim.generic import run_simulation
+
+    rng = np.random.RandomState(0)
+    y = rng.randint(0, 256, (8, 32))
+    cb_cr = rng.randint(0, 256, (8, 32))
+    for hshift in range(3):
+        for vshift in range(3):
+            tb = _TB(y, cb_cr, hshift, vshift)
+            run_simulation(tb)
+            ref_y, ref_c = downscale_model(y, cb_cr, hshift, vshift)
+            out = np.array(tb.output).reshape(ref_y.shape + (2,))
+            errors = np.count_nonzero(out[..., 0] != ref_y) + np.count_nonzero(out[..., 1] != ref_c)
+            print("hshift {} vshift {}: {}x{} -> {}x{}, errors: {}".format(
+                hshift, vshift, y.shape[1], y.shape[0], ref_y.shape[1], ref_y.shape[0], errors))
+            assert errors == 0
@@ -0,0 +1,319 @@
+from migen.fhdl.std import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+from migen.bank.description import *
+from migen.bank.eventmanager import *
+
+
+class MotionDetector(Module, AutoCSR):
+    """Per frame motion score of a luma stream (pix clock domain)
+
+    Frames are reduced to a thumbnail of block_size x block_size pixel
+    block averages (incomplete blocks on the right/bottom edges are
+    ignored), kept in BRAM to be compared with the next frame. The motion
+    score is the sum of absolute differences (SAD) of the thumbnail with
+    the one of the previous frame.
+
+    sad, columns and rows (thumbnail size in blocks) are the values of the
+    last frame. The SAD of each region of region_blocks x region_blocks
+    blocks is read by region_adr (region row << region column bits |
+    region column)/region_sad. The motion event is raised at each frame
+    with a SAD higher than threshold.
+    """
+    def __init__(self, block_size=16, region_blocks=8, max_width=2048, max_height=1152, dw=8):
+        bs = log2_int(block_size)
+        rs = log2_int(region_blocks)
+        max_columns = max_width//block_size
+        max_rows = max_height//block_size
+        max_blocks = max_columns*max_rows
+        rcol_bits = bits_for((max_columns + region_blocks - 1)//region_blocks - 1)
+        rrow_bits = bits_for((max_rows + region_blocks - 1)//region_blocks - 1)
+        sad_bits = bits_for(max_blocks*(2**dw - 1))
+        region_sad_bits = bits_for(region_blocks*region_blocks*(2**dw - 1))
+
+        self.valid = Signal()
+        self.vsync = Signal()
+        self.y = Signal(dw)
+
+        self._threshold = CSRStorage(sad_bits)
+        self._sad = CSRStatus(sad_bits)
+        self._columns = CSRStatus(bits_for(max_columns))
+        self._rows = CSRStatus(bits_for(max_rows))
+        self._region_adr = CSRStorage(rcol_bits + rrow_bits)
+        self._region_sad = CSRStatus(region_sad_bits)
+
+        self.submodules.ev = EventManager()
+        self.ev.motion = EventSourcePulse()
+        self.ev.finalize()
+
+        ###
+
+        vsync_r = Signal()
+        new_frame = Signal()
+        self.comb += new_frame.eq(self.vsync & ~vsync_r)
+        self.sync.pix += vsync_r.eq(self.vsync)
+
+        # position
+        valid_r = Signal()
+        end_of_line = Signal()
+        x = Signal(bits_for(max_width))
+        col = Signal(flen(x) - bs)
+        line_columns = Signal(max=max_columns+1)
+        line_in_block = Signal(bs)
+        block_row = Signal(max=max_rows+1)
+        row_base = Signal(max=max_blocks+max_columns)
+        columns = Signal(max=max_columns+1)
+        self.comb += [
+            end_of_line.eq(valid_r & ~self.valid),
+            col.eq(x[bs:]),
+            If(col > max_columns,
+                line_columns.eq(max_columns)
+            ).Else(
+                line_columns.eq(col)
+            )
+        ]
+        self.sync.pix += [
+            valid_r.eq(self.valid),
+            If(self.valid,
+                x.eq(x + 1)
+            ).Else(
+                x.eq(0)
+            ),
+            If(new_frame,
+                line_in_block.eq(0),
+                block_row.eq(0),
+                row_base.eq(0)
+            ).Elif(end_of_line,
+                columns.eq(line_columns),
+                line_in_block.eq(line_in_block + 1),
+                If((line_in_block == block_size - 1) & (block_row != max_rows),
+                    block_row.eq(block_row + 1),
+                    row_base.eq(row_base + line_columns)
+                )
+            )
+        ]
+
+        # block sums, partial sums of the blocks of the current row are kept
+        # in a LUTRAM between lines
+        partial = Memory(dw + 2*bs, max_columns)
+        partial_wrport = partial.get_port(write_capable=True, clock_domain="pix")
+        partial_rdport = partial.get_port(async_read=True, clock_domain="pix")
+        self.specials += partial, partial_wrport, partial_rdport
+
+        block_end = Signal()
+        acc = Signal(dw + 2*bs)
+        acc_in = Signal(dw + 2*bs)
+        block_sum = Signal(dw + 2*bs)
+        final = Signal()
+        self.comb += [
+            block_end.eq(self.valid & (x[:bs] == block_size - 1) & (col < max_columns)),
+            partial_rdport.adr.eq(col),
+            If(x[:bs] == 0,
+                If(line_in_block == 0,
+                    acc_in.eq(0)
+                ).Else(
+                    acc_in.eq(partial_rdport.dat_r)
+                )
+            ).Else(
+                acc_in.eq(acc)
+            ),
+            block_sum.eq(acc_in + self.y),
+            partial_wrport.adr.eq(col),
+            partial_wrport.dat_w.eq(block_sum),
+            partial_wrport.we.eq(block_end & (line_in_block != block_size - 1)),
+            final.eq(block_end & (line_in_block == block_size - 1) & (block_row < max_rows))
+        ]
+        self.sync.pix += If(self.valid, acc.eq(block_sum))
+
+        # thumbnail: read the previous average of the block with its last
+        # pixel, replace it on the next cycle
+        thumbnail = Memory(dw, max_blocks)
+        thumbnail_wrport = thumbnail.get_port(write_capable=True, clock_domain="pix")
+        thumbnail_rdport = thumbnail.get_port(clock_domain="pix")
+        self.specials += thumbnail, thumbnail_wrport, thumbnail_rdport
+
+        final_r = Signal()
+        index_r = Signal(max=max_blocks)
+        col_r = Signal(flen(col))
+        block_row_r = Signal(max=max_rows+1)
+        average_r = Signal(dw)
+        self.comb += thumbnail_rdport.adr.eq(row_base + col)
+        self.sync.pix += [
+            final_r.eq(final),
+            index_r.eq(row_base + col),
+            col_r.eq(col),
+            block_row_r.eq(block_row),
+            average_r.eq(block_sum[2*bs:])
+        ]
+        previous = thumbnail_rdport.dat_r
+        diff = Signal(dw)
+        self.comb += [
+            If(average_r > previous,
+                diff.eq(average_r - previous)
+            ).Else(
+                diff.eq(previous - average_r)
+            ),
+            thumbnail_wrport.adr.eq(index_r),
+            thumbnail_wrport.dat_w.eq(average_r),
+            thumbnail_wrport.we.eq(final_r)
+        ]
+
+        # region SADs: running sums of the current row of regions (LUTRAM)
+        # written to the bank of the region table not exposed to the CPU,
+        # banks are swapped at start of frame
+        region_partial = Memory(region_sad_bits, 2**rcol_bits)
+        region_partial_wrport = region_partial.get_port(write_capable=True, clock_domain="pix")
+        region_partial_rdport = region_partial.get_port(async_read=True, clock_domain="pix")
+        regions = Memory(region_sad_bits, 2**(rcol_bits + rrow_bits + 1))
+        regions_wrport = regions.get_port(write_capable=True, clock_domain="pix")
+        regions_rdport = regions.get_port()
+        self.specials += region_partial, region_partial_wrport, region_partial_rdport, \
+            regions, regions_wrport, regions_rdport
+
+        bank = Signal()
+        self.sync.pix += If(new_frame, bank.eq(~bank))
+        rcol = Signal(rcol_bits)
+        rrow = Signal(rrow_bits)
+        region_sum = Signal(region_sad_bits)
+        self.comb += [
+            rcol.eq(col_r[rs:]),
+            rrow.eq(block_row_r[rs:]),
+            region_partial_rdport.adr.eq(rcol),
+            If((col_r[:rs] == 0) & (block_row_r[:rs] == 0),
+                region_sum.eq(diff)
+            ).Else(
+                region_sum.eq(region_partial_rdport.dat_r + diff)
+            ),
+            region_partial_wrport.adr.eq(rcol),
+            region_partial_wrport.dat_w.eq(region_sum),
+            region_partial_wrport.we.eq(final_r),
+            regions_wrport.adr.eq(Cat(rcol, rrow, ~bank)),
+            regions_wrport.dat_w.eq(region_sum),
+            regions_wrport.we.eq(final_r)
+        ]
+
+        bank_sys = Signal()
+        self.specials += MultiReg(bank, bank_sys)
+        self.comb += [
+            regions_rdport.adr.eq(Cat(self._region_adr.storage, bank_sys)),
+            self._region_sad.status.eq(regions_rdport.dat_r)
+        ]
+
+        # frame SAD (pix), latched at start of frame
+        sad = Signal(sad_bits)
+        last_sad = Signal(sad_bits)
+        last_columns = Signal(max=max_columns+1)
+        last_rows = Signal(max=max_rows+1)
+        self.sync.pix += \
+            If(new_frame,
+                last_sad.eq(sad),
+                last_columns.eq(columns),
+                last_rows.eq(block_row),
+                sad.eq(0)
+            ).Elif(final_r,
+                sad.eq(sad + diff)
+            )
+
+        # last_* are stable until the next frame
+        self.submodules.frame_done = PulseSynchronizer("pix", "sys")
+        self.comb += self.frame_done.i.eq(new_frame)
+        motion = Signal()
+        self.sync += [
+            motion.eq(0),
+            If(self.frame_done.o,
+                self._sad.status.eq(last_sad),
+                self._columns.status.eq(last_columns),
+                self._rows.status.eq(last_rows),
+                motion.eq(last_sad > self._threshold.storage)
+            )
+        ]
+        self.comb += self.ev.motion.trigger.eq(motion)
+
+
+def motion_scores(previous, frame, block_size=16, region_blocks=8):
+    """Reference model: SAD of the block averages of 2 luma frames, returns
+    the frame SAD and the region SADs (region rows, region columns)"""
+    import numpy as np
+    def thumbnail(f):
+        f = np.asarray(f, dtype=np.int64)
+        rows, columns = f.shape[0]//block_size, f.shape[1]//block_size
+        f = f[:rows*block_size, :columns*block_size]
+        f = f.reshape(rows, block_size, columns, block_size).sum(axis=(1, 3))
+        return f >> 2*log2_int(block_size)
+    diff = np.abs(thumbnail(frame) - thumbnail(previous))
+    rows, columns = diff.shape
+    regions = np.zeros(((rows + region_blocks - 1)//region_blocks,
+                        (columns + region_blocks - 1)//region_blocks), dtype=np.int64)
+    for row in range(rows):
+        for column in range(columns):
+            regions[row//region_blocks, column//region_blocks] += diff[row, column]
+    return int(diff.sum()), regions
+
+
+class _TB(Module):
+    def __init__(self, frames, block_size, region_blocks, threshold, hblank=5, vblank=40):
+        self.frames = frames
+        self.hblank = hblank
+        self.vblank = vblank
+        self.results = []
+
+        self.submodules.motion = RenameClockDomains(MotionDetector(block_size, region_blocks,
+                                                                   max_width=64, max_height=32),
+                                                    {"pix": "sys"})
+        self.comb += self.motion._threshold.storage.eq(threshold)
+        self.rcol_bits = bits_for((64//block_size + region_blocks - 1)//region_blocks - 1)
+        self.regions = 2**flen(self.motion._region_adr.storage)
+
+    def gen_simulation(self, selfp):
+        m = selfp.motion
+        for frame in self.frames + [None]:
+            m.vsync = 1
+            for i in range(self.vblank):
+                if i == 4:
+                    m.vsync = 0
+                yield
+            if frame is not None:
+                for line in frame:
+                    for x in range(len(line) + self.hblank):
+                        m.valid = int(x < len(line))
+                        if x < len(line):
+                            m.y = int(line[x])
+                        yield
+                    m.valid = 0
+            result = {"sad": m._sad.status, "columns": m._columns.status, "rows": m._rows.status,
+                      "motion": m.ev.motion.pending, "regions": {}}
+            for i in range(self.regions):
+                m._region_adr.storage = i
+                yield
+                yield
+                result["regions"][(i >> self.rcol_bits, i % 2**self.rcol_bits)] = m._region_sad.status
+            self.results.append(result)
+
+if __name__ == "__main__":
+    import numpy as np
+    from migen.sim.generic import run_simulation
+
+    block_size, region_blocks, threshold = 4, 2, 20
+    rng = np.random.RandomState(0)
+    # 5x3 blocks (incomplete blocks on the edges), regions: 3x2
+    frame0 = rng.randint(0, 256, (14, 22))
+    frame1 = frame0.copy()
+    frame2 = frame0.copy()
+    frame2[5:9, 9:16] = rng.randint(0, 256, (4, 7))
+    frames = [frame0, frame1, frame2]
+
+    tb = _TB(frames, block_size, region_blocks, threshold)
+    run_simulation(tb)
+    # results of a frame are available after the start of the next frame,
+    # the first frame is compared with an empty thumbnail
+    motion = False
+    for previous, frame, result in zip([np.zeros_like(frame0)] + frames, frames, tb.results[1:]):
+        sad, regions = motion_scores(previous, frame, block_size, region_blocks)
+        motion = motion or sad > threshold
+        print("sad {} columns {} rows {} motion {}".format(
+            result["sad"], result["columns"], result["rows"], result["motion"]))
+        print(regions)
+        assert result["sad"] == sad
+        assert (result["columns"], result["rows"]) == (22//block_size, 14//block_size)
+        assert bool(result["motion"]) == motion
+        for (row, column), value in np.ndenumerate(regions):
+            assert result["regions"][(row, column)] == value
@@ -0,0 +1,232 @@
+from migen.fhdl.std import *
+from migen.genlib.cdc import MultiReg
+from migen.bank.description import *
+
+
+class FrameStatistics(Module, AutoCSR):
+    """Per frame statistics of a YCbCr 4:4:4 pixel stream (pix clock domain)
+
+    For each frame: luma histogram (bins bins), count of active pixels and
+    min/max/sum of each component (mean = sum/count).
+
+    The histogram is accumulated in a work BRAM. At start of frame (vsync
+    rising edge, in vertical blanking), it is copied to the bank of the
+    result BRAM not exposed to the CPU while the work BRAM is cleared,
+    then banks are swapped: hist_adr/hist_dat read the last complete frame.
+    Other values are updated at the same time.
+    """
+    def __init__(self, bins=64, dw=8, count_bits=24):
+        self.valid = Signal()
+        self.vsync = Signal()
+        self.y = Signal(dw)
+        self.cb = Signal(dw)
+        self.cr = Signal(dw)
+
+        bin_bits = log2_int(bins)
+        self._bank = CSRStatus()
+        self._hist_adr = CSRStorage(bin_bits)
+        self._hist_dat = CSRStatus(count_bits)
+        self._count = CSRStatus(count_bits)
+        for c in ["y", "cb", "cr"]:
+            setattr(self, "_" + c + "_min", CSRStatus(dw, name=c + "_min"))
+            setattr(self, "_" + c + "_max", CSRStatus(dw, name=c + "_max"))
+            setattr(self, "_" + c + "_sum", CSRStatus(count_bits + dw, name=c + "_sum"))
+
+        ###
+
+        vsync_r = Signal()
+        new_frame = Signal()
+        self.comb += new_frame.eq(self.vsync & ~vsync_r)
+        self.sync.pix += vsync_r.eq(self.vsync)
+
+        # histogram: read-modify-write pipeline, forwarding the count written
+        # in the previous cycle (same bin on consecutive pixels)
+        work = Memory(count_bits, bins)
+        work_rdport = work.get_port(clock_domain="pix")
+        work_wrport = work.get_port(write_capable=True, clock_domain="pix")
+        result = Memory(count_bits, 2*bins)
+        result_wrport = result.get_port(write_capable=True, clock_domain="pix")
+        result_rdport = result.get_port()
+        self.specials += work, work_rdport, work_wrport, result, result_wrport, result_rdport
+
+        bin = Signal(bin_bits)
+        valid_r = Signal()
+        bin_r = Signal(bin_bits)
+        last_valid = Signal()
+        last_bin = Signal(bin_bits)
+        last_value = Signal(count_bits)
+        value = Signal(count_bits)
+        self.comb += [
+            bin.eq(self.y[dw-bin_bits:]),
+            If(last_valid & (last_bin == bin_r),
+                value.eq(last_value + 1)
+            ).Else(
+                value.eq(work_rdport.dat_r + 1)
+            )
+        ]
+        self.sync.pix += [
+            valid_r.eq(self.valid),
+            bin_r.eq(bin),
+            last_valid.eq(valid_r),
+            last_bin.eq(bin_r),
+            last_value.eq(value)
+        ]
+
+        # copy/clear sweep at start of frame
+        bank = Signal()
+        sweeping = Signal()
+        sweeping_r = Signal()
+        sweep_adr = Signal(bin_bits)
+        sweep_adr_r = Signal(bin_bits)
+        self.sync.pix += [
+            If(new_frame,
+                sweeping.eq(1),
+                sweep_adr.eq(0)
+            ).Elif(sweeping,
+                sweep_adr.eq(sweep_adr + 1),
+                If(sweep_adr == bins - 1,
+                    sweeping.eq(0)
+                )
+            ),
+            sweeping_r.eq(sweeping),
+            sweep_adr_r.eq(sweep_adr),
+            If(sweeping_r & ~sweeping,
+                bank.eq(~bank)
+            )
+        ]
+        self.comb += [
+            If(sweeping,
+                work_rdport.adr.eq(sweep_adr)
+            ).Else(
+                work_rdport.adr.eq(bin)
+            ),
+            If(sweeping_r,
+                work_wrport.adr.eq(sweep_adr_r),
+                work_wrport.dat_w.eq(0),
+                work_wrport.we.eq(1)
+            ).Else(
+                work_wrport.adr.eq(bin_r),
+                work_wrport.dat_w.eq(value),
+                work_wrport.we.eq(valid_r)
+            ),
+            result_wrport.adr.eq(Cat(sweep_adr_r, ~bank)),
+            result_wrport.dat_w.eq(work_rdport.dat_r),
+            result_wrport.we.eq(sweeping_r)
+        ]
+
+        # CPU access to the last complete frame
+        bank_sys = Signal()
+        self.specials += MultiReg(bank, bank_sys)
+        self.comb += [
+            result_rdport.adr.eq(Cat(self._hist_adr.storage, bank_sys)),
+            self._hist_dat.status.eq(result_rdport.dat_r),
+            self._bank.status.eq(bank_sys)
+        ]
+
+        # pixel count and min/max/sum of each component
+        count = Signal(count_bits)
+        last_count = Signal(count_bits)
+        self.sync.pix += \
+            If(new_frame,
+                last_count.eq(count),
+                count.eq(0)
+            ).Elif(self.valid,
+                count.eq(count + 1)
+            )
+        self.specials += MultiReg(last_count, self._count.status)
+        for c in ["y", "cb", "cr"]:
+            data = getattr(self, c)
+            minimum = Signal(dw, reset=2**dw-1)
+            maximum = Signal(dw)
+            total = Signal(count_bits + dw)
+            last_minimum = Signal(dw)
+            last_maximum = Signal(dw)
+            last_total = Signal(count_bits + dw)
+            self.sync.pix += \
+                If(new_frame,
+                    last_minimum.eq(minimum),
+                    last_maximum.eq(maximum),
+                    last_total.eq(total),
+                    minimum.eq(2**dw-1),
+                    maximum.eq(0),
+                    total.eq(0)
+                ).Elif(self.valid,
+                    If(data < minimum, minimum.eq(data)),
+                    If(data > maximum, maximum.eq(data)),
+                    total.eq(total + data)
+                )
+            self.specials += [
+                MultiReg(last_minimum, getattr(self, "_" + c + "_min").status),
+                MultiReg(last_maximum, getattr(self, "_" + c + "_max").status),
+                MultiReg(last_total, getattr(self, "_" + c + "_sum").status)
+            ]
+
+
+class _TB(Module):
+    def __init__(self, frames, width, hblank=3, vblank=80):
+        self.frames = frames
+        self.width = width
+        self.hblank = hblank
+        self.vblank = vblank
+        self.results = []
+
+        self.submodules.stats = RenameClockDomains(FrameStatistics(bins=16), {"pix": "sys"})
+
+    def gen_simulation(self, selfp):
+        s = selfp.stats
+        for frame in self.frames + [None]:
+            s.vsync = 1
+            for i in range(self.vblank):
+                if i == 4:
+                    s.vsync = 0
+                yield
+            if frame is not None:
+                for line in range(len(frame)//self.width):
+                    for x in range(self.width + self.hblank):
+                        s.valid = int(x < self.width)
+                        if x < self.width:
+                            s.y, s.cb, s.cr = frame[line*self.width + x]
+                        yield
+                    s.valid = 0
+            hist = []
+            for i in range(16):
+                s._hist_adr.storage = i
+                yield
+                yield
+                hist.append(s._hist_dat.status)
+            result = {"hist": hist, "count": s._count.status}
+            for c in ["y", "cb", "cr"]:
+                for v in ["min", "max", "sum"]:
+                    result[c + "_" + v] = getattr(s, "_" + c + "_" + v).status
+            self.results.append(result)
+
+if __name__ == "__main__":
+    import random
+    from migen.sim.generic import run_simulation
+
+    random.seed(0)
+    width = 8
+    frames = []
+    for n in range(3):
+        # runs of identical luma (consecutive pixels in the same bin)
+        frame = []
+        while len(frame) < width*6:
+            y = random.randrange(256)
+            frame += [(y, random.randrange(256), random.randrange(256))]*random.randint(1, 4)
+        frames.append(frame[:width*6])
+
+    tb = _TB(frames, width)
+    run_simulation(tb)
+    # results are available after the start of the next frame
+    for frame, result in zip(frames, tb.results[1:]):
+        hist = [0]*16
+        for y, cb, cr in frame:
+            hist[y >> 4] += 1
+        expected = {"hist": hist, "count": len(frame)}
+        for i, c in enumerate(["y", "cb", "cr"]):
+            values = [p[i] for p in frame]
+            expected[c + "_min"] = min(values)
+            expected[c + "_max"] = max(values)
+            expected[c + "_sum"] = sum(values)
+        print(result)
+        assert result == expected
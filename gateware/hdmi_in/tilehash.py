@@ -0,0 +1,280 @@
+from migen.fhdl.std import *
+from migen.genlib.misc import optree
+from migen.bank.description import *
+
+
+def _rotl(s, n):
+    return Cat(s[flen(s)-n:], s[:flen(s)-n]) if n else s
+
+
+class TileHash(Module, AutoCSR):
+    """Per tile hash of the DMA word stream (sys clock domain)
+
+    Frames (lines of tile_line_words bytes) are divided in tile_size x
+    tile_size pixel tiles (tiles on the right/bottom edges can be partial).
+    Each tile gets a 32 bit Fletcher-like checksum of its words (each word
+    is folded to 16 bits by XORing its pixels rotated by their position).
+
+    Hashes are stored in a table in raster order with a dirty bit (hash
+    different from the previous frame), read by tile_adr/tile_hash/tile_dirty.
+    tile_count/tile_dirty_count are the number of tiles and dirty tiles of
+    the last frame: an unchanged frame has no dirty tile.
+
+    The table holds the tiles of a max_width x max_height frame (e.g. 3600
+    tiles of 16x16 pixels at 720p, 8160 at 1080p).
+
+    start resets the position at start of frame, stb qualifies data,
+    remaining is the number of words of the frame left (including data) and
+    done signals the end of the frame.
+    """
+    def __init__(self, dw, tile_size=64, max_width=2048, max_height=1152):
+        assert (tile_size*16) % dw == 0
+        tile_words = tile_size*16//dw
+        max_columns = (max_width + tile_size - 1)//tile_size
+        max_rows = (max_height + tile_size - 1)//tile_size
+        max_tiles = max_columns*max_rows
+        line_words_bits = bits_for(max_width*16//dw)
+
+        self.start = Signal()
+        self.stb = Signal()
+        self.data = Signal(dw)
+        self.remaining = Signal(32)
+        self.done = Signal()
+
+        alignment_bits = bits_for(dw//8) - 1
+        self._tile_line_words = CSRStorage(line_words_bits + alignment_bits, alignment_bits=alignment_bits)
+        self._tile_adr = CSRStorage(bits_for(max_tiles - 1))
+        self._tile_hash = CSRStatus(32)
+        self._tile_dirty = CSRStatus()
+        self._tile_count = CSRStatus(bits_for(max_tiles))
+        self._tile_dirty_count = CSRStatus(bits_for(max_tiles))
+
+        ###
+
+        line_words = self._tile_line_words.storage
+
+        # position
+        line_word = Signal(line_words_bits)
+        word_in_tile = Signal(max=max(tile_words, 2))
+        tile_col = Signal(max=max_columns)
+        line_in_tile = Signal(max=tile_size)
+        row_base = Signal(max=max_tiles+max_columns)
+
+        end_of_line = Signal()
+        end_of_segment = Signal()
+        first_line = Signal()
+        last_line = Signal()
+        self.comb += [
+            end_of_line.eq(line_word == line_words - 1),
+            end_of_segment.eq((word_in_tile == tile_words - 1) | end_of_line),
+            first_line.eq(line_in_tile == 0),
+            last_line.eq((line_in_tile == tile_size - 1) |
+                         (self.remaining + line_word <= line_words))
+        ]
+        self.sync += \
+            If(self.start,
+                line_word.eq(0),
+                word_in_tile.eq(0),
+                tile_col.eq(0),
+                line_in_tile.eq(0),
+                row_base.eq(0)
+            ).Elif(self.stb,
+                If(end_of_segment,
+                    word_in_tile.eq(0),
+                    tile_col.eq(tile_col + 1)
+                ).Else(
+                    word_in_tile.eq(word_in_tile + 1)
+                ),
+                If(end_of_line,
+                    line_word.eq(0),
+                    tile_col.eq(0),
+                    If(last_line,
+                        line_in_tile.eq(0),
+                        row_base.eq(row_base + tile_col + 1)
+                    ).Else(
+                        line_in_tile.eq(line_in_tile + 1)
+                    )
+                ).Else(
+                    line_word.eq(line_word + 1)
+                )
+            )
+
+        # checksum, partial sums of the tiles of the current row are kept in
+        # a LUTRAM between lines
+        partial = Memory(32, max_columns)
+        partial_wrport = partial.get_port(write_capable=True)
+        partial_rdport = partial.get_port(async_read=True)
+        self.specials += partial, partial_wrport, partial_rdport
+
+        fold = Signal(16)
+        self.comb += fold.eq(optree("^", [_rotl(self.data[16*i:16*(i+1)], i % 16)
+                                          for i in range(dw//16)]))
+        acc = Signal(32)
+        acc_in = Signal(32)
+        s1 = Signal(16)
+        s2 = Signal(16)
+        self.comb += [
+            partial_rdport.adr.eq(tile_col),
+            If(word_in_tile == 0,
+                If(first_line,
+                    acc_in.eq(0)
+                ).Else(
+                    acc_in.eq(partial_rdport.dat_r)
+                )
+            ).Else(
+                acc_in.eq(acc)
+            ),
+            s1.eq(acc_in[:16] + fold),
+            s2.eq(acc_in[16:] + s1),
+            partial_wrport.adr.eq(tile_col),
+            partial_wrport.dat_w.eq(Cat(s1, s2)),
+            partial_wrport.we.eq(self.stb & end_of_segment & ~last_line)
+        ]
+        self.sync += If(self.stb, acc.eq(Cat(s1, s2)))
+
+        # hash table (with dirty bits) and copy of the hashes to compare
+        # the new hash of a tile with its previous one
+        table = Memory(33, max_tiles)
+        table_wrport = table.get_port(write_capable=True)
+        table_rdport = table.get_port()
+        previous = Memory(32, max_tiles)
+        previous_wrport = previous.get_port(write_capable=True)
+        previous_rdport = previous.get_port()
+        self.specials += table, table_wrport, table_rdport, \
+            previous, previous_wrport, previous_rdport
+
+        index = Signal(max=max_tiles+2*max_columns)
+        final = Signal()
+        final_r = Signal()
+        index_r = Signal(max=max_tiles)
+        hash_r = Signal(32)
+        dirty = Signal()
+        self.comb += [
+            index.eq(row_base + tile_col),
+            final.eq(self.stb & end_of_segment & last_line & (index < max_tiles)),
+            previous_rdport.adr.eq(index),
+            dirty.eq(previous_rdport.dat_r != hash_r),
+            previous_wrport.adr.eq(index_r),
+            previous_wrport.dat_w.eq(hash_r),
+            previous_wrport.we.eq(final_r),
+            table_wrport.adr.eq(index_r),
+            table_wrport.dat_w.eq(Cat(hash_r, dirty)),
+            table_wrport.we.eq(final_r)
+        ]
+        self.sync += [
+            final_r.eq(final),
+            index_r.eq(index),
+            hash_r.eq(Cat(s1, s2))
+        ]
+
+        self.comb += [
+            table_rdport.adr.eq(self._tile_adr.storage),
+            self._tile_hash.status.eq(table_rdport.dat_r[:32]),
+            self._tile_dirty.status.eq(table_rdport.dat_r[32])
+        ]
+
+        # frame statistics
+        tile_count = Signal(bits_for(max_tiles))
+        dirty_count = Signal(bits_for(max_tiles))
+        self.sync += [
+            If(self.start,
+                tile_count.eq(0),
+                dirty_count.eq(0)
+            ).Elif(final_r,
+                tile_count.eq(tile_count + 1),
+                If(dirty,
+                    dirty_count.eq(dirty_count + 1)
+                )
+            ),
+            If(self.done,
+                self._tile_count.status.eq(tile_count),
+                self._tile_dirty_count.status.eq(dirty_count)
+            )
+        ]
+
+
+def tile_hashes(words, line_words, dw, tile_size=64):
+    """Reference model: hashes of the tiles of a frame of words (raster order)"""
+    tile_words = tile_size*16//dw
+    lines = [words[i:i+line_words] for i in range(0, len(words), line_words)]
+    columns = (line_words + tile_words - 1)//tile_words
+    hashes = []
+    for row in range(0, len(lines), tile_size):
+        for col in range(columns):
+            s1 = s2 = 0
+            for line in lines[row:row+tile_size]:
+                for word in line[col*tile_words:(col+1)*tile_words]:
+                    fold = 0
+                    for i in range(dw//16):
+                        p = (word >> 16*i) & 0xffff
+                        r = i % 16
+                        fold ^= ((p << r) | (p >> (16 - r))) & 0xffff
+                    s1 = (s1 + fold) & 0xffff
+                    s2 = (s2 + s1) & 0xffff
+            hashes.append(s1 | (s2 << 16))
+    return hashes
+
+
+class _TB(Module):
+    def __init__(self, frames, line_words, dw, tile_size):
+        self.frames = frames
+        self.line_words = line_words
+        self.dw = dw
+        self.tile_size = tile_size
+        self.results = []
+
+        self.submodules.tilehash = TileHash(dw, tile_size, max_width=16, max_height=12)
+        self.comb += self.tilehash._tile_line_words.storage.eq(line_words)
+
+    def gen_simulation(self, selfp):
+        t = selfp.tilehash
+        for words in self.frames:
+            t.start = 1
+            yield
+            t.start = 0
+            for n, word in enumerate(words):
+                t.stb = 1
+                t.data = word
+                t.remaining = len(words) - n
+                yield
+                # idle cycle every 3 words
+                if n % 3 == 2:
+                    t.stb = 0
+                    yield
+            t.stb = 0
+            for i in range(4):
+                yield
+            t.done = 1
+            yield
+            t.done = 0
+            yield
+            hashes = []
+            for i in range(len(tile_hashes(words, self.line_words, self.dw, self.tile_size))):
+                t._tile_adr.storage = i
+                yield
+                yield
+                hashes.append((t._tile_hash.status, t._tile_dirty.status))
+            self.results.append((hashes, t._tile_count.status, t._tile_dirty_count.status))
+
+if __name__ == "__main__":
+    import random
+    from migen.sim.generic import run_simulation
+
+    dw, tile_size, line_words, height = 32, 4, 7, 10
+    random.seed(0)
+    frame0 = [random.getrandbits(dw) for i in range(line_words*height)]
+    frame1 = list(frame0)
+    frame1[3*line_words + 5] ^= 1  # tile row 0, column 2
+    frames = [frame0, frame0, frame1]
+
+    tb = _TB(frames, line_words, dw, tile_size)
+    run_simulation(tb)
+    previous = None
+    for words, (hashes, tile_count, dirty_count) in zip(frames, tb.results):
+        expected = tile_hashes(words, line_words, dw, tile_size)
+        dirty = [previous is None or h != p for h, p in zip(expected, previous or expected)]
+        print("tiles {} dirty {}: {}".format(tile_count, dirty_count, hashes))
+        assert [h for h, d in hashes] == expected
+        assert [bool(d) for h, d in hashes] == dirty
+        assert tile_count == len(expected) and dirty_count == sum(dirty)
+        previous = expected
@@ -9,6 +9,9 @@ from gateware.hdmi_in.common import control_tokens
 class WER(Module, AutoCSR):
     def __init__(self, period_bits=24):
         self.data = Signal(10)
+        # sys domain result, for gateware users
+        self.value = Signal(period_bits)
+        self.updated = Signal()
         self._update = CSR()
         self._value = CSRStatus(period_bits)
 
@@ -51,10 +54,12 @@ class WER(Module, AutoCSR):
         ]
 
         # sync to system clock domain
-        wer_counter_sys = Signal(period_bits)
         self.submodules.ps_counter = PulseSynchronizer("pix", "sys")
-        self.comb += self.ps_counter.i.eq(wer_counter_r_updated)
-        self.sync += If(self.ps_counter.o, wer_counter_sys.eq(wer_counter_r))
+        self.comb += [
+            self.ps_counter.i.eq(wer_counter_r_updated),
+            self.updated.eq(self.ps_counter.o)
+        ]
+        self.sync += If(self.ps_counter.o, self.value.eq(wer_counter_r))
 
         # register interface
-        self.sync += If(self._update.re, self._value.status.eq(wer_counter_sys))
+        self.sync += If(self._update.re, self._value.status.eq(self.value))
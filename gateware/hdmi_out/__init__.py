@@ -5,12 +5,14 @@ from migen.bank.description import AutoCSR
 from migen.actorlib import structuring, misc
 
 from misoclib.mem.sdram.frontend import dma_lasmi
+from gateware.csc import colormatrix
 from gateware.hdmi_out.format import bpp, pixel_layout, FrameInitiator, VTG
 from gateware.hdmi_out.phy import Driver
 
 
 class HDMIOut(Module, AutoCSR):
-    def __init__(self, pads, lasmim, external_clocking=None):
+    def __init__(self, pads, lasmim, external_clocking=None, procamp=False,
+                 pipeline_depth=colormatrix.datapath_latency, chroma_upsampling="replicate"):
         pack_factor = lasmim.dw//bpp
 
         g = DataFlowGraph()
@@ -24,7 +26,8 @@ class HDMIOut(Module, AutoCSR):
 
         cast = structuring.Cast(lasmim.dw, pixel_layout(pack_factor), reverse_to=True)
         vtg = VTG(pack_factor)
-        self.driver = Driver(pack_factor, pads, external_clocking)
+        self.driver = Driver(pack_factor, pads, external_clocking, procamp, pipeline_depth,
+                             chroma_upsampling)
 
         g.add_connection(self.fi, vtg, source_subr=self.fi.timing_subr, sink_ep="timing")
         g.add_connection(dma_out, cast)
@@ -160,65 +160,56 @@ class PHY(Module):
 
 
 class _EncoderTB(Module):
-    def __init__(self, inputs):
-        self.outs = []
-        self._iter_inputs = iter(inputs)
+    def __init__(self, d, c, de):
+        self.d, self.c, self.de = d, c, de
+        self.outs = [[] for i in range(3)]
         self._end_cycle = None
-        self.submodules.dut = Encoder()
-        self.comb += self.dut.de.eq(1)
+        for i in range(3):
+            setattr(self.submodules, "encoder" + str(i), Encoder())
 
     def do_simulation(self, selfp):
+        cycle = selfp.simulator.cycle_counter
+        encoders = [getattr(selfp, "encoder" + str(i)) for i in range(3)]
         if self._end_cycle is None:
-            try:
-                nv = next(self._iter_inputs)
-            except StopIteration:
-                self._end_cycle = selfp.simulator.cycle_counter + 4
+            if cycle < len(self.de):
+                for i, encoder in enumerate(encoders):
+                    encoder.d = int(self.d[i][cycle])
+                    encoder.c = int(self.c[i][cycle])
+                    encoder.de = int(self.de[cycle])
             else:
-                selfp.dut.d = nv
-        if selfp.simulator.cycle_counter == self._end_cycle:
+                self._end_cycle = cycle + 4
+        if cycle == self._end_cycle:
             raise StopSimulation
-        if selfp.simulator.cycle_counter > 4:
-            self.outs.append(selfp.dut.out)
+        if cycle > 4:
+            for i, encoder in enumerate(encoders):
+                self.outs[i].append(encoder.out)
 
 
-def _bit(i, n):
-    return (i >> n) & 1
-
-
-def _decode_tmds(b):
-    try:
-        c = control_tokens.index(b)
-        de = False
-    except ValueError:
-        c = 0
-        de = True
-    vsync = bool(c & 2)
-    hsync = bool(c & 1)
-
-    value = _bit(b, 0) ^ _bit(b, 9)
-    for i in range(1, 8):
-        value |= (_bit(b, i) ^ _bit(b, i-1) ^ (~_bit(b, 8) & 1)) << i
-
-    return de, hsync, vsync, value
-
 if __name__ == "__main__":
+    import argparse
+    import numpy as np
     from migen.sim.generic import run_simulation
-    from random import Random
-
-    rng = Random(788)
-    test_list = [rng.randrange(256) for i in range(500)]
-    tb = _EncoderTB(test_list)
+    from gateware import tmds
+
+    parser = argparse.ArgumentParser(description="Encoder vs TMDS model on a frame")
+    parser.add_argument("--timing", default="720p", help="video timing ({})".format(", ".join(tmds.timings)))
+    parser.add_argument("--lines", type=int, default=0, help="number of lines to simulate (0: whole frame)")
+    args = parser.parse_args()
+
+    h_active, hfp, hs, hbp, v_active, vfp, vs, vbp = tmds.timings[args.timing]
+    h_total = h_active + hfp + hs + hbp
+    v_total = v_active + vfp + vs + vbp
+    frame = tmds.test_frame(h_active, v_active)
+    d, c, de = tmds.video_stream(frame, args.timing)
+    length = (args.lines or v_total)*h_total
+    d, c, de = d[:, :length], c[:, :length], de[:length]
+
+    tb = _EncoderTB(d, c, de)
     run_simulation(tb)
 
-    check = [_decode_tmds(out)[3] for out in tb.outs]
-    assert(check == test_list)
-
-    nb0 = 0
-    nb1 = 0
-    for out in tb.outs:
-        for i in range(10):
-            if _bit(out, i):
-                nb1 += 1
-            else:
-                nb0 += 1
-    print("0/1: {}/{} ({:.2f})".format(nb0, nb1, nb0/nb1))
+    for i in range(3):
+        symbols, cnt = tmds.encode(d[i], c[i], de)
+        outs = np.array(tb.outs[i])
+        assert np.array_equal(outs, symbols)
+        stats = tmds.line_statistics(outs, cnt, de, h_total)
+        tmds.print_statistics("channel {}".format(i), stats)
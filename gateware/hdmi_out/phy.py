@@ -10,9 +10,11 @@ from migen.actorlib import structuring
 from gateware.hdmi_out.format import bpc_phy, phy_layout, pixel_layout_s
 from gateware.hdmi_out import hdmi
 
-from gateware.csc.ycbcr2rgb import YCbCr2RGB
+from gateware.csc.common import ycbcr444_layout, rgb_layout
+from gateware.csc import colormatrix
+from gateware.csc.colormatrix import ColorMatrix, ColorMatrixControl, color_matrix_coefs
 from gateware.csc.ycbcr422to444 import YCbCr422to444
-from gateware.csc.ymodulator import YModulator
+from gateware.csc.procamp import ProcAmp, ProcAmpControl
 from gateware.hdmi_out.crc import CRC32Checker
 
 
@@ -203,7 +205,8 @@ class _Clocking(Module, AutoCSR):
 
 
 class Driver(Module, AutoCSR):
-    def __init__(self, pack_factor, pads, external_clocking):
+    def __init__(self, pack_factor, pads, external_clocking, procamp=False,
+                 pipeline_depth=colormatrix.datapath_latency, chroma_upsampling="replicate"):
         fifo = _FIFO(pack_factor)
         self.submodules += fifo
         self.phy = fifo.phy
@@ -246,24 +249,41 @@ class Driver(Module, AutoCSR):
             )
         ]
 
-        chroma_upsampler = YCbCr422to444()
+        chroma_upsampler = YCbCr422to444(chroma_upsampling=chroma_upsampling)
         self.submodules += RenameClockDomains(chroma_upsampler, "pix")
 
         self.comb += Record.connect(self.crc_checker.source, chroma_upsampler.sink)
 
-        ycbcr2rgb = YCbCr2RGB()
+        ycbcr2rgb = ColorMatrix(ycbcr444_layout(8), rgb_layout(8), pipeline_depth=pipeline_depth)
         self.submodules += RenameClockDomains(ycbcr2rgb, "pix")
+        self.submodules.csc = ColorMatrixControl(color_matrix_coefs("legacy", "ycbcr2rgb"))
+        vsync_r = Signal()
+        self.sync.pix += vsync_r.eq(fifo.pix_vsync)
         self.comb += [
-            Record.connect(chroma_upsampler.source, ycbcr2rgb.sink),
-            ycbcr2rgb.source.ack.eq(1)
+            ycbcr2rgb.source.ack.eq(1),
+            ycbcr2rgb.coefs.eq(self.csc.coefs),
+            self.csc.latch.eq(fifo.pix_vsync & ~vsync_r)
         ]
+        latency = chroma_upsampler.latency + ycbcr2rgb.latency
+        if procamp:
+            procamp = ProcAmp()
+            self.submodules += RenameClockDomains(procamp, "pix")
+            self.submodules.procamp = ProcAmpControl()
+            self.comb += [
+                Record.connect(chroma_upsampler.source, procamp.sink),
+                Record.connect(procamp.source, ycbcr2rgb.sink),
+                Record.connect(self.procamp.control, procamp.control),
+                self.procamp.latch.eq(fifo.pix_vsync & ~vsync_r)
+            ]
+            latency += procamp.latency
+        else:
+            self.comb += Record.connect(chroma_upsampler.source, ycbcr2rgb.sink)
 
         # XXX need clean up
         de = fifo.pix_de
         hsync = fifo.pix_hsync
         vsync = fifo.pix_vsync
-        for i in range(chroma_upsampler.latency +
-        	           ycbcr2rgb.latency):
+        for i in range(latency):
             next_de = Signal()
             next_vsync = Signal()
             next_hsync = Signal()
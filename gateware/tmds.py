@@ -0,0 +1,196 @@
+# tmds: vectorized TMDS (DVI/HDMI video period) reference model
+
+import numpy as np
+
+control_tokens = [0b1101010100, 0b0010101011, 0b0101010100, 0b1010101011]
+
+# h_active, h_front_porch, h_sync, h_back_porch, v_active, v_front_porch, v_sync, v_back_porch
+timings = {
+    "640x480":  (640, 16, 96, 48, 480, 10, 2, 33),
+    "720p":     (1280, 110, 40, 220, 720, 5, 5, 20),
+    "1080p":    (1920, 88, 44, 148, 1080, 4, 5, 36)
+}
+
+
+def _popcount(x, n):
+    x = np.asarray(x, dtype=np.int64)
+    return sum((x >> i) & 1 for i in range(n))
+
+
+def _bits(x, n):
+    return [(x >> i) & 1 for i in range(n)]
+
+
+def test_frame(width, height, seed=0):
+    """RGB frame (height, width, 3): color bars, ramps, flat areas and noise"""
+    rng = np.random.RandomState(seed)
+    frame = np.zeros((height, width, 3), dtype=np.int64)
+    q = height//4
+    bars = [(255, 255, 255), (255, 255, 0), (0, 255, 255), (0, 255, 0),
+            (255, 0, 255), (255, 0, 0), (0, 0, 255), (0, 0, 0)]
+    x = np.arange(width)
+    frame[:q] = np.array(bars)[x*len(bars)//width]
+    frame[q:2*q] = (x*256//width)[:, None]
+    frame[2*q:3*q] = [16, 128, 235]
+    frame[3*q:] = rng.randint(0, 256, (height - 3*q, width, 3))
+    return frame
+
+
+def video_stream(frame, timing="720p"):
+    """Serialize a (height, width, 3) RGB frame with blanking
+
+    Returns d (3, n) (blue, green, red channels), c (3, n) and de (n), as
+    driven by hdmi_out PHY: hsync/vsync (active high) on channel 0.
+    """
+    ha, hfp, hs, hbp, va, vfp, vs, vbp = timings[timing] if isinstance(timing, str) else timing
+    height, width = frame.shape[:2]
+    assert (width, height) == (ha, va)
+    h_total = ha + hfp + hs + hbp
+    v_total = va + vfp + vs + vbp
+
+    h = np.arange(h_total)
+    v = np.arange(v_total)
+    de = (v[:, None] < va) & (h[None, :] < ha)
+    hsync = (h >= ha + hfp) & (h < ha + hfp + hs)
+    vsync = (v >= va + vfp) & (v < va + vfp + vs)
+
+    d = np.zeros((3, v_total, h_total), dtype=np.int64)
+    for i, plane in enumerate([2, 1, 0]):
+        d[i, :va, :ha] = frame[:, :, plane]
+    c = np.zeros((3, v_total, h_total), dtype=np.int64)
+    c[0] = hsync[None, :] | (vsync[:, None] << 1)
+    c[:, de] = 0
+    return d.reshape(3, -1), c.reshape(3, -1), de.reshape(-1)
+
+
+def encode(d, c, de):
+    """Encode a channel: same symbols as hdmi_out Encoder
+
+    Returns (symbols, cnt): cnt is the running disparity after each symbol
+    (reset during control periods). Data periods are encoded in parallel, one
+    numpy operation per pixel position.
+    """
+    d = np.asarray(d, dtype=np.int64)
+    c = np.asarray(c, dtype=np.int64)
+    de = np.asarray(de, dtype=bool)
+
+    # 8b -> 9b transition minimized word
+    n1d = _popcount(d, 8)
+    xnor = (n1d > 4) | ((n1d == 4) & ((d & 1) == 0))
+    q = d & 1
+    q_m = q.copy()
+    for i in range(1, 8):
+        q = q ^ ((d >> i) & 1) ^ xnor
+        q_m |= q << i
+    q_m8 = (~xnor) & 1
+    n1 = _popcount(q_m, 8)
+    n0 = 8 - n1
+
+    symbols = np.array(control_tokens, dtype=np.int64)[c & 3]
+    cnt = np.zeros(len(d), dtype=np.int64)
+
+    # data periods, disparity starts at 0 after a control period
+    de_i = de.astype(np.int8)
+    starts = np.flatnonzero(np.diff(np.r_[0, de_i]) == 1)
+    ends = np.flatnonzero(np.diff(np.r_[de_i, 0]) == -1) + 1
+    if len(starts) == 0:
+        return symbols, cnt
+    lengths = ends - starts
+    running = np.zeros(len(starts), dtype=np.int64)
+    for j in range(lengths.max()):
+        sel = lengths > j
+        i = starts[sel] + j
+        r = running[sel]
+        qm, qm8, n1_, n0_ = q_m[i], q_m8[i], n1[i], n0[i]
+
+        balanced = (r == 0) | (n1_ == n0_)
+        invert = np.where(balanced, qm8 == 0, ((r > 0) & (n1_ > n0_)) | ((r < 0) & (n0_ > n1_)))
+        word = np.where(invert, qm ^ 0xff, qm) | (qm8 << 8) | (invert << 9)
+        r = np.where(balanced,
+                     r + np.where(qm8 == 1, n1_ - n0_, n0_ - n1_),
+                     np.where(invert,
+                              r + 2*qm8 + n0_ - n1_,
+                              r - 2*(1 - qm8) + n1_ - n0_))
+        symbols[i] = word
+        cnt[i] = r
+        running[sel] = r
+    return symbols, cnt
+
+
+def decode(symbols):
+    """Decode symbols: returns (d, c, de) as hdmi_in Decoding
+
+    c is only valid on control symbols, d on data symbols.
+    """
+    s = np.asarray(symbols, dtype=np.int64)
+    c = np.zeros(len(s), dtype=np.int64)
+    de = np.ones(len(s), dtype=bool)
+    for i, t in enumerate(control_tokens):
+        control = s == t
+        c[control] = i
+        de &= ~control
+    b = _bits(s, 10)
+    d = b[0] ^ b[9]
+    for i in range(1, 8):
+        d |= (b[i] ^ b[i-1] ^ (1 - b[8])) << i
+    return d, c, de
+
+
+def serialize(symbols, slip=0):
+    """Regroup the serial (LSB first) bit stream in 10 bit words delayed by slip bits"""
+    s = np.asarray(symbols, dtype=np.int64)
+    bits = np.stack(_bits(s, 10), axis=1).reshape(-1)
+    bits = np.r_[np.zeros(10 - slip if slip else 0, dtype=np.int64), bits]
+    bits = bits[:len(bits)//10*10].reshape(-1, 10)
+    return (bits << np.arange(10)).sum(axis=1)
+
+
+def disparity(symbols):
+    """Disparity (number of ones - number of zeros) of each symbol"""
+    return 2*_popcount(symbols, 10) - 10
+
+
+def transitions(symbols):
+    """Number of transitions inside each symbol"""
+    s = np.asarray(symbols, dtype=np.int64)
+    return _popcount((s ^ (s >> 1)) & 0x1ff, 9)
+
+
+def line_statistics(symbols, cnt, de, line_length):
+    """Per line statistics of an encoded channel
+
+    Returns a dict of arrays (one value per line):
+    - cnt_min/cnt_max: bounds of the encoder running disparity.
+    - disparity_min/disparity_max: bounds of the running disparity of the
+      serial stream since the start of the line.
+    - transitions_data: mean transitions per data symbol.
+    - transitions_data_max: max transitions of a data symbol.
+    - transitions_control_min: min transitions of a control symbol.
+    """
+    s = np.asarray(symbols, dtype=np.int64).reshape(-1, line_length)
+    cnt = np.asarray(cnt, dtype=np.int64).reshape(-1, line_length)
+    de = np.asarray(de, dtype=bool).reshape(-1, line_length)
+    running = np.cumsum(disparity(s), axis=1)
+    t = transitions(s)
+    n_data = de.sum(axis=1)
+    return {
+        "cnt_min":                 np.where(de, cnt, 0).min(axis=1),
+        "cnt_max":                 np.where(de, cnt, 0).max(axis=1),
+        "disparity_min":           running.min(axis=1),
+        "disparity_max":           running.max(axis=1),
+        "transitions_data":        np.where(de, t, 0).sum(axis=1)/np.maximum(n_data, 1),
+        "transitions_data_max":    np.where(de, t, 0).max(axis=1),
+        "transitions_control_min": np.where(de, 10, t).min(axis=1)
+    }
+
+
+def print_statistics(name, stats):
+    print("{}: cnt [{}, {}], line disparity [{}, {}], "
+          "transitions/data symbol {:.2f} (max {}), min transitions/control symbol {}".format(
+        name, stats["cnt_min"].min(), stats["cnt_max"].max(),
+        stats["disparity_min"].min(), stats["disparity_max"].max(),
+        stats["transitions_data"].mean(), stats["transitions_data_max"].max(),
+        stats["transitions_control_min"].min()))
+    worst = np.argmax(np.maximum(stats["disparity_max"], -stats["disparity_min"]))
+    print("  worst line {}: disparity [{}, {}]".format(
+        worst, stats["disparity_min"][worst], stats["disparity_max"][worst]))
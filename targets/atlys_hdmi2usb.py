@@ -25,11 +25,15 @@ class VideomixerSoC(BaseSoC):
 
     def __init__(self, platform, **kwargs):
         BaseSoC.__init__(self, platform, **kwargs)
+        # one DMA slot per firmware framebuffer: firmware uses the DMA ring mode
+        n_dma_slots = 4
         self.submodules.hdmi_in0 = HDMIIn(platform.request("hdmi_in", 0),
                                           self.sdram.crossbar.get_master(),
+                                          n_dma_slots=n_dma_slots,
                                           fifo_depth=1024)
         self.submodules.hdmi_in1 = HDMIIn(platform.request("hdmi_in", 1),
                                           self.sdram.crossbar.get_master(),
+                                          n_dma_slots=n_dma_slots,
                                           fifo_depth=1024)
         self.submodules.hdmi_out0 = HDMIOut(platform.request("hdmi_out", 0),
                                             self.sdram.crossbar.get_master())
@@ -53,6 +57,8 @@ TIMESPEC "TSise_sucks10" = FROM "GRPsys_clk" TO "GRPpix1_clk" TIG;
 )
         for k, v in platform.hdmi_infos.items():
             self.add_constant(k, v)
+        self.add_constant("HDMI_IN0_DMA_SLOTS", n_dma_slots)
+        self.add_constant("HDMI_IN1_DMA_SLOTS", n_dma_slots)
 
 class HDMI2USBSoC(VideomixerSoC):
     csr_map = {
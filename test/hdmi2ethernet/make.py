@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
 import argparse
 import importlib
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
 
 
 def _get_args():
@@ -1,10 +1,13 @@
-import copy
+import os
 import png
 
+from gateware.compare import compare_planes, print_comparison
+
 SDRAM_BASE = 0x40000000
 LINE_SIZE = 1280*3
 DUMP_SIZE = 1280*720*4
 WORDS_PER_PACKET = 128
+REFERENCE = "dump_reference.png"
 
 def chunks(l, n):
     for i in xrange(0, len(l), n):
@@ -31,5 +34,16 @@ def main(wb):
     dump = [dump[x:x+LINE_SIZE] for x in range(0, len(dump), LINE_SIZE)]
     print("dumping to png file...")
     png.from_array(dump, "RGB").save("dump.png")
+    if os.path.exists(REFERENCE):
+        print("comparing to {}...".format(REFERENCE))
+        width, height, rows, info = png.Reader(REFERENCE).asRGB8()
+        assert info["planes"] == 3 and info["bitdepth"] == 8, "reference is not RGB8"
+        assert (width, height) == (LINE_SIZE//3, len(dump)), \
+            "reference is {}x{}, dump is {}x{}".format(width, height, LINE_SIZE//3, len(dump))
+        ref = [v for row in rows for v in row]
+        res = [v for line in dump for v in line]
+        print_comparison(compare_planes([ref[i::3] for i in range(3)],
+                                        [res[i::3] for i in range(3)],
+                                        width, ["r", "g", "b"]))
     # # #
     wb.close()
@@ -0,0 +1,66 @@
+import time
+
+HDMI_IN = 0
+TAPS = 16
+THRESHOLD = 0
+PLOT = "eyescan.png"
+
+def reg(regs, channel, name):
+    return getattr(regs, "hdmi_in{}_data{}_cap_scan_{}".format(HDMI_IN, channel, name))
+
+def read_table(regs, channel):
+    table = []
+    for i in range(2*TAPS + 1):
+        reg(regs, channel, "table_adr").write(i)
+        table.append(reg(regs, channel, "table_dat").read())
+    return table
+
+def print_table(tables, centres):
+    print("  tap " + "".join("{:>10s}".format("data" + str(c)) for c in range(3)))
+    for i in range(2*TAPS + 1):
+        line = "{:5d} ".format(i - TAPS)
+        for table, centre in zip(tables, centres):
+            line += "{:>10s}".format(("*" if i - TAPS == centre else "") + str(table[i]))
+        print(line)
+
+def plot(tables, centres):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return
+    taps = range(-TAPS, TAPS + 1)
+    for channel, (table, centre) in enumerate(zip(tables, centres)):
+        line, = plt.semilogy(taps, [max(wer, 0.5) for wer in table], marker="o", label="data" + str(channel))
+        plt.axvline(centre, color=line.get_color(), linestyle="--")
+    plt.xlabel("tap (relative to start)")
+    plt.ylabel("WER (errors/period)")
+    plt.legend()
+    plt.savefig(PLOT)
+    print("plot saved to {}".format(PLOT))
+
+def main(wb):
+    wb.open()
+    regs = wb.regs
+    # # #
+    print("scanning hdmi_in{} ({} taps)...".format(HDMI_IN, 2*TAPS + 1))
+    for channel in range(3):
+        reg(regs, channel, "taps").write(TAPS)
+        reg(regs, channel, "threshold").write(THRESHOLD)
+    for channel in range(3):
+        reg(regs, channel, "start").write(1)
+    while any(reg(regs, channel, "busy").read() for channel in range(3)):
+        time.sleep(0.5)
+    tables = [read_table(regs, channel) for channel in range(3)]
+    centres = []
+    for channel in range(3):
+        centre = reg(regs, channel, "centre").read()
+        centres.append(centre - 256 if centre & 0x80 else centre)
+    print_table(tables, centres)
+    for channel in range(3):
+        print("data{}: eye width {} taps, parked at {}".format(
+            channel, reg(regs, channel, "width").read(), centres[channel]))
+    plot(tables, centres)
+    # # #
+    wb.close()
@@ -1,4 +1,4 @@
-import copy
+from gateware.compare import check
 
 SDRAM_BASE = 0x40000000
 TEST_SIZE  = 1024*1024
@@ -11,28 +11,6 @@ def seed_to_data(seed, random=True):
         return seed
 
 
-def check(p1, p2):
-    p1 = copy.deepcopy(p1)
-    p2 = copy.deepcopy(p2)
-    if isinstance(p1, int):
-        return 0, 1, int(p1 != p2)
-    else:
-        if len(p1) >= len(p2):
-            ref, res = p1, p2
-        else:
-            ref, res = p2, p1
-        shift = 0
-        while((ref[0] != res[0]) and (len(res) > 1)):
-            res.pop(0)
-            shift += 1
-        length = min(len(ref), len(res))
-        errors = 0
-        for i in range(length):
-            if ref.pop(0) != res.pop(0):
-                errors += 1
-        return shift, length, errors
-
-
 def generate_packet(seed, length):
     r = []
     for i in range(length):
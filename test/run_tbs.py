@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""Run all simulation testbenches in parallel
+
+Testbenches are:
+- gateware/csc/test/*_tb.py, with the arguments of their Makefile targets.
+- gateware modules whose __main__ block calls run_simulation (TMDS
+  _EncoderTB in hdmi_out/hdmi.py, ChanSync _TB in hdmi_in/chansync.py...).
+
+Each testbench runs in its own process (from its directory, output in
+<name>.log) and passes if it completes without exception (testbenches assert
+their results, sys.exit(0) counts as completion). Wall-clock time and
+simulated cycles are reported per testbench.
+
+A passing testbench is skipped on the next runs as long as the hash of its
+arguments and of the files it read (gateware sources, input images) is
+unchanged, use --force to run it anyway. Files read are recorded with an audit
+hook (Python >= 3.8): on older Pythons passing testbenches are not cached.
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import runpy
+import sys
+import time
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE = os.path.join(ROOT, "test", ".tb_cache.json")
+LOGDIR = os.path.join(ROOT, "test", "tb_logs")
+
+
+class Testbench:
+    def __init__(self, name, path, args=[]):
+        self.name = name
+        self.path = path
+        self.args = args
+
+
+def _csc_testbenches():
+    directory = os.path.join(ROOT, "gateware", "csc", "test")
+    tbs = []
+    with open(os.path.join(directory, "Makefile")) as f:
+        makefile = f.read()
+    for target, script, args in re.findall(r"^(\w+):\n\t\$\(CMD\) (\w+_tb\.py)(.*)$", makefile, re.M):
+        tbs.append(Testbench("csc/" + target, os.path.join(directory, script), args.split()))
+    # testbenches without Makefile target run with default arguments
+    for script in sorted(os.listdir(directory)):
+        if script.endswith("_tb.py") and not any(tb.path.endswith(os.sep + script) for tb in tbs):
+            tbs.append(Testbench("csc/" + script[:-3], os.path.join(directory, script)))
+    return tbs
+
+
+def _module_testbenches():
+    tbs = []
+    for dirpath, dirnames, filenames in os.walk(os.path.join(ROOT, "gateware")):
+        dirnames[:] = sorted(d for d in dirnames if d not in ["test", "__pycache__"])
+        for filename in sorted(filenames):
+            if not filename.endswith(".py"):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path) as f:
+                source = f.read()
+            main = source.find("if __name__ == \"__main__\":")
+            if main >= 0 and "run_simulation(" in source[main:]:
+                name = os.path.relpath(path, os.path.join(ROOT, "gateware"))[:-3]
+                tbs.append(Testbench(name, path))
+    return tbs
+
+
+def discover():
+    return _csc_testbenches() + _module_testbenches()
+
+
+def _digest(tb, files):
+    h = hashlib.sha256()
+    h.update(json.dumps([tb.path, tb.args]).encode())
+    for path in sorted(files):
+        h.update(path.encode())
+        try:
+            with open(os.path.join(ROOT, path), "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(b"missing")
+    return h.hexdigest()
+
+
+def _run(tb):
+    # executed in a fresh worker process
+    cycles = []
+    def count_cycles():
+        import migen.sim.generic
+        class CountingSimulator(migen.sim.generic.Simulator):
+            def close(self):
+                cycles.append(self.cycle_counter)
+                migen.sim.generic.Simulator.close(self)
+        migen.sim.generic.Simulator = CountingSimulator
+
+    # record files read (and not generated) by the testbench
+    read, written = set(), set()
+    def audit(event, args):
+        if event == "open" and isinstance(args[0], str):
+            path = os.path.abspath(args[0])
+            if path.startswith(ROOT + os.sep):
+                if args[1] is None:
+                    write = args[2] & (os.O_WRONLY | os.O_RDWR | os.O_CREAT)
+                else:
+                    write = any(c in args[1] for c in "wax+")
+                if write:
+                    written.add(path)
+                elif path not in written and os.path.isfile(path):
+                    read.add(path)
+    audited = hasattr(sys, "addaudithook")
+    if audited:
+        sys.addaudithook(audit)
+
+    log = open(os.path.join(LOGDIR, tb.name.replace("/", "_") + ".log"), "w")
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    os.chdir(os.path.dirname(tb.path))
+    sys.path.insert(0, ROOT)
+    sys.argv = [tb.path] + tb.args
+
+    start = time.time()
+    error = None
+    try:
+        count_cycles()
+        runpy.run_path(tb.path, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in [None, 0]:
+            error = "SystemExit: {}".format(e.code)
+    except BaseException as e:
+        error = "{}: {}".format(type(e).__name__, e)
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    files = [tb.path] + [m.__file__ for m in list(sys.modules.values())
+                         if getattr(m, "__file__", None)] + list(read)
+    files = set(os.path.relpath(os.path.abspath(f), ROOT) for f in files
+                if os.path.abspath(f).startswith(ROOT + os.sep) and
+                os.path.abspath(f) not in written and not f.endswith(".pyc"))
+    return {
+        "error": error,
+        "audited": audited,
+        "time": time.time() - start,
+        "cycles": sum(cycles),
+        "files": sorted(files)
+    }
+
+
+def _load_cache():
+    try:
+        with open(CACHE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _get_args():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="number of parallel testbenches")
+    parser.add_argument("-f", "--force", action="store_true", help="ignore cache")
+    parser.add_argument("-l", "--list", action="store_true", help="list testbenches")
+    parser.add_argument("patterns", nargs="*", help="testbench name patterns (fnmatch)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _get_args()
+    tbs = discover()
+    if args.patterns:
+        tbs = [tb for tb in tbs if any(fnmatch.fnmatch(tb.name, p) for p in args.patterns)]
+    if args.list:
+        for tb in tbs:
+            print(tb.name, " ".join(tb.args))
+        sys.exit(0)
+
+    cache = _load_cache()
+    todo = []
+    for tb in tbs:
+        entry = cache.get(tb.name)
+        if (not args.force and entry is not None and
+            entry["digest"] == _digest(tb, entry["files"])):
+            print("{:40s} cached ({:.1f}s, {} cycles)".format(tb.name, entry["time"], entry["cycles"]))
+        else:
+            todo.append(tb)
+
+    os.makedirs(LOGDIR, exist_ok=True)
+    failures = 0
+    start = time.time()
+    with multiprocessing.Pool(args.jobs, maxtasksperchild=1) as pool:
+        for tb, result in zip(todo, pool.imap(_run, todo)):
+            if result["error"] is None:
+                status = "passed"
+                if result["audited"]:
+                    cache[tb.name] = {
+                        "digest": _digest(tb, result["files"]),
+                        "files": result["files"],
+                        "time": result["time"],
+                        "cycles": result["cycles"]
+                    }
+            else:
+                status = "FAILED ({})".format(result["error"])
+                cache.pop(tb.name, None)
+                failures += 1
+            print("{:40s} {} ({:.1f}s, {} cycles)".format(tb.name, status, result["time"], result["cycles"]))
+            # save after each testbench: an interrupted run keeps its results
+            with open(CACHE, "w") as f:
+                json.dump(cache, f, indent=1, sort_keys=True)
+
+    print("{} run, {} cached, {} failed in {:.1f}s".format(
+        len(todo), len(tbs) - len(todo), failures, time.time() - start))
+    sys.exit(1 if failures else 0)